@@ -1,22 +1,60 @@
 # app.py
+import importlib
 import streamlit as st
-from views.database import init_db, get_user
-from views import (
-    tracker, 
-    planner, 
-    dashboard, 
-    admin_tools, 
-    billing, 
-    schedule, 
-    library, 
-    communication
-)
-
-# Initialize Database
-init_db()
+
+# Page modules (and pandas / SQLAlchemy / the engine behind them) are imported
+# only when a page is first opened, so the login screen paints immediately.
 
 st.set_page_config(page_title="TILP Connect", layout="wide", page_icon="🧩")
 
+STAFF_ROLES = ["ot", "slp", "bc", "ece", "assistant", "staff", "therapist"]
+
+# (module in views/, title, icon) per role, in sidebar order
+ROLE_PAGES = {
+    "admin": [
+        ("admin_tools", "Admin Tools", "🔑"),
+        ("communication", "Communication Hub", "📢"),
+        ("schedule", "Master Schedule", "🗓️"),
+        ("billing", "Billing Management", "💳"),
+        ("library", "Resource Library", "📂"),
+        ("dashboard", "Program Dashboard", "📊"),
+        ("reports", "Program Reports", "📈"),
+        ("workload", "Staff Workload", "👥"),
+        ("search", "Search", "🔎"),
+    ],
+    "staff": [
+        ("dashboard", "Program Dashboard", "📊"),
+        ("tracker", "Progress Tracker", "📝"),
+        ("planner", "Daily Planner", "📅"),
+        ("schedule", "My Schedule", "🗓️"),
+        ("communication", "Communication", "📢"),
+        ("library", "Resource Library", "📂"),
+        ("search", "Search", "🔎"),
+    ],
+    "parent": [
+        ("dashboard", "My Child's Dashboard", "📊"),
+        ("schedule", "Appointments", "🗓️"),
+        ("library", "File Library", "📂"),
+        ("billing", "Billing & Invoices", "💳"),
+        ("search", "Search", "🔎"),
+    ],
+}
+
+@st.cache_resource
+def init_database():
+    from views.database import init_db
+    from views.jobs import start_workers
+    init_db()
+    start_workers()
+
+def lazy_page(module_name, title):
+    def render():
+        from views import profiler
+        module = importlib.import_module(f"views.{module_name}")
+        profiler.run_page(title, module.show_page)
+    render.__name__ = module_name
+    return render
+
 def login_screen():
     st.title("🔐 TILP Connect Login")
     col1, _ = st.columns([1, 2])
@@ -24,16 +62,24 @@ def login_screen():
         username = st.text_input("Username")
         password = st.text_input("Password", type="password")
         if st.button("Log In"):
-            user_data = get_user(username, password)
+            init_database()
+            from views import auth
+            token, user_data = auth.login(username, password)
             if user_data:
                 st.session_state["logged_in"] = True
-                st.session_state["role"] = str(user_data["role"]).lower()
-                st.session_state["username"] = user_data["username"]
-                st.session_state["child_link"] = user_data.get("child_link", "")
+                st.session_state["auth_token"] = token
+                apply_user(user_data)
                 st.rerun()
             else:
                 st.error("Incorrect username or password")
 
+def apply_user(user_data):
+    st.session_state["role"] = str(user_data["role"]).lower()
+    st.session_state["username"] = user_data["username"]
+    st.session_state["child_link"] = user_data.get("child_link") or ""
+    # Every query helper scopes to this clinic (views/database.py current_tenant)
+    st.session_state["tenant"] = user_data["tenant"]
+
 def main():
     if "logged_in" not in st.session_state:
         st.session_state["logged_in"] = False
@@ -42,42 +88,45 @@ def main():
         login_screen()
         return
 
+    init_database()
+    # Re-validate the signed token; role/child-link edits made by an admin show
+    # up here through the cached auth_version check
+    from views import auth
+    from views.database import DEFAULT_TENANT
+    user_data = auth.current_user(st.session_state.get("auth_token"))
+    if user_data is None:
+        st.session_state.clear()
+        st.rerun()
+    apply_user(user_data)
+
     user_role = st.session_state.get("role", "")
     username = st.session_state.get("username", "User")
-    
+
     st.sidebar.title(f"👤 {username.capitalize()}")
-    pages = {}
 
     # Define Pages by Role
-    if user_role == "admin":
-        pages["🔑 Admin Tools"] = admin_tools.show_page
-        pages["📢 Communication Hub"] = communication.show_page
-        pages["🗓️ Master Schedule"] = schedule.show_page
-        pages["💳 Billing Management"] = billing.show_page
-        pages["📂 Resource Library"] = library.show_page
-        pages["📊 Program Dashboard"] = dashboard.show_page
-    
-    elif user_role in ["ot", "slp", "bc", "ece", "assistant", "staff", "therapist"]:
-        pages["📊 Program Dashboard"] = dashboard.show_page
-        pages["📝 Progress Tracker"] = tracker.show_page
-        pages["📅 Daily Planner"] = planner.show_page
-        pages["📢 Communication"] = communication.show_page
-        pages["📂 Resource Library"] = library.show_page
-
-    elif user_role == "parent":
-        pages["📊 My Child's Dashboard"] = dashboard.show_page
-        pages["🗓️ Appointments"] = schedule.show_page
-        pages["📂 File Library"] = library.show_page
-        pages["💳 Billing & Invoices"] = billing.show_page
-
-    selection = st.sidebar.radio("Go to:", list(pages.keys()))
-    
+    nav_role = "staff" if user_role in STAFF_ROLES else user_role
+    pages = [
+        st.Page(lazy_page(module_name, title), title=title, icon=icon, url_path=module_name, default=(i == 0))
+        for i, (module_name, title, icon) in enumerate(ROLE_PAGES.get(nav_role, []))
+    ]
+    if not pages:
+        st.error("Your account has no pages assigned. Please contact an administrator.")
+        return
+    selection = st.navigation(pages)
+
+    # Render profiles are kept process-wide, like the Performance tab showing them
+    if user_role == "admin" and st.session_state["tenant"] == DEFAULT_TENANT:
+        from views import profiler
+        profiler.sidebar_controls()
+
     if st.sidebar.button("Log Out"):
+        auth.logout(st.session_state.get("auth_token"))
         st.session_state.clear()
         st.rerun()
 
-    # Execute the selected page function
-    pages[selection]()
+    # Execute the selected page (its module is imported on first use)
+    selection.run()
 
 if __name__ == "__main__":
     main()
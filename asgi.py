@@ -0,0 +1,12 @@
+# asgi.py
+"""The app plus the signed media route (views/media.py), as one ASGI app.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8501
+
+`streamlit run app.py` still works; attachments then fall back to Streamlit's
+media file manager and videos are not played.
+"""
+import streamlit as st
+from views.media import routes
+
+app = st.App("app.py", routes=routes())
@@ -0,0 +1,8 @@
+# bench/__init__.py
+
+# Performance benchmarks: synthetic caseload generator (datagen) and the
+# headless page-render benchmark (run).
+
+# Synthetic users get a cheap password hash so generating hundreds of families
+# stays fast; the load test configures auth with the same cost
+BENCH_HASH_ITERATIONS = 1000
@@ -0,0 +1,96 @@
+# bench/datagen.py
+import random
+from datetime import date, timedelta
+from sqlalchemy import text
+from bench import BENCH_HASH_ITERATIONS
+from views.auth import hash_password
+from views.database import init_db, rebuild_search_index
+
+DISCIPLINES = ["OT", "SLP", "BC", "ECE"]
+GOAL_AREAS = ["Fine Motor", "Gross Motor", "Communication", "Self-Regulation", "Social Play", "Toileting", "Feeding"]
+STATUSES = ["Progressing", "Mastered", "Emerging", "Regression", "Not Observed"]
+ATTENDANCE = ["Present"] * 8 + ["Absent", "Late", "Excused"]
+APPT_STATUSES = ["Completed"] * 6 + ["Scheduled", "Cancelled", "No Show"]
+STAFF = ["ot1", "slp1", "bc1", "ece1", "assistant1"]
+WORDS = ("child worked on transitions visual schedule toilet training fine motor grasp crayon "
+         "peer play turn taking requesting words signs regulation break sensory swing calm "
+         "feeding textures spoon independence stairs balance jumping imitation attention").split()
+
+def _sentence(rng, n=12):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+def _weekdays(start, end):
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+# Builds a deterministic caseload in the schema created by init_db: the same
+# arguments always produce the same rows. Dates end at `end` (default today).
+def generate(engine, children=50, progress_per_child=40, years=1, seed=0, end=None):
+    rng = random.Random(seed)
+    end = end or date.today()
+    start = end - timedelta(days=365 * years)
+    days = list(_weekdays(start, end))
+    child_names = [f"Child {i:04d}" for i in range(1, children + 1)]
+
+    users = [{"u": "admin", "r": "admin", "c": ""}]
+    users += [{"u": s, "r": s[:-1], "c": ""} for s in STAFF]
+    users += [{"u": f"parent{i:04d}", "r": "parent", "c": name} for i, name in enumerate(child_names, 1)]
+    for user in users:
+        user["p"] = hash_password(user["u"], iterations=BENCH_HASH_ITERATIONS)
+    kids = [{"cn": name, "pu": f"parent{i:04d}", "dob": str(date(2019 + i % 4, 1 + i % 12, 1 + i % 28))}
+            for i, name in enumerate(child_names, 1)]
+
+    progress, attendance, appointments, invoices = [], [], [], []
+    for name in child_names:
+        for d in sorted(rng.sample(days, min(progress_per_child, len(days)))):
+            progress.append({
+                "d": str(d), "c": name, "dis": rng.choice(DISCIPLINES), "g": rng.choice(GOAL_AREAS),
+                "s": rng.choice(STATUSES), "n": _sentence(rng, 30), "m": "", "a": rng.choice(STAFF),
+                "pn": _sentence(rng) if rng.random() < 0.6 else "",
+                "pf": _sentence(rng, 8) if rng.random() < 0.2 else None})
+        for d in days:
+            attendance.append({"d": str(d), "c": name, "s": rng.choice(ATTENDANCE), "lb": "admin"})
+        for d in days[rng.randrange(5)::5]:
+            appointments.append({"d": str(d), "t": f"{rng.randint(8, 16):02d}:00:00", "c": name,
+                                 "dis": rng.choice(["OT Session", "SLP Session", "BC Consultation", "Assessment"]),
+                                 "st": rng.choice(STAFF), "co": 120.0, "stat": rng.choice(APPT_STATUSES)})
+        for d in days[::21]:
+            invoices.append({"d": str(d), "c": name, "i": "Monthly therapy", "a": float(rng.choice([480, 600, 720])),
+                             "s": rng.choice(["Paid", "Paid", "Unpaid", "Overdue"]), "n": ""})
+
+    plans = [{"d": str(d), "ls": rng.choice(STAFF), "wu": _sentence(rng), "lb": _sentence(rng), "rb": _sentence(rng),
+              "sp": _sentence(rng), "cr": _sentence(rng), "mn": _sentence(rng, 5), "a": "admin"} for d in days]
+    messages = [{"d": str(d), "t": rng.choice(["Announcement", "To-Do List"]),
+                 "tg": rng.choice(["All"] + child_names), "c": _sentence(rng), "a": "admin"}
+                for d in days[::3]]
+    library = [{"c": rng.choice(["All"] + child_names), "t": _sentence(rng, 4), "u": f"https://example.org/r/{i}",
+                "cat": rng.choice(["Homework", "Reports", "Educational", "Videos"]), "a": "admin", "d": str(rng.choice(days))}
+               for i in range(children * 3)]
+
+    init_db()
+    with engine.connect() as conn:
+        conn.execute(text("INSERT INTO users (username, password, role, child_link) VALUES (:u, :p, :r, :c)"), users)
+        conn.execute(text("INSERT INTO children (child_name, parent_username, date_of_birth) VALUES (:cn, :pu, :dob)"), kids)
+        conn.execute(text("INSERT INTO disciplines (name) VALUES (:n)"), [{"n": n} for n in DISCIPLINES])
+        conn.execute(text("INSERT INTO goal_areas (name) VALUES (:n)"), [{"n": n} for n in GOAL_AREAS])
+        conn.execute(text("""INSERT INTO progress (date, child_name, discipline, goal_area, status, notes, media_path, author, parent_note, parent_feedback)
+                             VALUES (:d, :c, :dis, :g, :s, :n, :m, :a, :pn, :pf)"""), progress)
+        conn.execute(text("INSERT INTO attendance (date, child_name, status, logged_by) VALUES (:d, :c, :s, :lb)"), attendance)
+        conn.execute(text("""INSERT INTO appointments (date, time, child_name, discipline, staff, cost, status)
+                             VALUES (:d, :t, :c, :dis, :st, :co, :stat)"""), appointments)
+        conn.execute(text("INSERT INTO invoices (date, child_name, item_desc, amount, status, note) VALUES (:d, :c, :i, :a, :s, :n)"), invoices)
+        conn.execute(text("""INSERT INTO session_plans (date, lead_staff, support_staff, warm_up, learning_block, regulation_break,
+                             social_play, closing_routine, materials_needed, internal_notes, author, staff_comments, supervision_notes)
+                             VALUES (:d, :ls, 'Team', :wu, :lb, :rb, :sp, :cr, :mn, '', :a, '', '')"""), plans)
+        conn.execute(text("INSERT INTO messages (date, type, target, content, author, status) VALUES (:d, :t, :tg, :c, :a, 'Active')"), messages)
+        conn.execute(text("""INSERT INTO library (child_name, title, link_url, category, added_by, date_added)
+                             VALUES (:c, :t, :u, :cat, :a, :d)"""), library)
+        rebuild_search_index(conn)
+        conn.commit()
+
+    return {"children": len(kids), "progress": len(progress), "attendance": len(attendance),
+            "appointments": len(appointments), "invoices": len(invoices), "session_plans": len(plans),
+            "messages": len(messages), "library": len(library)}
@@ -0,0 +1,197 @@
+# bench/loadtest.py
+"""Concurrent-session load test and connection pool sizing report.
+
+    python -m bench.loadtest --sessions 60 --duration 30
+    TILP_DB_URL=postgresql://... python -m bench.loadtest --pool-size 10 --max-overflow 5
+
+Every simulated session logs in through auth.login and then navigates pages the
+way app.main offers them to its role, issuing the same helper calls each
+page makes on render. Without TILP_DB_URL a synthetic SQLite caseload is used.
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+from bench import BENCH_HASH_ITERATIONS
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ROLE_MIX = {"admin": 0.1, "ot": 0.4, "parent": 0.5}
+
+# The helper calls each page makes on render, keyed like app.ROLE_PAGES;
+# main() refuses to run when a page the app offers has no entry here
+def _page_calls(db):
+    from views import ical, snapshots, workload
+    children = lambda: db.get_list_data("children")
+    return {
+        "admin_tools": lambda s: [children(), db.get_data("users"), children(), children(), db.get_attendance_data(),
+                                  db.get_list_data("disciplines"), db.get_list_data("goal_areas")],
+        "communication": lambda s: [children()],
+        "schedule": lambda s: [db.get_appointments() if s["role"] == "admin" else
+                               db.get_appointments(s["child"]) if s["role"] == "parent" else db.get_appointments(staff=s["username"])]
+                              + ([children()] if s["role"] == "admin" else
+                                 [ical.get_feed("child", s["child"])] if s["role"] == "parent" else [ical.get_feed("provider", s["username"])]),
+        "billing": lambda s: [db.get_invoices(s["child"] if s["role"] == "parent" else None)]
+                             + ([children(), children()] if s["role"] == "admin" else []),
+        "library": lambda s: [db.library_tags(s["child"], all_children=s["role"] != "parent"),
+                              db.library_category_counts(s["child"], all_children=s["role"] != "parent"),
+                              db.get_library_page("Homework", s["child"], all_children=s["role"] != "parent")]
+                             + ([children(), children()] if s["role"] != "parent" else []),
+        "dashboard": lambda s: [db.get_messages(s["child"] if s["role"] == "parent" else "All"),
+                                db.get_attendance_data(child_name=s["child"]) if s["role"] == "parent" else db.get_attendance_data(),
+                                db.get_data("progress")],
+        "search": lambda s: [db.search_records("toilet training", s["role"], s["child"])],
+        "tracker": lambda s: [children(), db.get_list_data("disciplines"), db.get_list_data("goal_areas"), db.get_data("progress")],
+        "planner": lambda s: [db.get_data("session_plans")],
+        "reports": lambda s: [snapshots.load_state()],
+        "workload": lambda s: [workload.workload_report(workload.week_start(date.today()) - timedelta(weeks=7), 8)],
+    }
+
+def _write(db, session, rng):
+    if session["role"] == "parent":
+        db.update_parent_feedback(rng.randint(1, 50), "Thanks, we will practice at home.")
+    elif session["role"] == "admin":
+        db.upsert_attendance(time.strftime("%Y-%m-%d"), session["child"], rng.choice(["Present", "Late"]), "admin")
+    else:
+        db.save_progress(time.strftime("%Y-%m-%d"), session["child"], "OT", "Fine Motor", "Progressing",
+                         "Load test note.", "", session["username"], "")
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.page_views = 0
+
+    def add(self, page, ms):
+        with self.lock:
+            self.latencies[page].append(ms)
+            self.page_views += 1
+
+    def error(self, kind):
+        with self.lock:
+            self.errors[kind] += 1
+
+def _session_loop(db, auth, calls, role_pages, args, recorder, stop_at, seed):
+    rng = random.Random(seed)
+    role = rng.choices(list(ROLE_MIX), weights=list(ROLE_MIX.values()))[0]
+    child = f"Child {rng.randint(1, args.children):04d}"
+    username = {"admin": "admin", "ot": "ot1", "parent": f"parent{int(child[-4:]):04d}"}[role]
+
+    started = time.perf_counter()
+    if not auth.login(username, username)[1]:
+        recorder.error("login failed")
+        return
+    recorder.add("login", (time.perf_counter() - started) * 1000)
+
+    session = {"role": role, "child": child, "username": username}
+    while time.monotonic() < stop_at:
+        page = rng.choice(role_pages[role])
+        started = time.perf_counter()
+        try:
+            calls[page](session)
+            if rng.random() < args.write_ratio:
+                _write(db, session, rng)
+        except Exception as e:
+            recorder.error(type(e).__name__)
+            continue
+        recorder.add(page, (time.perf_counter() - started) * 1000)
+        time.sleep(rng.expovariate(1000.0 / args.think_ms) if args.think_ms > 0 else 0)
+
+def _pct(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent sessions and size the connection pool.")
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--think-ms", type=float, default=300.0, help="mean pause between page views")
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which sessions log in")
+    parser.add_argument("--children", type=int, default=50, help="children in the synthetic caseload")
+    parser.add_argument("--pool-size", type=int)
+    parser.add_argument("--max-overflow", type=int)
+    parser.add_argument("--pool-timeout", type=float)
+    parser.add_argument("--pool-recycle", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    # Pool policy goes through the same settings the app reads
+    for key in ("pool_size", "max_overflow", "pool_timeout", "pool_recycle"):
+        if getattr(args, key) is not None:
+            os.environ[f"TILP_DB_{key.upper()}"] = str(getattr(args, key))
+    tmp = None
+    if "TILP_DB_URL" not in os.environ:
+        os.environ.setdefault("TILP_AUTH_ITERATIONS", str(BENCH_HASH_ITERATIONS))
+        tmp = tempfile.TemporaryDirectory()
+        os.environ["TILP_DB_URL"] = f"sqlite:///{os.path.join(tmp.name, 'load.db')}"
+
+    sys.path.insert(0, str(ROOT))
+    from views import auth, database as db, instrumentation
+    from bench.datagen import generate
+    from bench.run import ROLE_PAGES
+
+    if tmp is not None:
+        generate(db.get_engine(), children=args.children, progress_per_child=20, seed=args.seed)
+    instrumentation.reset_pool_metrics()
+
+    calls = _page_calls(db)
+    missing = sorted({page for pages in ROLE_PAGES.values() for page in pages} - set(calls))
+    if missing:
+        raise SystemExit(f"No load-test calls for page(s): {', '.join(missing)}")
+    recorder = Recorder()
+    stop_at = time.monotonic() + args.duration
+    threads = []
+    for i in range(args.sessions):
+        t = threading.Thread(target=_session_loop, args=(db, auth, calls, ROLE_PAGES, args, recorder, stop_at, args.seed + i), daemon=True)
+        threads.append(t)
+        t.start()
+        time.sleep(args.ramp / max(args.sessions, 1))
+    for t in threads:
+        t.join()
+
+    pool = db.get_engine().pool
+    print(f"\nPool policy: size={getattr(pool, 'size', lambda: '-')()} overflow={getattr(pool, '_max_overflow', '-')} "
+          f"timeout={getattr(pool, '_timeout', '-')}s  ({db.get_engine().dialect.name})")
+    print(f"Sessions: {args.sessions}  duration: {args.duration:.0f}s  page views: {recorder.page_views}  "
+          f"throughput: {recorder.page_views / args.duration:.1f} views/s")
+    if recorder.errors:
+        print("Errors: " + ", ".join(f"{k}={v}" for k, v in recorder.errors.items()))
+
+    print(f"\n{'page':<16}{'views':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for page, values in sorted(recorder.latencies.items()):
+        print(f"{page:<16}{len(values):>8}{statistics.median(values):>10.1f}{_pct(values, 0.95):>10.1f}"
+              f"{_pct(values, 0.99):>10.1f}{max(values):>10.1f}")
+
+    report = instrumentation.pool_report()
+    print("\nConnection pool:")
+    print(report.to_string(index=False) if not report.empty else "  (no checkouts recorded)")
+
+    primary = instrumentation.POOL_METRICS.get("primary")
+    if primary and primary["in_use"]:
+        needed = math.ceil(_pct(list(primary["in_use"]), 0.99))
+        burst = primary["peak_in_use"]
+        print(f"\nRecommendation: pool_size={needed} (p99 connections in use), "
+              f"max_overflow={max(burst - needed, 0)} (to cover the observed peak of {burst}).")
+        capacity = getattr(pool, "size", lambda: None)()
+        if capacity is not None and burst >= capacity + max(getattr(pool, "_max_overflow", 0), 0):
+            print("  The pool was saturated (peak == size + overflow); rerun with a larger pool to find the true demand.")
+        if primary["timeouts"]:
+            print(f"  {primary['timeouts']} checkouts timed out: the current pool is too small for this load.")
+    if tmp is not None:
+        tmp.cleanup()
+    return 1 if recorder.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# bench/run.py
+"""Headless page-render benchmark.
+
+    python -m bench.run                         # default sizes, compare to baseline
+    python -m bench.run --sizes 10,50 --update-baseline
+
+Each dataset size runs in its own subprocess against a fresh SQLite file, so the
+cached engine in views.database always points at the right database.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from app import ROLE_PAGES as APP_ROLE_PAGES
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# Benchmarked role -> the navigation app.main gives it ("ot" stands in for every staff role)
+BENCH_ROLES = {"admin": "admin", "ot": "staff", "parent": "parent"}
+ROLE_PAGES = {role: [module for module, _, _ in APP_ROLE_PAGES[nav]] for role, nav in BENCH_ROLES.items()}
+
+# Rendered by AppTest: one page, inside the same profiler wrapper app.main uses
+def _page_script(module_name):
+    import importlib
+    from views import profiler
+    module = importlib.import_module(f"views.{module_name}")
+    profiler.run_page(module_name, module.show_page)
+
+def _render(module_name, role, child_link):
+    from streamlit.testing.v1 import AppTest
+    from views import profiler
+    at = AppTest.from_function(_page_script, args=(module_name,), default_timeout=120)
+    at.session_state["logged_in"] = True
+    at.session_state["role"] = role
+    at.session_state["username"] = "admin" if role == "admin" else ("parent0001" if role == "parent" else "ot1")
+    at.session_state["child_link"] = child_link
+    at.session_state["profiling_enabled"] = True
+    at.session_state["profiling_sample_rate"] = 0.0
+    tracemalloc.start()
+    at.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if at.exception:
+        raise RuntimeError(f"{role}/{module_name}: {at.exception[0].message}")
+    _, _, wall_ms, db_ms, _, queries, widgets, _ = profiler.PAGE_RENDERS[-1]
+    return {"render_ms": wall_ms, "db_ms": db_ms, "queries": queries, "widgets": widgets, "peak_kb": peak / 1024}
+
+def run_worker(args):
+    os.environ["TILP_DB_URL"] = f"sqlite:///{args.db}"
+    sys.path.insert(0, str(ROOT))
+    from bench.datagen import generate
+    from views.database import get_engine
+
+    started = time.perf_counter()
+    counts = generate(get_engine(), children=args.children, progress_per_child=args.progress, years=args.years, seed=args.seed)
+    result = {"rows": counts, "generate_s": time.perf_counter() - started, "pages": {}}
+
+    for role, pages in ROLE_PAGES.items():
+        for page in pages:
+            runs = [_render(page, role, "Child 0001") for _ in range(args.repeat)]
+            result["pages"][f"{role}/{page}"] = {
+                "render_ms": statistics.median(r["render_ms"] for r in runs),
+                "db_ms": statistics.median(r["db_ms"] for r in runs),
+                "queries": max(r["queries"] for r in runs),
+                "widgets": max(r["widgets"] or 0 for r in runs),
+                "peak_kb": max(r["peak_kb"] for r in runs),
+            }
+    json.dump(result, sys.stdout)
+
+def run_size(children, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        cmd = [sys.executable, "-m", "bench.run", "--worker", "--db", os.path.join(tmp, "bench.db"),
+               "--children", str(children), "--progress", str(args.progress), "--years", str(args.years),
+               "--seed", str(args.seed), "--repeat", str(args.repeat)]
+        out = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr[-4000:])
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+# A page regresses when it issues more queries, or is both >tolerance slower and
+# >min_ms slower than the baseline (small absolute jitter is ignored)
+def compare(results, baseline, tolerance, min_ms):
+    regressions = []
+    for size, result in results.items():
+        base_pages = baseline.get(size, {}).get("pages", {})
+        for page, cur in result["pages"].items():
+            base = base_pages.get(page)
+            if not base:
+                continue
+            slower = cur["render_ms"] - base["render_ms"]
+            if slower > min_ms and cur["render_ms"] > base["render_ms"] * (1 + tolerance):
+                regressions.append(f"{size} {page}: render {base['render_ms']:.1f} -> {cur['render_ms']:.1f} ms")
+            if cur["queries"] > base["queries"]:
+                regressions.append(f"{size} {page}: queries {base['queries']} -> {cur['queries']}")
+    return regressions
+
+def print_report(results):
+    for size, result in results.items():
+        rows = result["rows"]
+        print(f"\n== {size} children ({rows['progress']} progress, {rows['attendance']} attendance rows) ==")
+        print(f"{'page':<28}{'render ms':>11}{'db ms':>9}{'queries':>9}{'widgets':>9}{'peak KB':>10}")
+        for page, m in result["pages"].items():
+            print(f"{page:<28}{m['render_ms']:>11.1f}{m['db_ms']:>9.1f}{m['queries']:>9}{m['widgets']:>9}{m['peak_kb']:>10.0f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every show_page per role over synthetic caseloads.")
+    parser.add_argument("--sizes", default="10,25", help="comma separated child counts")
+    parser.add_argument("--progress", type=int, default=40, help="progress rows per child")
+    parser.add_argument("--years", type=int, default=1, help="years of attendance/appointments")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="renders per page (median is reported)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--children", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return run_worker(args)
+
+    results = {size: run_size(int(size), args) for size in args.sizes.split(",")}
+    print_report(results)
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print("\nNo baseline found; run with --update-baseline to record one.")
+        return 0
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance, args.min_ms)
+    if regressions:
+        print("\nREGRESSIONS:\n  " + "\n  ".join(regressions))
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+# tests/conftest.py
+import os
+import sys
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Cheap hashes; views.auth reads this once at import
+os.environ.setdefault("TILP_AUTH_ITERATIONS", "1000")
+
+def use_database(path):
+    from views import database
+    os.environ["TILP_DB_URL"] = f"sqlite:///{path}"
+    database.get_engine.clear()
+    database.get_read_engine.clear()
+    database.init_db()
+    return database
+
+# Audit events land in this list instead of going through the background writer
+@pytest.fixture
+def audit_events(monkeypatch):
+    from views import audit
+    events = []
+    monkeypatch.setattr(audit, "record", lambda *event: events.append(event))
+    return events
+
+# A fresh SQLite database (and backup folder) per test
+@pytest.fixture
+def db(tmp_path, monkeypatch, audit_events):
+    from views import auth
+    monkeypatch.setenv("TILP_DB_URL", "")
+    monkeypatch.setenv("TILP_DB_BACKUP_DIR", str(tmp_path / "backups"))
+    auth._versions.clear()
+    auth._sessions.clear()
+    database = use_database(tmp_path / "tilp.db")
+    yield database
+    database.get_engine().dispose()
+    database.get_engine.clear()
+    database.get_read_engine.clear()
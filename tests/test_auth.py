@@ -0,0 +1,88 @@
+# tests/test_auth.py
+import time
+import pytest
+from sqlalchemy import text
+from views import auth
+
+def _stored_password(db, username):
+    with db.get_engine().connect() as conn:
+        return conn.execute(text("SELECT password FROM users WHERE username = :u"), {"u": username}).scalar()
+
+# --- PASSWORD HASHING ---
+def test_hash_is_salted_and_verifies():
+    first, second = auth.hash_password("s3cret"), auth.hash_password("s3cret")
+    assert first != second
+    assert first.startswith(auth.HASH_SCHEME + "$")
+    assert auth.verify_password("s3cret", first)
+    assert not auth.verify_password("wrong", first)
+    assert not auth.verify_password("s3cret", None)
+
+def test_legacy_plain_text_password_is_upgraded_on_login(db, audit_events):
+    with db.get_engine().begin() as conn:
+        conn.execute(text("INSERT INTO users (username, password, role, child_link, tenant) VALUES ('legacy', 'plain', 'staff', '', :t)"),
+                     {"t": db.DEFAULT_TENANT})
+    assert auth.authenticate("legacy", "wrong") is None
+    assert _stored_password(db, "legacy") == "plain"
+
+    user = auth.authenticate("legacy", "plain")
+    assert user["username"] == "legacy" and "password" not in user
+    stored = _stored_password(db, "legacy")
+    assert stored.startswith(f"{auth.HASH_SCHEME}${auth.ITERATIONS}$")
+    assert auth.verify_password("plain", stored)
+    assert [e[0] for e in audit_events] == ["rehash"]
+    # Already upgraded: the next login leaves the hash alone
+    assert auth.authenticate("legacy", "plain")
+    assert _stored_password(db, "legacy") == stored
+
+def test_hash_with_old_iteration_count_is_rehashed(db):
+    db.upsert_user("nurse", "pw", "staff", "")
+    with db.get_engine().begin() as conn:
+        conn.execute(text("UPDATE users SET password = :p WHERE username = 'nurse'"), {"p": auth.hash_password("pw", iterations=500)})
+    assert auth.needs_rehash(_stored_password(db, "nurse"))
+    assert auth.authenticate("nurse", "pw")
+    assert not auth.needs_rehash(_stored_password(db, "nurse"))
+
+# --- SESSION TOKENS ---
+def test_token_round_trip_and_tampering(db):
+    db.upsert_user("alice", "pw", "admin", "")
+    token, user = auth.login("alice", "pw")
+    assert auth.current_user(token)["role"] == "admin"
+    username, expires_at, signature = token.split("|")
+    assert auth.current_user(f"mallory|{expires_at}|{signature}") is None
+    assert auth.current_user(f"{username}|{int(expires_at) + 60}|{signature}") is None
+    assert auth.current_user("not a token") is None
+
+def test_expired_token_is_rejected(db):
+    db.upsert_user("alice", "pw", "admin", "")
+    payload = f"alice|{int(time.time()) - 1}"
+    assert auth.current_user(f"{payload}|{auth._sign(payload)}") is None
+
+def test_role_change_and_removal_invalidate_open_sessions(db):
+    db.upsert_user("bob", "pw", "admin", "")
+    token, _ = auth.login("bob", "pw")
+    assert auth.current_user(token)["role"] == "admin"
+
+    db.upsert_user("bob", "", "parent", "Kid A")
+    user = auth.current_user(token)
+    assert (user["role"], user["child_link"]) == ("parent", "Kid A")
+
+    db.delete_user("bob")
+    assert auth.current_user(token) is None
+
+def test_version_bumped_by_another_process_applies_after_ttl(db, monkeypatch):
+    db.upsert_user("carol", "pw", "admin", "")
+    token, _ = auth.login("carol", "pw")
+    assert auth.current_user(token)["role"] == "admin"
+    with db.get_engine().begin() as conn:
+        conn.execute(text("UPDATE users SET role = 'staff', auth_version = auth_version + 1 WHERE username = 'carol'"))
+    # Within VERSION_TTL the cached version still stands
+    assert auth.current_user(token)["role"] == "admin"
+    monkeypatch.setattr(auth, "VERSION_TTL", 0)
+    assert auth.current_user(token)["role"] == "staff"
+
+@pytest.mark.parametrize("username", ["a|b", "|", "x|1|sig"])
+def test_usernames_with_the_token_separator_are_rejected(db, username):
+    with pytest.raises(ValueError):
+        db.upsert_user(username, "pw", "staff", "")
+    with pytest.raises(ValueError):
+        db.create_user(username, "pw", "staff", "")
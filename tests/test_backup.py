@@ -0,0 +1,67 @@
+# tests/test_backup.py
+from datetime import date, datetime, timezone
+import pandas as pd
+from sqlalchemy import text
+from views import backup
+from conftest import use_database
+
+TABLES = {"users": "username", "attendance": "id", "session_plans": "id"}
+
+def _rows(db):
+    with db.get_engine().connect() as conn:
+        return {table: pd.read_sql_query(text(f"SELECT * FROM {table} ORDER BY {key}"), conn).astype(str)
+                for table, key in TABLES.items()}
+
+def _plan(db, day, warm_up):
+    db.save_plan(str(day), "lead", ["aide"], warm_up, "", "", "", "", "", "", "author")
+
+def _seed(db):
+    db.upsert_user("alice", "pw", "admin", "")
+    db.upsert_user("bob", "pw", "staff", "")
+    db.upsert_attendance(date(2026, 10, 5), "Kid A", "Present", "bob")
+    db.upsert_attendance(date(2026, 10, 5), "Kid B", "Absent", "bob")
+    _plan(db, date(2026, 10, 5), "stretch")
+    _plan(db, date(2026, 10, 6), "song")
+
+def _change(db):
+    db.upsert_attendance(date(2026, 10, 5), "Kid B", "Late", "bob")
+    db.upsert_attendance(date(2026, 10, 6), "Kid A", "Present", "bob")
+    db.delete_plan(1)
+    _plan(db, date(2026, 10, 7), "drums")
+    db.upsert_user("carol", "pw", "parent", "Kid A")
+    db.delete_user("bob")
+
+def test_full_and_incremental_backup_restore_round_trip(db, tmp_path):
+    _seed(db)
+    full = backup.run_backup("full")
+    _change(db)
+    incremental = backup.run_backup("incremental")
+    assert incremental["kind"] == "incremental" and incremental["base"] == full["name"]
+    assert incremental["tables"]["attendance"]["mode"] == "changes"
+    expected = _rows(db)
+
+    restored = use_database(tmp_path / "restored.db")
+    chain = backup.restore()
+    assert [b["name"] for b in chain] == [full["name"], incremental["name"]]
+    for table, frame in _rows(restored).items():
+        pd.testing.assert_frame_equal(frame, expected[table], obj=table)
+
+def test_restore_up_to_an_earlier_backup(db, tmp_path):
+    _seed(db)
+    full = backup.run_backup("full")
+    expected = _rows(db)
+    _change(db)
+    backup.run_backup("incremental")
+
+    restored = use_database(tmp_path / "restored.db")
+    backup.restore(full["name"])
+    for table, frame in _rows(restored).items():
+        pd.testing.assert_frame_equal(frame, expected[table], obj=table)
+
+def test_backups_started_in_the_same_instant_get_their_own_folders(db, monkeypatch):
+    first = backup.run_backup("full")
+    started = datetime.strptime(first["name"][:21], "%Y%m%dT%H%M%S%f").replace(tzinfo=timezone.utc)
+    monkeypatch.setattr(backup, "datetime", type("frozen", (), {"now": staticmethod(lambda tz=None: started)}))
+    second = backup.run_backup("full")
+    assert second["name"] == first["name"] + "_1"
+    assert [b["name"] for b in backup.list_backups()] == [first["name"], second["name"]]
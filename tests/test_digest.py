@@ -0,0 +1,39 @@
+# tests/test_digest.py
+from datetime import date
+from sqlalchemy import text
+from views import digest
+
+DAY = date(2026, 10, 5)
+
+def _outbox(db):
+    with db.get_engine().connect() as conn:
+        return conn.execute(text("SELECT recipient, subject, body, status FROM outbox ORDER BY recipient")).mappings().all()
+
+def _seed(db):
+    db.upsert_user("parent_a", "pw", "parent", "Kid A")
+    db.upsert_user("parent_b", "pw", "parent", "Kid B")
+    db.save_progress(str(DAY), "Kid A", "OT", "Fine motor", "Emerging", "", "", "ot1", "Great scissor work")
+    with db.get_engine().begin() as conn:
+        conn.execute(text("""INSERT INTO messages (date, author, type, target, content, status, tenant)
+            VALUES (:d, 'admin', 'Announcement', 'All', 'Closed Friday', 'Active', :t)"""), {"d": str(DAY), "t": db.DEFAULT_TENANT})
+
+def test_each_parent_gets_one_digest_with_their_sections(db):
+    _seed(db)
+    assert digest.build_digests(DAY) == 2
+    a, b = _outbox(db)
+    assert (a["recipient"], b["recipient"]) == ("parent_a", "parent_b")
+    assert "Kid A: OT (ot1): Great scissor work" in a["body"]
+    assert "Announcement: Closed Friday" in a["body"] and "Announcement: Closed Friday" in b["body"]
+    assert "Great scissor work" not in b["body"]
+    assert a["status"] == "pending"
+
+def test_rebuild_replaces_pending_digests_but_not_sent_ones(db):
+    _seed(db)
+    digest.build_digests(DAY)
+    with db.get_engine().begin() as conn:
+        conn.execute(text("UPDATE outbox SET status = 'sent', body = 'as sent' WHERE recipient = 'parent_b'"))
+    db.save_progress(str(DAY), "Kid A", "SLP", "Articulation", "Emerging", "", "", "slp1", "New sounds today")
+    assert digest.build_digests(DAY) == 2
+    a, b = _outbox(db)
+    assert "New sounds today" in a["body"]
+    assert b["body"] == "as sent"
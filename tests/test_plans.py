@@ -0,0 +1,46 @@
+# tests/test_plans.py
+from datetime import date
+from sqlalchemy import text
+
+def _plan(db, day, warm_up):
+    db.save_plan(str(day), "lead", ["aide"], warm_up, "", "", "", "", "", "", "author")
+
+def _plans(db):
+    with db.get_engine().connect() as conn:
+        return dict(conn.execute(text("SELECT date, warm_up FROM session_plans ORDER BY date")).fetchall())
+
+def test_week_copies_forward_weekday_by_weekday(db, audit_events):
+    # Mon 2026-10-05 .. Fri 2026-10-09
+    for day, warm_up in zip(range(5, 10), ["mon", "tue", "wed", "thu", "fri"]):
+        _plan(db, date(2026, 10, day), warm_up)
+    created = db.copy_plans_forward(date(2026, 10, 5), date(2026, 10, 11), date(2026, 10, 12), date(2026, 10, 25), "copier")
+    assert created == 10
+    plans = _plans(db)
+    assert [plans[f"2026-10-{d}"] for d in (12, 13, 14, 15, 16, 19, 23)] == ["mon", "tue", "wed", "thu", "fri", "mon", "fri"]
+    assert "2026-10-17" not in plans and "2026-10-18" not in plans
+    assert audit_events[-1][:2] == ("bulk_insert", "session_plans")
+
+def test_days_with_a_plan_are_skipped(db):
+    _plan(db, date(2026, 10, 5), "source")
+    _plan(db, date(2026, 10, 7), "kept")
+    assert db.copy_plans_forward(date(2026, 10, 5), date(2026, 10, 5), date(2026, 10, 6), date(2026, 10, 9), "copier") == 3
+    assert _plans(db)["2026-10-07"] == "kept"
+    # Running it again finds every target day filled
+    assert db.copy_plans_forward(date(2026, 10, 5), date(2026, 10, 5), date(2026, 10, 6), date(2026, 10, 9), "copier") == 0
+
+def test_overlapping_ranges_copy_only_the_original_source_days(db):
+    # Source Mon-Tue with only Monday planned; the target starts inside it
+    _plan(db, date(2026, 10, 5), "monday")
+    created = db.copy_plans_forward(date(2026, 10, 5), date(2026, 10, 6), date(2026, 10, 5), date(2026, 10, 9), "copier")
+    plans = _plans(db)
+    # Monday already has its plan and Tuesday has no source: Wed and Fri map
+    # to Monday, while Thursday maps to the empty Tuesday and stays empty
+    # rather than picking up a copy made earlier in the same run
+    assert created == 2
+    assert plans == {"2026-10-05": "monday", "2026-10-07": "monday", "2026-10-09": "monday"}
+
+def test_weekends_are_filled_when_asked(db):
+    _plan(db, date(2026, 10, 9), "friday")
+    assert db.copy_plans_forward(date(2026, 10, 9), date(2026, 10, 9), date(2026, 10, 10), date(2026, 10, 11), "copier",
+                                 weekdays_only=False) == 2
+    assert set(_plans(db)) == {"2026-10-09", "2026-10-10", "2026-10-11"}
@@ -3,74 +3,105 @@ import streamlit as st
 import pandas as pd
 from sqlalchemy import text
 from datetime import date, timedelta
+from . import audit, instrumentation, jobs, profiler
+from .attendance_analytics import attendance_summary, calendar_heatmap
+from .auth import forget_user, hash_password, set_version
 from .database import (
-    ENGINE, 
+    DEFAULT_TENANT,
+    ROUTING_STATS,
+    STICKY_SECONDS,
+    audit_write,
+    check_username,
+    create_tenant,
+    current_tenant,
     get_list_data, 
-    get_data
+    get_data,
+    get_engine,
+    get_read_engine,
+    list_tenants,
+    now_ts,
+    replica_lag_seconds,
+    returned_row,
+    row_snapshot,
+    upsert_sql,
+    write_conn
 )
 
 # --- DATABASE HELPER FUNCTIONS ---
 def upsert_user(username, password, role, child_link):
-    with ENGINE.connect() as conn:
-        result = conn.execute(text("SELECT username FROM users WHERE username = :u"), {"u": username}).fetchone()
-        if result:
+    check_username(username)
+    with write_conn() as conn:
+        before = row_snapshot(conn, "users", "username = :u", {"u": username})
+        if before:
             if password:
-                sql = text("UPDATE users SET password=:p, role=:r, child_link=:c WHERE username=:u")
-                conn.execute(sql, {"u": username, "p": password, "r": role, "c": child_link})
+                sql = text("UPDATE users SET password=:p, role=:r, child_link=:c, auth_version=COALESCE(auth_version, 0) + 1, updated_at=:ts WHERE username=:u AND tenant=:tenant RETURNING *")
+                after = returned_row(conn.execute(sql, {"u": username, "p": hash_password(password), "r": role, "c": child_link, "ts": now_ts(), "tenant": current_tenant()}))
             else:
-                sql = text("UPDATE users SET role=:r, child_link=:c WHERE username=:u")
-                conn.execute(sql, {"u": username, "r": role, "c": child_link})
+                sql = text("UPDATE users SET role=:r, child_link=:c, auth_version=COALESCE(auth_version, 0) + 1, updated_at=:ts WHERE username=:u AND tenant=:tenant RETURNING *")
+                after = returned_row(conn.execute(sql, {"u": username, "r": role, "c": child_link, "ts": now_ts(), "tenant": current_tenant()}))
         else:
-            conn.execute(text("INSERT INTO users (username, password, role, child_link) VALUES (:u, :p, :r, :c)"), 
-                         {"u": username, "p": password, "r": role, "c": child_link})
+            after = returned_row(conn.execute(text("INSERT INTO users (username, password, role, child_link, auth_version, updated_at, tenant) VALUES (:u, :p, :r, :c, 0, :ts, :tenant) RETURNING *"), 
+                         {"u": username, "p": hash_password(password), "r": role, "c": child_link, "ts": now_ts(), "tenant": current_tenant()}))
         conn.commit()
+    if after is None:
+        raise ValueError(f"Username '{username}' belongs to another clinic")
+    audit_write("update" if before else "insert", "users", username, before, after)
+    set_version(username, after["auth_version"])
 
 def delete_user(username):
-    with ENGINE.connect() as conn:
-        conn.execute(text("DELETE FROM users WHERE username = :u"), {"u": username})
+    with write_conn() as conn:
+        before = returned_row(conn.execute(text("DELETE FROM users WHERE username = :u AND tenant = :tenant RETURNING *"), {"u": username, "tenant": current_tenant()}))
         conn.commit()
+    audit_write("delete", "users", username, before)
+    forget_user(username)
 
 def upsert_child(cn, pu, dob):
-    with ENGINE.connect() as conn:
-        conn.execute(text("""
-            INSERT INTO children (child_name, parent_username, date_of_birth) 
-            VALUES (:cn, :pu, :dob) 
-            ON CONFLICT (child_name) 
-            DO UPDATE SET parent_username=EXCLUDED.parent_username, date_of_birth=EXCLUDED.date_of_birth
-        """), {"cn": cn, "pu": pu, "dob": dob})
+    with write_conn() as conn:
+        sql = upsert_sql("children", ["child_name", "parent_username", "date_of_birth", "updated_at", "tenant"], ["tenant", "child_name"], ["parent_username", "date_of_birth", "updated_at"], returning=True)
+        before = row_snapshot(conn, "children", "tenant = :tenant AND child_name = :cn", {"tenant": current_tenant(), "cn": cn})
+        after = returned_row(conn.execute(sql, {"child_name": cn, "parent_username": pu, "date_of_birth": dob, "updated_at": now_ts(), "tenant": current_tenant()}))
         conn.commit()
+    audit_write("update" if before else "insert", "children", cn, before, after)
 
 def delete_child(cn):
-    with ENGINE.connect() as conn:
-        conn.execute(text("DELETE FROM children WHERE child_name = :cn"), {"cn": cn})
+    with write_conn() as conn:
+        before = returned_row(conn.execute(text("DELETE FROM children WHERE tenant = :tenant AND child_name = :cn RETURNING *"), {"tenant": current_tenant(), "cn": cn}))
         conn.commit()
+    audit_write("delete", "children", cn, before)
 
 def upsert_attendance(date_val, child_name, status, logged_by):
-    with ENGINE.connect() as conn:
-        conn.execute(text("""
-            INSERT INTO attendance (date, child_name, status, logged_by) 
-            VALUES (:d, :cn, :s, :lb)
-            ON CONFLICT (date, child_name) 
-            DO UPDATE SET status = EXCLUDED.status, logged_by = EXCLUDED.logged_by
-        """), {"d": str(date_val), "cn": child_name, "s": status, "lb": logged_by})
+    with write_conn() as conn:
+        sql = upsert_sql("attendance", ["date", "child_name", "status", "logged_by", "updated_at", "tenant"], ["tenant", "date", "child_name"], ["status", "logged_by", "updated_at"], returning=True)
+        before = row_snapshot(conn, "attendance", "tenant = :tenant AND date = :d AND child_name = :c", {"tenant": current_tenant(), "d": str(date_val), "c": child_name})
+        after = returned_row(conn.execute(sql, {"date": str(date_val), "child_name": child_name, "status": status, "logged_by": logged_by, "updated_at": now_ts(), "tenant": current_tenant()}))
         conn.commit()
+    audit_write("update" if before else "insert", "attendance", after["id"], before, after)
 
 def upsert_list_item(table, item):
-    with ENGINE.connect() as conn:
-        conn.execute(text(f"INSERT INTO {table} (name) VALUES (:n) ON CONFLICT (name) DO NOTHING"), {"n": item})
+    with write_conn() as conn:
+        after = returned_row(conn.execute(upsert_sql(table, ["name", "tenant"], ["tenant", "name"], returning=True), {"name": item, "tenant": current_tenant()}))
         conn.commit()
+    if after:
+        audit_write("insert", table, item, None, after)
 
 def delete_list_item(table, item):
-    with ENGINE.connect() as conn:
-        conn.execute(text(f"DELETE FROM {table} WHERE name = :n"), {"n": item})
+    with write_conn() as conn:
+        before = returned_row(conn.execute(text(f"DELETE FROM {table} WHERE tenant = :tenant AND name = :n RETURNING *"), {"tenant": current_tenant(), "n": item}))
         conn.commit()
+    audit_write("delete", table, item, before)
 
 # --- MAIN PAGE VIEW ---
 def show_page():
     st.title("🔑 Admin & Operations Control")
     username = st.session_state.get("username", "Admin")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["👤 Users", "👶 Children", "📅 Attendance", "⚙️ Lists"])
+    # Routing stats, pools, the query log and render profiles cover every
+    # clinic's traffic, so only the default clinic's admins get those two tabs
+    operator = current_tenant() == DEFAULT_TENANT
+    labels = ["👤 Users", "👶 Children", "📅 Attendance", "⚙️ Lists"] + (["🗄️ Database", "⏱️ Performance"] if operator else [])
+    tabs = dict(zip(labels + ["🧾 Audit", "🧵 Jobs"], st.tabs(labels + ["🧾 Audit", "🧵 Jobs"])))
+    tab1, tab2, tab3, tab4 = (tabs[label] for label in labels[:4])
+    tab7, tab8 = tabs["🧾 Audit"], tabs["🧵 Jobs"]
 
     # --- TAB 1: USER MANAGEMENT ---
     with tab1:
@@ -84,12 +115,37 @@ def show_page():
                 c_list = ["None"] + (c_df['child_name'].tolist() if not c_df.empty else [])
                 cl = st.selectbox("Link to Child", c_list)
                 if st.form_submit_button("Save User"):
-                    upsert_user(u, p, r, (cl if cl != "None" else ""))
-                    st.success(f"User {u} saved!")
-                    st.rerun()
-        df_u = get_data("users")
+                    try:
+                        upsert_user(u, p, r, (cl if cl != "None" else ""))
+                    except ValueError as e:
+                        st.error(str(e))
+                    else:
+                        st.success(f"User {u} saved!")
+                        st.rerun()
+        df_u = get_data("users").drop(columns=["password"], errors="ignore")
         st.dataframe(df_u, use_container_width=True)
 
+        # Each clinic only ever sees its own rows; a new clinic starts with one
+        # admin. Only the default clinic's admins see or create other clinics
+        if current_tenant() == DEFAULT_TENANT:
+            with st.expander(f"🏥 Clinics (signed in to: {current_tenant()})"):
+                st.dataframe(list_tenants(), use_container_width=True, hide_index=True)
+                with st.form("tenant_form", clear_on_submit=True):
+                    t_id = st.text_input("Clinic ID (letters, digits, - and _)")
+                    t_name = st.text_input("Clinic Name")
+                    t_admin = st.text_input("First Admin Username")
+                    t_pass = st.text_input("First Admin Password", type="password")
+                    if st.form_submit_button("Create Clinic"):
+                        if not (t_id and t_admin and t_pass):
+                            st.error("Clinic ID and the first admin's username and password are required.")
+                        else:
+                            try:
+                                create_tenant(t_id.strip(), t_name or t_id, t_admin, t_pass)
+                            except ValueError as e:
+                                st.error(str(e))
+                            else:
+                                st.success(f"Clinic {t_id} created; {t_admin} can now sign in.")
+
     # --- TAB 2: CHILD PROFILES ---
     with tab2:
         st.subheader("Child Directory")
@@ -116,36 +172,59 @@ def show_page():
                 att_status = st.radio("Status", ["Present", "Absent", "Late", "Excused"], horizontal=True)
                 if st.form_submit_button("Submit Attendance"):
                     upsert_attendance(att_date, sel_child, att_status, username)
+                    attendance_summary.clear()
                     st.success(f"Logged {sel_child} as {att_status}")
                     st.rerun()
 
         st.divider()
         
-        # 2. REVIEW & FILTER ATTENDANCE
+        # 2. REVIEW & ANALYTICS
         st.subheader("Review Attendance Records")
-        c1, c2 = st.columns(2)
-        start_date = c1.date_input("From Date", date.today() - timedelta(days=7))
+        c1, c2, c3 = st.columns(3)
+        start_date = c1.date_input("From Date", date.today() - timedelta(days=90))
         end_date = c2.date_input("To Date", date.today())
-        
-        with ENGINE.connect() as conn:
-            att_df = pd.read_sql(text("SELECT * FROM attendance ORDER BY date DESC"), conn)
-        
-        if not att_df.empty:
-            # Convert to date objects for filtering
-            att_df['date_dt'] = pd.to_datetime(att_df['date']).dt.date
-            filtered_att = att_df[(att_df['date_dt'] >= start_date) & (att_df['date_dt'] <= end_date)]
-            
-            if not filtered_att.empty:
-                st.dataframe(filtered_att.drop(columns=['date_dt']), use_container_width=True, hide_index=True)
-                
-                # Simple stats
-                total_days = len(filtered_att)
-                presents = len(filtered_att[filtered_att['status'] == 'Present'])
-                st.info(f"Summary for period: {presents} Presents out of {total_days} total logs.")
-            else:
-                st.warning("No records found for this date range.")
+        period = c3.radio("Group by", ["Week", "Month"], horizontal=True)
+
+        summary = attendance_summary(start_date, end_date, current_tenant())
+        logs = summary["logs"]
+        if logs.empty:
+            st.warning("No records found for this date range.")
         else:
-            st.info("No attendance records found in database.")
+            rates = summary["weekly" if period == "Week" else "monthly"]
+            m1, m2, m3, m4 = st.columns(4)
+            counted = int(logs["counted"].sum())
+            m1.metric("Logs", len(logs))
+            m2.metric("Attendance Rate", f"{100 * logs['attended'].sum() / counted:.1f}%" if counted else "–")
+            m3.metric("Late Arrivals", int(logs["late"].sum()))
+            m4.metric("Active Absence Streaks", int(summary["streaks"]["ongoing"].sum()))
+
+            heat_child = st.selectbox("Calendar for", ["Whole clinic"] + sorted(logs["child_name"].unique().tolist()))
+            fig = calendar_heatmap(logs, None if heat_child == "Whole clinic" else heat_child)
+            if fig is not None:
+                st.plotly_chart(fig, use_container_width=True)
+
+            a1, a2 = st.columns(2)
+            with a1:
+                st.markdown(f"**Clinic-wide rate by {period.lower()}**")
+                st.line_chart(rates.set_index("period")[["attendance_rate", "late_rate"]])
+            with a2:
+                st.markdown("**Late-arrival trend (weekly, 4-week average)**")
+                st.line_chart(summary["late_trend"].set_index("period")[["late_rate", "late_rate_trend"]])
+
+            with st.expander("👶 Per-child rates"):
+                st.dataframe(summary["children"], use_container_width=True, hide_index=True)
+                if period == "Month":
+                    by_child = summary["monthly_by_child"].pivot(index="child_name", columns="period", values="attendance_rate")
+                    by_child.columns = [c.strftime("%Y-%m") for c in by_child.columns]
+                    st.dataframe(by_child, use_container_width=True)
+
+            with st.expander(f"🚩 Absence streaks ({len(summary['streaks'])})"):
+                st.caption("Three or more consecutive logged absences; excused days are skipped.")
+                st.dataframe(summary["streaks"], use_container_width=True, hide_index=True)
+
+            with st.expander("📋 Raw logs"):
+                st.dataframe(logs[["date", "child_name", "status"]].sort_values("date", ascending=False),
+                             use_container_width=True, hide_index=True)
 
     # --- TAB 4: APP LISTS ---
     with tab4:
@@ -166,3 +245,147 @@ def show_page():
                 st.rerun()
             g_df = get_list_data("goal_areas")
             st.dataframe(g_df)
+
+
+    if operator:
+        # --- TAB 5: DATABASE ROUTING ---
+        with tabs["🗄️ Database"]:
+            st.subheader("Read/Write Routing")
+            engine, read_engine = get_engine(), get_read_engine()
+            if read_engine is engine:
+                st.info("No read replica configured; all queries use the primary.")
+            else:
+                st.markdown(f"**Primary:** `{engine.url.render_as_string(hide_password=True)}`")
+                st.markdown(f"**Replica:** `{read_engine.url.render_as_string(hide_password=True)}`")
+                try:
+                    st.metric("Replica Lag", f"{replica_lag_seconds():.2f} s")
+                except Exception as e:
+                    st.error(f"Could not read replica lag: {e}")
+            st.caption(f"Reads stay on the primary for {STICKY_SECONDS:g}s after a session writes.")
+            routing_df = pd.DataFrame(sorted(ROUTING_STATS.items()), columns=["Route", "Queries"])
+            st.dataframe(routing_df, use_container_width=True, hide_index=True)
+
+            st.subheader("Connection Pools")
+            st.caption(f"Primary: {engine.pool.status()}")
+            pool_df = instrumentation.pool_report()
+            if not pool_df.empty:
+                st.dataframe(pool_df, use_container_width=True, hide_index=True)
+
+        # --- TAB 6: QUERY PERFORMANCE ---
+        with tabs["⏱️ Performance"]:
+            st.subheader("Query Performance")
+            st.caption(f"Last {len(instrumentation.QUERY_LOG)} statements (buffer holds {instrumentation.QUERY_LOG.maxlen}).")
+            pct = instrumentation.latency_percentiles()
+            c1, c2, c3 = st.columns(3)
+            c1.metric("p50", f"{pct['p50']:.1f} ms")
+            c2.metric("p95", f"{pct['p95']:.1f} ms")
+            c3.metric("p99", f"{pct['p99']:.1f} ms")
+
+            st.markdown("**Top Statements by Total Time**")
+            stats_df = instrumentation.statement_stats()
+            if not stats_df.empty:
+                st.dataframe(stats_df, use_container_width=True, hide_index=True)
+            else:
+                st.info("No queries recorded yet.")
+
+            st.markdown("**Queries per Page Render**")
+            render_df = instrumentation.queries_per_render()
+            if not render_df.empty:
+                st.dataframe(render_df, use_container_width=True, hide_index=True)
+            else:
+                st.info("No page renders recorded yet.")
+
+            st.markdown("**Page Render Profile**")
+            page_df = profiler.page_summary()
+            if not page_df.empty:
+                st.dataframe(page_df, use_container_width=True, hide_index=True)
+            else:
+                st.info("Enable 'Profile page renders' in the sidebar to collect page timings.")
+
+            for i, (ts, page, wall_ms, stats) in enumerate(reversed(profiler.PROFILES)):
+                stamp = pd.Timestamp(ts, unit="s").strftime("%H:%M:%S")
+                with st.expander(f"🔬 {page} at {stamp} ({wall_ms:.0f} ms)"):
+                    st.code(profiler.top_functions(stats), language=None)
+                    d1, d2 = st.columns(2)
+                    d1.download_button("📥 .prof", profiler.export_prof(stats), f"render_{i}.prof", key=f"prof_{i}_{ts}")
+                    d2.download_button("📥 Collapsed stacks", profiler.export_collapsed(stats), f"render_{i}.folded", key=f"fold_{i}_{ts}")
+
+            slow_log = instrumentation.SETTINGS["slow_query_log"]
+            if slow_log:
+                st.caption(f"Statements slower than {instrumentation.SETTINGS['slow_query_ms']:g} ms are appended to `{slow_log}`.")
+            if st.button("Reset Statistics"):
+                instrumentation.reset()
+                profiler.PAGE_RENDERS.clear()
+                profiler.PROFILES.clear()
+                st.rerun()
+
+    # --- TAB 7: AUDIT LOG ---
+    with tab7:
+        st.subheader("Audit Log")
+        a1, a2, a3, a4 = st.columns(4)
+        a1.metric("Queued", audit.queue_depth())
+        a2.metric("Written", audit.STATS["flushed"])
+        a3.metric("Written Inline", audit.STATS["written_inline"])
+        a4.metric("Flush Errors", audit.STATS["errors"])
+
+        f1, f2, f3 = st.columns(3)
+        audit_table = f1.selectbox("Table", ["All", *audit.AUDIT_TABLES])
+        audit_action = f2.selectbox("Action", ["All", *audit.AUDIT_ACTIONS])
+        audit_actor = f3.text_input("User")
+        f4, f5, f6 = st.columns(3)
+        audit_key = f4.text_input("Record key")
+        audit_start = f5.date_input("From", date.today() - timedelta(days=7), key="audit_start")
+        audit_end = f6.date_input("To", date.today(), key="audit_end")
+
+        log_df = audit.query_audit(None if audit_table == "All" else audit_table, audit_actor.strip(),
+                                   None if audit_action == "All" else audit_action, audit_key.strip(),
+                                   audit_start, audit_end + timedelta(days=1))
+        if log_df.empty:
+            st.info("No audit events match these filters.")
+        else:
+            st.dataframe(log_df.drop(columns=["before_data", "after_data"]), use_container_width=True, hide_index=True)
+            event_id = st.selectbox("Inspect event", log_df["id"].tolist())
+            event = log_df[log_df["id"] == event_id].iloc[0]
+            b1, b2 = st.columns(2)
+            b1.markdown("**Before**")
+            b1.json(event["before_data"] or {})
+            b2.markdown("**After**")
+            b2.json(event["after_data"] or {})
+
+    # --- TAB 8: BACKGROUND JOBS ---
+    with tab8:
+        st.subheader("Run a Job")
+        j1, j2 = st.columns([3, 1])
+        run_kind = j1.selectbox("Job", jobs.submittable_kinds())
+        if j2.button("▶️ Submit"):
+            try:
+                st.session_state["admin_job"] = jobs.submit(run_kind, created_by=username)
+            except ValueError as e:
+                st.error(str(e))
+        if "admin_job" in st.session_state:
+            jobs.show_job(st.session_state["admin_job"])
+
+        # Schedules run for every clinic, so only the default clinic's admins manage them
+        if current_tenant() == DEFAULT_TENANT:
+            st.subheader("Schedules")
+            sched_df = jobs.list_schedules()
+            for row in sched_df.itertuples():
+                s1, s2 = st.columns([3, 1])
+                s1.markdown(f"**{row.name}** · `{row.spec}` · next run {str(row.next_run_at)[:16]} UTC")
+                enabled = s2.toggle("Enabled", bool(row.enabled), key=f"sched_{row.name}")
+                if enabled != bool(row.enabled):
+                    jobs.set_schedule_enabled(row.name, enabled)
+                    st.rerun()
+
+        st.subheader("Recent Jobs")
+        jobs_df = jobs.list_jobs()
+        if jobs_df.empty:
+            st.info("No jobs have run yet.")
+        else:
+            st.dataframe(jobs_df, use_container_width=True, hide_index=True)
+            queued = jobs_df[jobs_df["status"] == "queued"]["id"].tolist()
+            if queued:
+                c_id = st.selectbox("Queued job", queued)
+                if st.button("Cancel Job"):
+                    jobs.cancel(c_id)
+                    st.rerun()
@@ -0,0 +1,110 @@
+# views/attendance_analytics.py
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+from sqlalchemy import text
+from .database import current_tenant, read_archive, read_conn, use_tenant
+
+ATTENDED = ("Present", "Late")
+# Excused days are left out of the rate's denominator
+COUNTED = ("Present", "Late", "Absent")
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# --- DATA ---
+def load_attendance(start, end):
+    with read_conn() as conn:
+        df = pd.read_sql_query(text("""SELECT date, child_name, status FROM attendance
+                                       WHERE tenant = :t AND date BETWEEN :s AND :e"""), conn,
+                               params={"t": current_tenant(), "s": str(start), "e": str(end)})
+    archived = read_archive("attendance", start=str(start), end=str(end))
+    if not archived.empty:
+        df = pd.concat([archived[["date", "child_name", "status"]], df], ignore_index=True)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df = df.dropna(subset=["date"])
+    df["attended"] = df["status"].isin(ATTENDED).to_numpy()
+    df["counted"] = df["status"].isin(COUNTED).to_numpy()
+    df["late"] = (df["status"] == "Late").to_numpy()
+    df["absent"] = (df["status"] == "Absent").to_numpy()
+    return df.sort_values(["child_name", "date"], ignore_index=True)
+
+def _rate(num, den):
+    return np.where(den > 0, np.round(100.0 * num / np.maximum(den, 1), 1), np.nan)
+
+# freq is "W" (weeks starting Monday) or "M"
+def period_rates(df, freq="M", by_child=False):
+    if df.empty:
+        return pd.DataFrame()
+    period = df["date"].dt.to_period("W-SUN" if freq == "W" else "M").dt.start_time
+    keys = [period.rename("period")] + ([df["child_name"]] if by_child else [])
+    out = df.groupby(keys)[["attended", "counted", "late", "absent"]].sum().reset_index()
+    out["attendance_rate"] = _rate(out["attended"], out["counted"])
+    out["late_rate"] = _rate(out["late"], out["attended"])
+    return out
+
+def child_rates(df):
+    if df.empty:
+        return pd.DataFrame()
+    out = df.groupby("child_name")[["attended", "counted", "late", "absent"]].sum().reset_index()
+    out["attendance_rate"] = _rate(out["attended"], out["counted"])
+    out["late_rate"] = _rate(out["late"], out["attended"])
+    return out.sort_values("attendance_rate", ignore_index=True)
+
+# Runs of consecutive logged absences per child (Excused days break nothing:
+# they are skipped, so Absent-Excused-Absent counts as a streak of two)
+def absence_streaks(df, min_length=3):
+    logs = df[df["counted"]]
+    if logs.empty:
+        return pd.DataFrame(columns=["child_name", "start", "end", "days", "ongoing"])
+    child = logs["child_name"].to_numpy()
+    absent = logs["absent"].to_numpy()
+    new_run = np.r_[True, (child[1:] != child[:-1]) | (absent[1:] != absent[:-1])]
+    run_id = np.cumsum(new_run)
+    runs = logs.assign(run=run_id)[absent].groupby("run").agg(
+        child_name=("child_name", "first"), start=("date", "min"), end=("date", "max"), days=("date", "size"))
+    last_log = logs.groupby("child_name")["date"].max()
+    runs["ongoing"] = runs["end"].to_numpy() == last_log.reindex(runs["child_name"]).to_numpy()
+    return runs[runs["days"] >= min_length].sort_values(["ongoing", "days"], ascending=False, ignore_index=True)
+
+def late_trend(df, freq="W"):
+    rates = period_rates(df, freq)
+    if rates.empty:
+        return rates
+    # Four-period rolling mean smooths out short weeks and holidays
+    rates["late_rate_trend"] = rates["late_rate"].rolling(4, min_periods=1).mean().round(1)
+    return rates[["period", "late", "attended", "late_rate", "late_rate_trend"]]
+
+# --- CALENDAR HEATMAP ---
+def calendar_heatmap(df, child_name=None):
+    if child_name:
+        df = df[df["child_name"] == child_name]
+    daily = df.groupby("date")[["attended", "counted"]].sum()
+    if daily.empty:
+        return None
+    days = pd.date_range(daily.index.min(), daily.index.max(), freq="D")
+    rate = pd.Series(_rate(daily["attended"], daily["counted"]), index=daily.index).reindex(days)
+    week = (days - pd.to_timedelta(days.weekday, unit="D")).normalize()
+    grid = pd.DataFrame({"week": week, "weekday": days.weekday, "rate": rate.to_numpy()}) \
+        .pivot(index="weekday", columns="week", values="rate").reindex(range(7))
+    fig = go.Figure(go.Heatmap(
+        z=grid.to_numpy(), x=grid.columns, y=WEEKDAYS, colorscale="RdYlGn", zmin=0, zmax=100,
+        hoverongaps=False, colorbar={"title": "% attended"},
+        hovertemplate="Week of %{x|%b %d, %Y}<br>%{y}: %{z}%<extra></extra>"))
+    fig.update_yaxes(autorange="reversed")
+    fig.update_layout(height=260, margin={"l": 10, "r": 10, "t": 10, "b": 10})
+    return fig
+
+# One computation per (start, end, clinic); cleared when attendance is logged
+@st.cache_data(ttl=600, show_spinner=False)
+def attendance_summary(start, end, tenant):
+    with use_tenant(tenant):
+        df = load_attendance(start, end)
+    return {
+        "logs": df,
+        "weekly": period_rates(df, "W"),
+        "monthly": period_rates(df, "M"),
+        "monthly_by_child": period_rates(df, "M", by_child=True),
+        "children": child_rates(df),
+        "streaks": absence_streaks(df),
+        "late_trend": late_trend(df, "W"),
+    }
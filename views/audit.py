@@ -0,0 +1,162 @@
+# views/audit.py
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+import pandas as pd
+from sqlalchemy import text
+from .database import _session_state, current_tenant, db_setting, get_engine, now_ts, read_conn
+
+# Write helpers call record(); events wait in a bounded in-process queue and
+# a background thread appends them to audit_log in batches, so a user-facing
+# write never waits on the audit insert.
+logger = logging.getLogger("tilp.audit")
+
+QUEUE_SIZE = int(db_setting("audit_queue_size", 10000))
+BATCH_SIZE = int(db_setting("audit_batch_size", 500))
+FLUSH_SECONDS = float(db_setting("audit_flush_seconds", 1.0))
+# A full queue blocks the writer this long before it writes its event itself
+PUT_TIMEOUT = float(db_setting("audit_put_timeout", 2.0))
+# Events that still can't reach the database at shutdown are kept here
+FALLBACK_FILE = db_setting("audit_fallback_file", "audit_fallback.jsonl")
+REDACTED_FIELDS = {"password"}
+
+AUDIT_COLUMNS = ["ts", "actor", "action", "table_name", "record_key", "before_data", "after_data", "tenant"]
+# Every action and table the write helpers record; the Audit tab filters offer
+# exactly these, and record() logs anything outside them so the lists stay whole
+AUDIT_ACTIONS = ("insert", "update", "delete", "bulk_insert", "rehash", "read", "expire")
+AUDIT_TABLES = ("users", "children", "progress", "session_plans", "plan_templates", "attendance", "invoices",
+                "appointments", "messages", "message_reads", "library", "disciplines", "goal_areas", "tenants")
+STATS = Counter()
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_stop = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+# --- RECORDING ---
+def _current_actor():
+    state = _session_state()
+    return (state.get("username") if state is not None else None) or "system"
+
+def _clean(row):
+    if row is None:
+        return None
+    row = dict(row)
+    for field in REDACTED_FIELDS & row.keys():
+        row[field] = "***"
+    return json.dumps(row, default=str, sort_keys=True)
+
+def record(action, table, key, before=None, after=None, actor=None):
+    if action not in AUDIT_ACTIONS or table not in AUDIT_TABLES:
+        logger.warning("Audit event %s on %s is missing from AUDIT_ACTIONS/AUDIT_TABLES", action, table)
+    event = {"ts": now_ts(), "actor": actor or _current_actor(), "action": action, "table_name": table,
+             "record_key": None if key is None else str(key), "before_data": _clean(before), "after_data": _clean(after),
+             "tenant": current_tenant()}
+    _ensure_worker()
+    try:
+        _queue.put(event, timeout=PUT_TIMEOUT)
+        STATS["queued"] += 1
+    except queue.Full:
+        # Backpressure: the writer is slowed to the database's pace rather than losing the event
+        STATS["written_inline"] += 1
+        try:
+            _write_batch([event])
+        except Exception:
+            logger.exception("inline audit write failed")
+            _spill([event])
+
+# --- BACKGROUND FLUSH ---
+def _write_batch(events):
+    with get_engine().begin() as conn:
+        conn.execute(text(f"INSERT INTO audit_log ({', '.join(AUDIT_COLUMNS)}) VALUES ({', '.join(':' + c for c in AUDIT_COLUMNS)})"), events)
+    STATS["flushed"] += len(events)
+    STATS["batches"] += 1
+
+def _drain(first=None):
+    batch = [first] if first is not None else []
+    while len(batch) < BATCH_SIZE:
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+def _run():
+    pending, backoff = [], 1.0
+    while not (_stop.is_set() and _queue.empty() and not pending):
+        if not pending:
+            try:
+                pending = _drain(_queue.get(timeout=FLUSH_SECONDS))
+            except queue.Empty:
+                continue
+            # Give bursts a moment to fill the batch
+            if len(pending) < BATCH_SIZE and not _stop.is_set():
+                time.sleep(min(0.05, FLUSH_SECONDS))
+                pending += _drain()[:BATCH_SIZE - len(pending)]
+        try:
+            _write_batch(pending)
+            pending, backoff = [], 1.0
+        except Exception:
+            STATS["errors"] += 1
+            logger.exception("audit flush failed; retrying %d events", len(pending))
+            if _stop.is_set():
+                _spill(pending)
+                pending = []
+            else:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+def _spill(events):
+    with open(FALLBACK_FILE, "a", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+    STATS["spilled"] += len(events)
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _stop.clear()
+            _worker = threading.Thread(target=_run, name="audit-flush", daemon=True)
+            _worker.start()
+
+def flush(timeout=10.0):
+    global _worker
+    if _worker is None:
+        return
+    _stop.set()
+    _worker.join(timeout)
+    leftover = _drain()
+    while leftover:
+        _spill(leftover)
+        leftover = _drain()
+    _worker = None
+
+atexit.register(flush)
+
+def queue_depth():
+    return _queue.qsize()
+
+# --- QUERYING ---
+# Only the current clinic's events
+def query_audit(table=None, actor=None, action=None, key=None, start=None, end=None, limit=500):
+    clauses, params = ["tenant = :tenant"], {"limit": limit, "tenant": current_tenant()}
+    for col, val in (("table_name", table), ("actor", actor), ("action", action), ("record_key", key)):
+        if val:
+            clauses.append(f"{col} = :{col}")
+            params[col] = str(val)
+    if start:
+        clauses.append("ts >= :start")
+        params["start"] = str(start)
+    if end:
+        clauses.append("ts < :end")
+        params["end"] = str(end)
+    where = f"WHERE {' AND '.join(clauses)}"
+    with read_conn() as conn:
+        return pd.read_sql_query(text(f"SELECT * FROM audit_log {where} ORDER BY id DESC LIMIT :limit"), conn, params=params)
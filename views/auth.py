@@ -0,0 +1,158 @@
+# views/auth.py
+import base64
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from sqlalchemy import text
+from .database import audit_write, db_setting, get_engine, now_ts, read_conn, use_tenant, write_conn
+
+# Settings come from the [auth] secrets section, overridable with TILP_AUTH_<KEY>
+HASH_SCHEME = "pbkdf2_sha256"
+ITERATIONS = int(db_setting("iterations", 260000, section="auth"))
+TOKEN_TTL = int(db_setting("token_ttl_seconds", 12 * 3600, section="auth"))
+# How stale the cached role/child-link versions may get when the change was
+# made by another server process (changes made in this process apply at once)
+VERSION_TTL = float(db_setting("version_ttl_seconds", 30, section="auth"))
+# Without a configured secret, tokens are only valid for this process
+SECRET = str(db_setting("secret", section="auth") or secrets.token_hex(32)).encode()
+
+# tenant is the user's clinic; app.apply_user scopes the session to it
+USER_COLUMNS = "username, password, role, child_link, auth_version, tenant"
+
+# --- PASSWORD HASHING ---
+def hash_password(password, iterations=None):
+    iterations = iterations or ITERATIONS
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return "$".join([HASH_SCHEME, str(iterations), base64.b64encode(salt).decode(), base64.b64encode(digest).decode()])
+
+def verify_password(password, stored):
+    if not stored:
+        return False
+    if not stored.startswith(HASH_SCHEME + "$"):
+        # Legacy plain-text row; upgraded to a hash on the next successful login
+        return hmac.compare_digest(password.encode(), stored.encode())
+    _, iterations, salt, digest = stored.split("$")
+    candidate = hashlib.pbkdf2_hmac("sha256", password.encode(), base64.b64decode(salt), int(iterations))
+    return hmac.compare_digest(candidate, base64.b64decode(digest))
+
+def needs_rehash(stored):
+    return not stored.startswith(f"{HASH_SCHEME}${ITERATIONS}$")
+
+# --- USER LOOKUP ---
+def _load_user(username):
+    with read_conn() as conn:
+        row = conn.execute(text(f"SELECT {USER_COLUMNS} FROM users WHERE username = :u"), {"u": username}).mappings().first()
+    return dict(row) if row else None
+
+def authenticate(username, password):
+    if not get_engine() or not username or not password: return None
+    user = _load_user(username)
+    if not user or not verify_password(password, user["password"]):
+        return None
+    if needs_rehash(user["password"]):
+        with write_conn() as conn:
+            conn.execute(text("UPDATE users SET password = :p, updated_at = :ts WHERE username = :u"),
+                         {"p": hash_password(password), "ts": now_ts(), "u": username})
+            conn.commit()
+        # The hash itself is redacted in the log; this records that it was upgraded
+        with use_tenant(user["tenant"]):
+            audit_write("rehash", "users", username, {"password": user["password"]}, {"password": "rehashed"}, actor=username)
+    user.pop("password")
+    user["auth_version"] = user["auth_version"] or 0
+    return user
+
+# --- ROLE / CHILD-LINK VERSIONS ---
+# username -> (auth_version, loaded_at); each signed-in user's row is re-read
+# at most every VERSION_TTL
+_versions = {}
+_lock = threading.Lock()
+
+# Called by the user write helpers so changes apply to this process immediately
+def set_version(username, version):
+    with _lock:
+        _versions[username] = (version or 0, time.monotonic())
+
+def forget_user(username):
+    with _lock:
+        _versions[username] = (None, time.monotonic())
+
+def _current_version(username):
+    cached = _versions.get(username)
+    if cached and time.monotonic() - cached[1] <= VERSION_TTL:
+        return cached[0]
+    with read_conn() as conn:
+        row = conn.execute(text("SELECT auth_version FROM users WHERE username = :u"), {"u": username}).first()
+    version = (row[0] or 0) if row else None
+    with _lock:
+        _versions[username] = (version, time.monotonic())
+    return version
+
+# --- SESSION TOKENS ---
+# token -> (user record, expires_at); the token itself is an HMAC-signed
+# "username|expires_at" so a forged or expired token never reaches the cache
+_sessions = {}
+
+def _sign(payload):
+    return hmac.new(SECRET, payload.encode(), hashlib.sha256).hexdigest()
+
+def issue_token(user):
+    expires_at = int(time.time()) + TOKEN_TTL
+    payload = f"{user['username']}|{expires_at}"
+    token = f"{payload}|{_sign(payload)}"
+    with _lock:
+        _sessions[token] = (user, expires_at)
+        if len(_sessions) > 10000:
+            now = time.time()
+            for key in [k for k, (_, exp) in _sessions.items() if exp < now]:
+                del _sessions[key]
+    return token
+
+def login(username, password):
+    user = authenticate(username, password)
+    return (issue_token(user), user) if user else (None, None)
+
+def current_user(token):
+    if not token or token.count("|") != 2:
+        return None
+    username, expires_at, signature = token.split("|")
+    if not hmac.compare_digest(signature, _sign(f"{username}|{expires_at}")) or int(expires_at) < time.time():
+        return None
+    cached = _sessions.get(token)
+    user = cached[0] if cached else None
+    version = _current_version(username)
+    if version is None:
+        return None
+    if user is None or user["auth_version"] != version:
+        user = _load_user(username)
+        if user is None:
+            return None
+        user.pop("password")
+        user["auth_version"] = user["auth_version"] or 0
+        with _lock:
+            _sessions[token] = (user, int(expires_at))
+            _versions[username] = (user["auth_version"], time.monotonic())
+    return user
+
+def logout(token):
+    with _lock:
+        _sessions.pop(token, None)
+
+# --- MEDIA LINKS ---
+# Attachment URLs (views/media.py) are signed for one signed-in user and their
+# auth_version, so a role/child-link change or account removal revokes them
+def sign_link(user, name, expires_at):
+    return _sign(f"{name}|{user['username']}|{user['auth_version']}|{expires_at}")
+
+def check_link(name, username, version, expires_at, signature):
+    try:
+        version, expires_at = int(version), int(expires_at)
+    except (TypeError, ValueError):
+        return False
+    if expires_at < time.time():
+        return False
+    if not hmac.compare_digest(str(signature), _sign(f"{name}|{username}|{version}|{expires_at}")):
+        return False
+    return _current_version(username) == version
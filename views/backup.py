@@ -0,0 +1,248 @@
+# views/backup.py
+"""Logical backups: gzip CSV per table, full or incremental, and restore.
+
+    python -m views.backup full
+    python -m views.backup incremental      # rows changed since the last backup
+    python -m views.backup list
+    python -m views.backup restore [NAME] [--target-url sqlite:///local.db]
+
+On Postgres tables are exported and loaded with COPY; SQLite uses the csv
+module with the same file format, so a production backup can reseed a local
+database. Incremental runs export rows whose updated_at (kept by the write
+helpers) is past the previous run's watermark, plus every table's key list
+so restores can drop rows deleted in between.
+
+audit_log is append-only: incremental runs export events logged since the
+watermark, and restores only add events the target doesn't have yet, never
+deleting or replacing any. Not backed up:
+  search_index   derived; rebuilt at the end of every restore
+  outbox         derived; unsent digests can be rebuilt with views.digest --date
+  jobs           queue history only; queued jobs are not carried over
+  job_schedules  re-seeded with the default specs when workers start, so
+                 enable/disable toggles made since are lost
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import inspect, text
+from .database import UPDATED_AT_TABLES, db_setting, get_engine, init_db, is_sqlite, now_ts, rebuild_search_index
+
+# table -> key column, in restore order; search_index is rebuilt, not backed up
+BACKUP_TABLES = {
+    "tenants": "tenant",
+    "users": "username",
+    "children": "id",
+    "disciplines": "name",
+    "goal_areas": "name",
+    "progress": "id",
+    "session_plans": "id",
+    "plan_templates": "id",
+    "attendance": "id",
+    "invoices": "id",
+    "appointments": "id",
+    "messages": "id",
+    "message_reads": "message_id",
+    "library": "id",
+    "audit_log": "id",
+}
+# table -> timestamp column; rows are only ever appended (see the module docstring)
+APPEND_ONLY_TABLES = {"audit_log": "ts"}
+NULL = "\\N"
+CSV_OPTIONS = "FORMAT csv, HEADER, NULL '\\N'"
+# Writes stamped just before a backup can commit just after its snapshot, so
+# the next watermark starts this far back (restores upsert, so overlap is harmless)
+WATERMARK_OVERLAP = timedelta(minutes=5)
+CHUNK_ROWS = 5000
+
+def backup_dir():
+    return db_setting("backup_dir", "backups")
+
+def list_backups():
+    if not os.path.isdir(backup_dir()):
+        return []
+    found = []
+    for name in sorted(os.listdir(backup_dir())):
+        path = os.path.join(backup_dir(), name, "manifest.json")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                found.append(json.load(f))
+    return found
+
+# --- EXPORT ---
+def _copy_out_pg(conn, select_sql, path):
+    cursor = conn.connection.cursor()
+    with gzip.open(path, "wb", compresslevel=6) as out:
+        cursor.copy_expert(f"COPY ({select_sql}) TO STDOUT WITH ({CSV_OPTIONS})", out)
+    return cursor.rowcount
+
+def _copy_out_sqlite(conn, select_sql, path):
+    result = conn.execute(text(select_sql))
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6) as out:
+        writer = csv.writer(out)
+        writer.writerow(result.keys())
+        while rows := result.fetchmany(CHUNK_ROWS):
+            writer.writerows([NULL if v is None else v for v in row] for row in rows)
+            count += len(rows)
+    return count
+
+def run_backup(kind="full"):
+    engine = get_engine()
+    previous = list_backups()
+    if kind == "incremental" and not previous:
+        kind = "full"
+    started = datetime.now(timezone.utc)
+    # Microseconds keep back-to-back runs apart; a counter covers the rest.
+    # Names sort in run order, which restore_chain relies on
+    os.makedirs(backup_dir(), exist_ok=True)
+    for attempt in range(100):
+        name = f"{started:%Y%m%dT%H%M%S%f}_{kind}" + (f"_{attempt}" if attempt else "")
+        folder = os.path.join(backup_dir(), name)
+        try:
+            os.mkdir(folder)
+            break
+        except FileExistsError:
+            continue
+    else:
+        raise FileExistsError(f"Could not create a backup folder for {name}")
+    since = previous[-1]["watermark"] if kind == "incremental" else None
+    copy_out = _copy_out_sqlite if is_sqlite(engine) else _copy_out_pg
+    manifest = {"name": name, "kind": kind, "base": previous[-1]["name"] if since else None,
+                "created_at": now_ts(), "watermark": (started - WATERMARK_OVERLAP).strftime("%Y-%m-%d %H:%M:%S.%f"),
+                "dialect": engine.dialect.name, "tables": {}}
+
+    # One repeatable-read transaction so every table comes from the same snapshot
+    options = {} if is_sqlite(engine) else {"isolation_level": "REPEATABLE READ"}
+    with engine.connect().execution_options(**options) as conn, conn.begin():
+        for table, key in BACKUP_TABLES.items():
+            if since and table in APPEND_ONLY_TABLES:
+                mode = "append"
+                select_sql = f"SELECT * FROM {table} WHERE {APPEND_ONLY_TABLES[table]} >= '{since}'"
+            elif since and table in UPDATED_AT_TABLES:
+                mode = "changes"
+                select_sql = f"SELECT * FROM {table} WHERE updated_at >= '{since}'"
+                copy_out(conn, f"SELECT {key} FROM {table}", os.path.join(folder, f"{table}.keys.csv.gz"))
+            else:
+                mode = "full"
+                select_sql = f"SELECT * FROM {table}"
+            rows = copy_out(conn, select_sql, os.path.join(folder, f"{table}.csv.gz"))
+            manifest["tables"][table] = {"mode": mode, "rows": rows}
+
+    with open(os.path.join(folder, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+# --- RESTORE ---
+def restore_chain(name=None):
+    backups = list_backups()
+    if name:
+        backups = backups[:[b["name"] for b in backups].index(name) + 1]
+    for i in range(len(backups) - 1, -1, -1):
+        if backups[i]["kind"] == "full":
+            return backups[i:]
+    raise RuntimeError("No full backup to restore from")
+
+def _header(path):
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        return next(csv.reader(f))
+
+def _load_pg(conn, stage, cols, path):
+    cursor = conn.connection.cursor()
+    with gzip.open(path, "rb") as f:
+        cursor.copy_expert(f"COPY {stage} ({', '.join(cols)}) FROM STDIN WITH ({CSV_OPTIONS})", f)
+
+def _load_sqlite(conn, stage, cols, path):
+    sql = text(f"INSERT INTO {stage} ({', '.join(cols)}) VALUES ({', '.join(f':c{i}' for i in range(len(cols)))})")
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        batch = []
+        for row in reader:
+            batch.append({f"c{i}": None if v == NULL else v for i, v in enumerate(row)})
+            if len(batch) >= CHUNK_ROWS:
+                conn.execute(sql, batch)
+                batch = []
+        if batch:
+            conn.execute(sql, batch)
+
+def _stage(conn, table, cols, path, name):
+    conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    if is_sqlite():
+        conn.execute(text(f"CREATE TEMP TABLE {name} AS SELECT {', '.join(cols)} FROM {table} WHERE 0"))
+        _load_sqlite(conn, name, cols, path)
+    else:
+        conn.execute(text(f"CREATE TEMP TABLE {name} AS SELECT {', '.join(cols)} FROM {table} WITH NO DATA"))
+        _load_pg(conn, name, cols, path)
+
+def _apply(conn, backup, folder):
+    for table, key in BACKUP_TABLES.items():
+        info = backup["tables"].get(table)
+        path = os.path.join(folder, f"{table}.csv.gz")
+        if info is None or not os.path.exists(path):
+            continue
+        # Columns the target no longer has are dropped; missing ones stay NULL
+        target_cols = {c["name"] for c in inspect(conn).get_columns(table)}
+        cols = [c for c in _header(path) if c in target_cols]
+        _stage(conn, table, cols, path, "_restore_rows")
+        if table in APPEND_ONLY_TABLES:
+            conn.execute(text(f"""INSERT INTO {table} ({', '.join(cols)}) SELECT {', '.join(cols)} FROM _restore_rows
+                WHERE {key} NOT IN (SELECT {key} FROM {table})"""))
+            continue
+        if info["mode"] == "full":
+            conn.execute(text(f"DELETE FROM {table}"))
+        else:
+            conn.execute(text(f"DELETE FROM {table} WHERE {key} IN (SELECT {key} FROM _restore_rows)"))
+            keys_path = os.path.join(folder, f"{table}.keys.csv.gz")
+            _stage(conn, table, [key], keys_path, "_restore_keys")
+            conn.execute(text(f"DELETE FROM {table} WHERE {key} NOT IN (SELECT {key} FROM _restore_keys)"))
+        conn.execute(text(f"INSERT INTO {table} ({', '.join(cols)}) SELECT {', '.join(cols)} FROM _restore_rows"))
+
+def restore(name=None):
+    chain = restore_chain(name)
+    engine = get_engine()
+    init_db()
+    with engine.connect() as conn:
+        # Everything loads in one transaction. The schema has no foreign keys,
+        # so tables are filled in BACKUP_TABLES order with no checks to defer
+        if not is_sqlite(engine):
+            conn.execute(text("SET LOCAL synchronous_commit = off"))
+        for backup in chain:
+            _apply(conn, backup, os.path.join(backup_dir(), backup["name"]))
+        if not is_sqlite(engine):
+            for table, key in BACKUP_TABLES.items():
+                if key == "id":
+                    conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"))
+        rebuild_search_index(conn)
+        conn.commit()
+    return chain
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Full and incremental logical backups.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("full")
+    sub.add_parser("incremental")
+    sub.add_parser("list")
+    res = sub.add_parser("restore")
+    res.add_argument("name", nargs="?", help="backup to restore up to (default: latest)")
+    res.add_argument("--target-url", help="restore into this database instead of the configured one")
+    args = parser.parse_args(argv)
+
+    if args.command in ("full", "incremental"):
+        manifest = run_backup(args.command)
+        total = sum(t["rows"] for t in manifest["tables"].values())
+        print(f"{manifest['name']}: {total} rows in {len(manifest['tables'])} tables")
+    elif args.command == "list":
+        for b in list_backups():
+            print(f"{b['name']:<32}{b['kind']:<13}{sum(t['rows'] for t in b['tables'].values()):>10} rows")
+    else:
+        if args.target_url:
+            os.environ["TILP_DB_URL"] = args.target_url
+        chain = restore(args.name)
+        print("Restored " + " -> ".join(b["name"] for b in chain))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
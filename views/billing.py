@@ -65,6 +65,21 @@ def show_page():
         search_child = st.selectbox("Filter by Child", search_list)
         if search_child != "All":
             df = get_invoices(child_name=search_child)
+            # Complete record (notes, attendance, appointments, invoices) for transitions and audits
+            with st.expander(f"📦 Export full record for {search_child}"):
+                fmt = st.radio("Format", ["csv", "json"], horizontal=True, key="export_fmt")
+                if st.button("Build Export Bundle"):
+                    from .exports import bundle_filename, export_child_bytes
+                    with st.spinner("Streaming records..."):
+                        st.session_state["export_bundle"] = ((search_child, fmt), bundle_filename(search_child, fmt),
+                                                             export_child_bytes(search_child, fmt))
+                # Kept in session_state so the download button outlives the
+                # rerun its own click (or any other widget) triggers
+                bundle = st.session_state.get("export_bundle")
+                if bundle and bundle[0] == (search_child, fmt):
+                    st.download_button("📥 Download Bundle", bundle[2], bundle[1], "application/zip")
+                elif bundle:
+                    del st.session_state["export_bundle"]
         else:
             df = get_invoices()
 
@@ -1,6 +1,7 @@
 # views/communication.py
 import streamlit as st
-from .database import create_message, get_list_data
+from datetime import date, timedelta
+from .database import create_message, get_list_data, get_message_receipts
 
 def show_page():
     st.title("📢 Communication Hub")
@@ -20,16 +21,34 @@ def show_page():
         target = st.selectbox("Recipient", ["All"] + child_names)
         
         content = st.text_area("Message Content", placeholder="Enter the details of your announcement or list items here...")
+
+        expires = st.checkbox("Remove from dashboards after a date")
+        expires_on = st.date_input("Last day shown", date.today() + timedelta(days=14))
         
         submit = st.form_submit_button("Send Message")
         
         if submit:
             if content:
-                create_message(msg_type, target, content, username)
+                create_message(msg_type, target, content, username, expires_on if expires else None)
                 st.success(f"Successfully sent {msg_type} to {target}!")
             else:
                 st.error("Message content cannot be empty.")
 
+    st.divider()
+    st.subheader("Read Receipts")
+    receipts = get_message_receipts(username)
+    if receipts.empty:
+        st.info("You haven't sent any messages yet.")
+    else:
+        for msg_id, rows in receipts.groupby("id", sort=False):
+            msg = rows.iloc[0]
+            readers = rows.dropna(subset=["reader"])
+            expiry = f", shown until {msg['expires_at'][:10]}" if isinstance(msg['expires_at'], str) else ""
+            with st.expander(f"{msg['type']} to {msg['target']} ({msg['date']}, {msg['status']}{expiry}) · read by {len(readers)}"):
+                st.write(msg['content'])
+                if not readers.empty:
+                    st.dataframe(readers[["reader", "read_at"]], use_container_width=True, hide_index=True)
+
     st.divider()
     st.subheader("Message Guidelines")
     st.info("""
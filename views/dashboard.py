@@ -1,7 +1,26 @@
 # views/dashboard.py
 import streamlit as st
 import pandas as pd
-from .database import get_data, get_attendance_data, get_messages, update_parent_feedback
+from .database import (get_data, get_attendance_data, get_messages, get_read_message_ids,
+                       mark_messages_read, now_ts, unread_message_count, update_parent_feedback)
+from .media import show_attachment
+
+# Messages already fetched stay in the session; each rerun asks only for ids
+# past the cursor, and locally drops any whose expiry has passed since
+def load_messages(target):
+    cache = st.session_state.get("msg_cache")
+    if cache is None or cache["target"] != target:
+        cache = {"target": target, "cursor": 0, "rows": None}
+    new = get_messages(target, after_id=cache["cursor"])
+    if not new.empty:
+        cache["rows"] = new if cache["rows"] is None else pd.concat([new, cache["rows"]], ignore_index=True)
+        cache["cursor"] = int(new["id"].max())
+    st.session_state["msg_cache"] = cache
+    rows = cache["rows"]
+    if rows is None:
+        return pd.DataFrame()
+    current = rows["expires_at"].isna() | (rows["expires_at"] > now_ts()[:19])
+    return rows[current]
 
 def show_page():
     role = st.session_state.get('role', '').lower()
@@ -17,23 +36,31 @@ def show_page():
     else:
         target_filter = "All"
 
-    msgs = get_messages(target_filter)
+    msgs = load_messages(target_filter)
     if not msgs.empty:
-        st.subheader("📢 Communication Hub")
+        unread = unread_message_count(target_filter, username)
+        st.subheader(f"📢 Communication Hub ({unread} unread)" if unread else "📢 Communication Hub")
+        read_ids = get_read_message_ids(msgs["id"].tolist(), username) if unread else set(msgs["id"])
         for _, msg in msgs.iterrows():
             icon = "✅" if msg['type'] == 'To-Do List' else "🔔"
+            new_tag = "" if msg['id'] in read_ids else " 🆕"
             with st.container(border=True):
-                st.markdown(f"**{icon} {msg['type']}** ({msg['date']})")
+                st.markdown(f"**{icon} {msg['type']}** ({msg['date']}){new_tag}")
                 st.write(msg['content'])
                 st.caption(f"From: {msg['author']}")
+        if unread and st.button("✔️ Mark all as read"):
+            mark_messages_read([i for i in msgs["id"] if i not in read_ids], username)
+            st.rerun()
         st.divider()
 
     # --- 2. ATTENDANCE SNAPSHOT ---
     st.subheader("📅 Attendance Overview")
+    # Closed school years live in Parquet archives (see views/partitions.py)
+    include_archived = st.checkbox("Include archived history", key="dash_include_archived")
     if role == 'parent':
-        att_df = get_attendance_data(child_name=child_link)
+        att_df = get_attendance_data(child_name=child_link, include_archived=include_archived)
     else:
-        att_df = get_attendance_data() # Admin/Staff see all
+        att_df = get_attendance_data(include_archived=include_archived) # Admin/Staff see all
     
     if not att_df.empty:
         # Show last 5 records
@@ -44,7 +71,7 @@ def show_page():
     # --- 3. PROGRESS UPDATES & FEEDBACK LOOP ---
     st.subheader("📈 Recent Progress & Therapy Notes")
     
-    df = get_data("progress")
+    df = get_data("progress", include_archived=include_archived)
     
     # Filter by child if it's a parent
     if role == 'parent' and child_link:
@@ -86,7 +113,7 @@ def show_page():
                         st.markdown("**🔒 Internal Clinical Notes:**")
                         st.write(row['notes'])
                         if row['media_path']:
-                            st.markdown(f"[🔗 View Attached Media]({row['media_path']})")
+                            show_attachment(row['media_path'], row['id'])
 
                     # --- FEEDBACK SECTION ---
                     st.divider()
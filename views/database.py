@@ -1,67 +1,398 @@
 # views/database.py
+import logging
+import os
+import contextvars
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
 import pandas as pd
 import streamlit as st
-from sqlalchemy import create_engine, text, inspect
-from datetime import datetime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from sqlalchemy import bindparam, create_engine, event, text, inspect
+from sqlalchemy import exc as sa_exc
+from datetime import datetime, timedelta, timezone
+from . import instrumentation
+
+# Settings come from a secrets section ([database] unless another is named),
+# overridable per key with TILP_<PREFIX>_<KEY> environment variables
+# (e.g. TILP_DB_URL=sqlite:///tilp.db, TILP_AUTH_SECRET=...)
+ENV_PREFIXES = {"database": "DB"}
+
+def db_setting(key, default=None, section="database"):
+    prefix = ENV_PREFIXES.get(section, section.upper())
+    env_val = os.environ.get(f"TILP_{prefix}_{key.upper()}")
+    if env_val is not None:
+        return env_val
+    try:
+        return st.secrets[section][key]
+    except Exception:
+        return default
+
+def get_database_url():
+    url = db_setting("url")
+    if url:
+        return url
+    user = st.secrets["postgres"]["user"]
+    password = st.secrets["postgres"]["password"]
+    host = st.secrets["postgres"]["host"]
+    port = st.secrets["postgres"]["port"]
+    database = st.secrets["postgres"]["database"]
+    return f"postgresql://{user}:{password}@{host}:{port}/{database}"
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",        # readers never block the writer
+    "synchronous": "NORMAL",      # safe with WAL, avoids an fsync per commit
+    "busy_timeout": 5000,         # wait for the write lock instead of failing
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+    "cache_size": -65536,         # 64 MB page cache
+    "mmap_size": 268435456,
+}
+
+def _set_sqlite_pragmas(dbapi_conn, _record):
+    cursor = dbapi_conn.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+# Pool policy is per engine: pool_size / max_overflow / pool_timeout /
+# pool_recycle for the primary, the same keys prefixed with read_ for the replica
+POOL_KEYS = {"pool_size": int, "max_overflow": int, "pool_timeout": float, "pool_recycle": int}
+
+def pool_settings(prefix=""):
+    settings = {}
+    for key, cast in POOL_KEYS.items():
+        value = db_setting(prefix + key)
+        if value is not None:
+            settings[key] = cast(value)
+    return settings
+
+def create_db_engine(db_url, label="primary", **pool_kwargs):
+    if db_url.startswith("sqlite"):
+        engine = create_engine(db_url, connect_args={"check_same_thread": False, "timeout": 30}, **pool_kwargs)
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    else:
+        engine = create_engine(db_url, pool_pre_ping=True, **pool_kwargs)
+    instrumentation.configure(db_setting("query_log_size"), db_setting("slow_query_ms"), db_setting("slow_query_log"))
+    instrumentation.install(engine)
+    instrumentation.install_pool_metrics(engine, label)
+    return engine
 
 @st.cache_resource
 def get_engine():
     try:
-        user = st.secrets["postgres"]["user"]
-        password = st.secrets["postgres"]["password"]
-        host = st.secrets["postgres"]["host"]
-        port = st.secrets["postgres"]["port"]
-        database = st.secrets["postgres"]["database"]
-        db_url = f"postgresql://{user}:{password}@{host}:{port}/{database}"
-        return create_engine(db_url, pool_pre_ping=True)
+        return create_db_engine(get_database_url(), **pool_settings())
     except Exception as e:
         st.error(f"Database connection failed: {e}")
         return None
 
-ENGINE = get_engine()
+# Read replica from [database] read_url; without one all reads use the primary
+@st.cache_resource
+def get_read_engine():
+    read_url = db_setting("read_url")
+    if not read_url:
+        return get_engine()
+    try:
+        return create_db_engine(read_url, label="replica", **pool_settings("read_"))
+    except Exception as e:
+        st.error(f"Read replica connection failed: {e}")
+        return get_engine()
+
+# Engines are created on first use (not at import), so the login screen can
+# render without opening a connection
+
+# --- READ/WRITE ROUTING ---
+# Writes stamp the session; for STICKY_SECONDS afterwards that session's reads
+# stay on the primary so the page rendered after st.rerun() sees its own write.
+STICKY_SECONDS = float(db_setting("sticky_seconds", 5))
+ROUTING_STATS = Counter()
+logger = logging.getLogger(__name__)
+
+def _session_state():
+    try:
+        return st.session_state if get_script_run_ctx() else None
+    except Exception:
+        return None
+
+def mark_write():
+    state = _session_state()
+    if state is not None:
+        state["_db_last_write"] = time.monotonic()
+
+def route_read():
+    engine, read_engine = get_engine(), get_read_engine()
+    if read_engine is engine:
+        ROUTING_STATS["primary (no replica)"] += 1
+        return engine
+    state = _session_state()
+    last_write = state.get("_db_last_write") if state is not None else None
+    if last_write is not None and time.monotonic() - last_write < STICKY_SECONDS:
+        ROUTING_STATS["primary (sticky)"] += 1
+        logger.debug("read routed to primary: session wrote %.2fs ago", time.monotonic() - last_write)
+        return engine
+    ROUTING_STATS["replica"] += 1
+    return read_engine
+
+# connect() checks a connection out of the pool, so timing it measures pool wait
+def _checkout(engine):
+    label = "replica" if engine is not get_engine() else "primary"
+    started = time.perf_counter()
+    try:
+        return engine.connect()
+    except sa_exc.TimeoutError:
+        instrumentation.record_pool_timeout(label)
+        raise
+    finally:
+        instrumentation.record_pool_wait(label, (time.perf_counter() - started) * 1000)
+
+def read_conn():
+    return _checkout(route_read())
+
+def write_conn():
+    ROUTING_STATS["primary (write)"] += 1
+    mark_write()
+    return _checkout(get_engine())
+
+def replica_lag_seconds():
+    read_engine = get_read_engine()
+    if read_engine is get_engine() or is_sqlite(read_engine):
+        return 0.0
+    with read_engine.connect() as conn:
+        lag = conn.execute(text("""SELECT CASE WHEN pg_is_in_recovery()
+            THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END""")).scalar()
+    return float(lag or 0.0)
+
+# --- DIALECT HELPERS ---
+def is_sqlite(engine=None):
+    return (engine or get_engine()).dialect.name == "sqlite"
+
+def serial_pk(engine=None):
+    return "INTEGER PRIMARY KEY AUTOINCREMENT" if is_sqlite(engine) else "SERIAL PRIMARY KEY"
+
+# INSERT ... ON CONFLICT is understood by both Postgres and SQLite (3.24+)
+def upsert_sql(table, cols, conflict_cols, update_cols=(), returning=False):
+    values = ", ".join(f":{c}" for c in cols)
+    sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({values}) ON CONFLICT ({', '.join(conflict_cols)}) "
+    if update_cols:
+        sql += "DO UPDATE SET " + ", ".join(f"{c} = EXCLUDED.{c}" for c in update_cols)
+    else:
+        sql += "DO NOTHING"
+    if returning:
+        sql += " RETURNING *"
+    return text(sql)
+
+# Row change stamp kept by the write helpers; incremental backups (views/backup.py)
+# export rows whose updated_at is past the previous run's watermark
+UPDATED_AT_TABLES = ("progress", "session_plans", "attendance", "users", "children",
+                     "invoices", "appointments", "messages", "library", "plan_templates")
+
+def now_ts():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+# --- AUDIT TRAIL ---
+# Write helpers report each change after it commits; views/audit.py queues the
+# event and appends it to audit_log from a background thread.
+def audit_write(action, table, key, before=None, after=None, actor=None):
+    from .audit import record
+    record(action, table, key, before, after, actor)
+
+def row_snapshot(conn, table, where, params):
+    row = conn.execute(text(f"SELECT * FROM {table} WHERE {where}"), params).mappings().first()
+    return dict(row) if row else None
+
+def returned_row(result):
+    row = result.mappings().first()
+    return dict(row) if row else None
+
+# --- TENANCY ---
+# Every clinic's rows carry a tenant id. The helpers below read and write only
+# current_tenant(): the clinic of the signed-in user (set at login), or the one
+# jobs and command-line tools select with use_tenant().
+DEFAULT_TENANT = db_setting("default_tenant", "main")
+if not re.fullmatch(r"[A-Za-z0-9_-]+", DEFAULT_TENANT):
+    raise ValueError(f"Invalid default tenant id: {DEFAULT_TENANT!r}")
+TENANT_COLUMN = f"tenant TEXT NOT NULL DEFAULT '{DEFAULT_TENANT}'"
+TENANT_TABLES = ("progress", "session_plans", "plan_templates", "attendance", "users", "children", "disciplines",
+                 "goal_areas", "invoices", "appointments", "messages", "library", "audit_log", "outbox", "jobs")
+# Natural keys that are unique within a clinic (upserts conflict on these)
+TENANT_UNIQUE = {
+    "children": ("tenant", "child_name"),
+    "disciplines": ("tenant", "name"),
+    "goal_areas": ("tenant", "name"),
+    "plan_templates": ("tenant", "name"),
+    "attendance": ("tenant", "date", "child_name"),
+}
+_tenant_override = contextvars.ContextVar("tenant", default=None)
+
+def current_tenant():
+    override = _tenant_override.get()
+    if override:
+        return override
+    state = _session_state()
+    return (state.get("tenant") if state is not None else None) or DEFAULT_TENANT
+
+@contextmanager
+def use_tenant(tenant):
+    token = _tenant_override.set(tenant or DEFAULT_TENANT)
+    try:
+        yield tenant
+    finally:
+        _tenant_override.reset(token)
+
+# Runs fn in a worker thread under the caller's tenant (context variables
+# don't cross into pool threads on their own)
+def in_tenant(fn):
+    tenant = current_tenant()
+    def run(*args, **kwargs):
+        with use_tenant(tenant):
+            return fn(*args, **kwargs)
+    return run
+
+def list_tenants():
+    if not get_engine(): return pd.DataFrame()
+    with read_conn() as conn:
+        return pd.read_sql_query(text("SELECT * FROM tenants ORDER BY tenant"), conn)
+
+def tenant_ids():
+    with read_conn() as conn:
+        return [r[0] for r in conn.execute(text("SELECT tenant FROM tenants ORDER BY tenant"))]
+
+# Clinics are managed from the default clinic only. A clinic and its first admin
+# are created together, so a failed admin insert doesn't leave behind a clinic
+# nobody can sign in to; existing clinics are never overwritten
+def create_tenant(tenant, name, admin_username, admin_password):
+    if current_tenant() != DEFAULT_TENANT:
+        raise ValueError("Clinics can only be created from the default clinic")
+    if not re.fullmatch(r"[A-Za-z0-9_-]+", tenant or ""):
+        raise ValueError("Clinic ids may only use letters, digits, '-' and '_'")
+    with write_conn() as conn:
+        try:
+            after = returned_row(conn.execute(text("INSERT INTO tenants (tenant, name, created_at) VALUES (:tenant, :name, :created_at) RETURNING *"),
+                                              {"tenant": tenant, "name": name, "created_at": now_ts()}))
+        except sa_exc.IntegrityError:
+            raise ValueError(f"Clinic '{tenant}' already exists") from None
+        admin = _insert_user(conn, admin_username, admin_password, "admin", "", tenant)
+        conn.commit()
+    audit_write("insert", "tenants", tenant, None, after)
+    with use_tenant(tenant):
+        audit_write("insert", "users", admin_username, None, admin)
+
+PROGRESS_COLUMNS = f"""date TEXT, child_name TEXT, discipline TEXT, goal_area TEXT, status TEXT, notes TEXT,
+    media_path TEXT, author TEXT, parent_note TEXT, parent_feedback TEXT, updated_at TEXT, {TENANT_COLUMN}"""
+ATTENDANCE_COLUMNS = f"date TEXT, child_name TEXT, status TEXT, logged_by TEXT, updated_at TEXT, {TENANT_COLUMN}"
 
 def init_db():
-    if not ENGINE: return
-    inspector = inspect(ENGINE)
-    with ENGINE.connect() as conn:
+    engine = get_engine()
+    if not engine: return
+    inspector = inspect(engine)
+    pk = serial_pk()
+    with engine.connect() as conn:
         # --- 1. CORE TABLES ---
-        conn.execute(text('''CREATE TABLE IF NOT EXISTS progress (
-            id SERIAL PRIMARY KEY, date TEXT, child_name TEXT, discipline TEXT, 
-            goal_area TEXT, status TEXT, notes TEXT, media_path TEXT, author TEXT,
-            parent_note TEXT, parent_feedback TEXT)''')) 
+        # progress and attendance are range-partitioned by month on Postgres
+        # (see views/partitions.py); the partition key must be part of every unique key
+        if is_sqlite():
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS progress (id {pk}, {PROGRESS_COLUMNS})"))
+        else:
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS progress (id SERIAL, {PROGRESS_COLUMNS}, PRIMARY KEY (id, date)) PARTITION BY RANGE (date)"))
 
-        conn.execute(text('''CREATE TABLE IF NOT EXISTS session_plans (
-            id SERIAL PRIMARY KEY, date TEXT, lead_staff TEXT, support_staff TEXT, 
+        conn.execute(text(f'''CREATE TABLE IF NOT EXISTS session_plans (
+            id {pk}, date TEXT, lead_staff TEXT, support_staff TEXT, 
             warm_up TEXT, learning_block TEXT, regulation_break TEXT, social_play TEXT, 
             closing_routine TEXT, materials_needed TEXT, internal_notes TEXT, author TEXT,
-            staff_comments TEXT, supervision_notes TEXT)'''))
+            staff_comments TEXT, supervision_notes TEXT, {TENANT_COLUMN})'''))
+
+        conn.execute(text(f'''CREATE TABLE IF NOT EXISTS plan_templates (
+            id {pk}, name TEXT, warm_up TEXT, learning_block TEXT, regulation_break TEXT,
+            social_play TEXT, closing_routine TEXT, materials_needed TEXT, internal_notes TEXT,
+            author TEXT, updated_at TEXT, {TENANT_COLUMN}, UNIQUE (tenant, name))'''))
 
-        conn.execute(text('''CREATE TABLE IF NOT EXISTS attendance (
-            id SERIAL PRIMARY KEY, date TEXT, child_name TEXT, status TEXT, 
-            logged_by TEXT, UNIQUE (date, child_name))'''))
+        if is_sqlite():
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS attendance (id {pk}, {ATTENDANCE_COLUMNS}, UNIQUE (tenant, date, child_name))"))
+        else:
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS attendance (id SERIAL, {ATTENDANCE_COLUMNS}, PRIMARY KEY (id, date), UNIQUE (tenant, date, child_name)) PARTITION BY RANGE (date)"))
         
-        conn.execute(text("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT, role TEXT, child_link TEXT)"))
-        conn.execute(text("CREATE TABLE IF NOT EXISTS children (id SERIAL PRIMARY KEY, child_name TEXT UNIQUE, parent_username TEXT, date_of_birth TEXT)"))
-        conn.execute(text("CREATE TABLE IF NOT EXISTS disciplines (name TEXT UNIQUE)"))
-        conn.execute(text("CREATE TABLE IF NOT EXISTS goal_areas (name TEXT UNIQUE)"))
+        # Usernames stay unique across clinics: login finds the user, then the user's clinic
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT, role TEXT, child_link TEXT, auth_version INTEGER DEFAULT 0, {TENANT_COLUMN})"))
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS children (id {pk}, child_name TEXT, parent_username TEXT, date_of_birth TEXT, {TENANT_COLUMN}, UNIQUE (tenant, child_name))"))
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS disciplines (name TEXT, {TENANT_COLUMN}, UNIQUE (tenant, name))"))
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS goal_areas (name TEXT, {TENANT_COLUMN}, UNIQUE (tenant, name))"))
+        conn.execute(text("CREATE TABLE IF NOT EXISTS tenants (tenant TEXT PRIMARY KEY, name TEXT, created_at TEXT)"))
         
         # --- 2. BILLING & SCHEDULE ---
-        conn.execute(text('''CREATE TABLE IF NOT EXISTS invoices (
-            id SERIAL PRIMARY KEY, date TEXT, child_name TEXT, 
-            item_desc TEXT, amount REAL, status TEXT, note TEXT)'''))
+        conn.execute(text(f'''CREATE TABLE IF NOT EXISTS invoices (
+            id {pk}, date TEXT, child_name TEXT, 
+            item_desc TEXT, amount REAL, status TEXT, note TEXT, {TENANT_COLUMN})'''))
             
-        conn.execute(text('''CREATE TABLE IF NOT EXISTS appointments (
-            id SERIAL PRIMARY KEY, date TEXT, time TEXT, child_name TEXT, 
-            discipline TEXT, staff TEXT, cost REAL, status TEXT)'''))
+        conn.execute(text(f'''CREATE TABLE IF NOT EXISTS appointments (
+            id {pk}, date TEXT, time TEXT, child_name TEXT, 
+            discipline TEXT, staff TEXT, cost REAL, status TEXT, {TENANT_COLUMN})'''))
         
         # --- 3. NEW FEATURE TABLES (COMMUNICATION & LIBRARY) ---
-        conn.execute(text('''CREATE TABLE IF NOT EXISTS messages (
-            id SERIAL PRIMARY KEY, date TEXT, type TEXT, target TEXT, 
-            content TEXT, author TEXT, status TEXT)'''))
+        conn.execute(text(f'''CREATE TABLE IF NOT EXISTS messages (
+            id {pk}, date TEXT, type TEXT, target TEXT, 
+            content TEXT, author TEXT, status TEXT, {TENANT_COLUMN})'''))
+        conn.execute(text("""CREATE TABLE IF NOT EXISTS message_reads (
+            message_id INTEGER, username TEXT, read_at TEXT, PRIMARY KEY (message_id, username))"""))
+
+        conn.execute(text(f'''CREATE TABLE IF NOT EXISTS library (
+            id {pk}, child_name TEXT, title TEXT, 
+            link_url TEXT, category TEXT, added_by TEXT, date_added TEXT, tags TEXT, {TENANT_COLUMN})'''))
+
+        # --- 4. SEARCH INDEX ---
+        if is_sqlite():
+            # FTS5 tables can't gain columns; an index from before tenancy is
+            # dropped here and rebuilt by the backfill at the end of init_db
+            if "search_index" in inspector.get_table_names() and \
+                    "tenant" not in [c["name"] for c in inspector.get_columns("search_index")]:
+                conn.execute(text("DROP TABLE search_index"))
+            conn.execute(text('''CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                title, body, source UNINDEXED, source_id UNINDEXED, child_name UNINDEXED,
+                audience UNINDEXED, date UNINDEXED, tenant UNINDEXED, tokenize = 'porter unicode61')'''))
+        else:
+            conn.execute(text('''CREATE TABLE IF NOT EXISTS search_index (
+                doc_id BIGINT PRIMARY KEY, title TEXT, body TEXT, source TEXT, source_id INTEGER,
+                child_name TEXT, audience TEXT, date TEXT, tenant TEXT,
+                tsv tsvector GENERATED ALWAYS AS (
+                    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                    setweight(to_tsvector('english', coalesce(body, '')), 'B')) STORED)'''))
+            conn.execute(text("ALTER TABLE search_index ADD COLUMN IF NOT EXISTS tenant TEXT"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_search_index_tsv ON search_index USING GIN (tsv)"))
+            conn.execute(text("DROP INDEX IF EXISTS idx_search_index_scope"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_search_index_tenant_scope ON search_index (tenant, audience, child_name)"))
+
+        # --- 5. AUDIT LOG ---
+        # Append-only: the triggers reject any UPDATE or DELETE of logged events
+        conn.execute(text(f'''CREATE TABLE IF NOT EXISTS audit_log (
+            id {pk}, ts TEXT, actor TEXT, action TEXT, table_name TEXT,
+            record_key TEXT, before_data TEXT, after_data TEXT, {TENANT_COLUMN})'''))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_audit_log_record ON audit_log (table_name, record_key)"))
+        if is_sqlite():
+            for op in ("UPDATE", "DELETE"):
+                conn.execute(text(f"""CREATE TRIGGER IF NOT EXISTS audit_log_no_{op.lower()} BEFORE {op} ON audit_log
+                    BEGIN SELECT RAISE(ABORT, 'audit_log is append-only'); END"""))
+        else:
+            conn.execute(text("""CREATE OR REPLACE FUNCTION audit_log_append_only() RETURNS trigger AS $$
+                BEGIN RAISE EXCEPTION 'audit_log is append-only'; END $$ LANGUAGE plpgsql"""))
+            conn.execute(text("DROP TRIGGER IF EXISTS audit_log_append_only ON audit_log"))
+            conn.execute(text("""CREATE TRIGGER audit_log_append_only BEFORE UPDATE OR DELETE ON audit_log
+                FOR EACH ROW EXECUTE FUNCTION audit_log_append_only()"""))
+
+        # --- 6. BACKGROUND JOBS (views/jobs.py) ---
+        conn.execute(text(f'''CREATE TABLE IF NOT EXISTS jobs (
+            id {pk}, kind TEXT, params TEXT, status TEXT, progress REAL, message TEXT, result TEXT,
+            created_by TEXT, schedule TEXT, worker TEXT, created_at TEXT, run_after TEXT,
+            started_at TEXT, heartbeat_at TEXT, finished_at TEXT, {TENANT_COLUMN})'''))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs (run_after, id) WHERE status = 'queued'"))
+        conn.execute(text("""CREATE TABLE IF NOT EXISTS job_schedules (
+            name TEXT PRIMARY KEY, kind TEXT, params TEXT, spec TEXT, enabled INTEGER DEFAULT 1,
+            next_run_at TEXT, last_job_id INTEGER)"""))
 
-        conn.execute(text('''CREATE TABLE IF NOT EXISTS library (
-            id SERIAL PRIMARY KEY, child_name TEXT, title TEXT, 
-            link_url TEXT, category TEXT, added_by TEXT, date_added TEXT)'''))
+        # Digests and other notifications waiting for a sender (views/digest.py)
+        conn.execute(text(f'''CREATE TABLE IF NOT EXISTS outbox (
+            id {pk}, recipient TEXT, kind TEXT, digest_date TEXT, subject TEXT, body TEXT,
+            status TEXT, created_at TEXT, sent_at TEXT, {TENANT_COLUMN}, UNIQUE (recipient, kind, digest_date))'''))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (id) WHERE status = 'pending'"))
 
         conn.commit()
         
@@ -75,238 +406,726 @@ def init_db():
         if 'staff_comments' not in s_cols:
             conn.execute(text("ALTER TABLE session_plans ADD COLUMN staff_comments TEXT"))
             conn.execute(text("ALTER TABLE session_plans ADD COLUMN supervision_notes TEXT"))
+
+        for table, cols in (("progress", p_cols), ("session_plans", s_cols)):
+            if 'author' not in cols:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN author TEXT"))
+
+        if 'expires_at' not in [c['name'] for c in inspector.get_columns('messages')]:
+            conn.execute(text("ALTER TABLE messages ADD COLUMN expires_at TEXT"))
+
+        if 'tags' not in [c['name'] for c in inspector.get_columns('library')]:
+            conn.execute(text("ALTER TABLE library ADD COLUMN tags TEXT"))
+
+        u_cols = [c['name'] for c in inspector.get_columns('users')]
+        if 'auth_version' not in u_cols:
+            conn.execute(text("ALTER TABLE users ADD COLUMN auth_version INTEGER DEFAULT 0"))
+
+        for table in UPDATED_AT_TABLES:
+            if 'updated_at' not in [c['name'] for c in inspector.get_columns(table)]:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN updated_at TEXT"))
+
+        # Tables from before tenancy: existing rows belong to the default clinic,
+        # and per-clinic unique keys replace the global ones (on SQLite the old
+        # constraint can't be dropped, so names stay unique across clinics there)
+        for table in TENANT_TABLES:
+            if 'tenant' in [c['name'] for c in inspector.get_columns(table)]:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {TENANT_COLUMN}"))
+            if table in TENANT_UNIQUE:
+                cols = TENANT_UNIQUE[table]
+                if not is_sqlite():
+                    conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_{'_'.join(cols[1:])}_key"))
+                conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_tenant ON {table} ({', '.join(cols)})"))
+        conn.execute(upsert_sql("tenants", ["tenant", "name", "created_at"], ["tenant"]),
+                     {"tenant": DEFAULT_TENANT, "name": DEFAULT_TENANT.title(), "created_at": now_ts()})
         
+        # --- TENANT-LEADING INDEXES ---
+        # Every per-clinic query filters on tenant first; these replace the
+        # earlier single-clinic indexes of the same purpose
+        for old in ("idx_appointments_date_staff", "idx_progress_child_date", "idx_appointments_child_date",
+                    "idx_session_plans_date", "idx_messages_active_target", "idx_audit_log_ts", "idx_library_tenant_child"):
+            conn.execute(text(f"DROP INDEX IF EXISTS {old}"))
+        # Date-ranged workload report, and its appointment -> progress note lookup
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_appointments_tenant_date_staff ON appointments (tenant, date, staff)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_progress_tenant_child_date ON progress (tenant, child_name, date)"))
+        # Per-child schedules, invoices and calendar feeds (views/ical.py)
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_appointments_tenant_child_date ON appointments (tenant, child_name, date)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_invoices_tenant_child_date ON invoices (tenant, child_name, date)"))
+        # Copy-forward skips target dates that already have a plan
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_session_plans_tenant_date ON session_plans (tenant, date)"))
+        # Library counts per category and newest-first pages within one
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_library_tenant_child_category_date ON library (tenant, child_name, category, date_added)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_users_tenant ON users (tenant, role)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_audit_log_tenant_ts ON audit_log (tenant, ts)"))
+        # Snapshot export (views/snapshots.py) reads one month across every clinic
+        for table in ("progress", "attendance", "appointments", "invoices"):
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table}_date ON {table} (date)"))
+        # Only Active messages are ever polled, so expired ones stay out of the index
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_messages_tenant_active_target ON messages (tenant, target, id) WHERE status = 'Active'"))
+
         conn.commit()
 
+        if not is_sqlite():
+            from .partitions import ensure_partitions
+            ensure_partitions(conn)
+            conn.commit()
+
+        # Backfill the search index the first time it is created
+        if conn.execute(text("SELECT COUNT(*) FROM search_index")).scalar() == 0:
+            rebuild_search_index(conn)
+            conn.commit()
+
 # --- AUTHENTICATION & USERS ---
-def get_user(username, password):
-    if not ENGINE: return None
-    sql = text("SELECT * FROM users WHERE username = :user AND password = :pass")
-    with ENGINE.connect() as conn:
-        df = pd.read_sql(sql, conn, params={"user":username, "pass":password})
-    return df.iloc[0].to_dict() if not df.empty else None
+# Login lives in views/auth.py. Every role/child-link change bumps auth_version
+# so signed-in sessions pick it up on their next rerun.
+
+# Session tokens are "username|expires_at|signature" (views/auth.py)
+def check_username(username):
+    if not username or "|" in username:
+        raise ValueError("Usernames must not be empty or contain '|'")
+
+def _insert_user(conn, username, password, role, child_link, tenant):
+    from .auth import hash_password
+    check_username(username)
+    try:
+        return returned_row(conn.execute(text("INSERT INTO users (username, password, role, child_link, auth_version, updated_at, tenant) VALUES (:u, :p, :r, :c, 0, :ts, :tenant) RETURNING *"),
+                                         {"u": username, "p": hash_password(password), "r": role, "c": child_link, "ts": now_ts(), "tenant": tenant}))
+    except sa_exc.IntegrityError:
+        raise ValueError(f"Username '{username}' is already taken") from None
+
+# Insert-only: never touches an existing account, in this clinic or another
+def create_user(username, password, role, child_link):
+    if not get_engine(): return
+    with write_conn() as conn:
+        after = _insert_user(conn, username, password, role, child_link, current_tenant())
+        conn.commit()
+    audit_write("insert", "users", username, None, after)
 
 def upsert_user(username, password, role, child_link):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        result = conn.execute(text("SELECT username FROM users WHERE username = :u"), {"u": username}).fetchone()
-        if result:
+    if not get_engine(): return
+    from .auth import hash_password, set_version
+    check_username(username)
+    with write_conn() as conn:
+        before = row_snapshot(conn, "users", "username = :u", {"u": username})
+        if before:
             if password:
-                sql = text("UPDATE users SET password=:p, role=:r, child_link=:c WHERE username=:u")
+                sql = text("UPDATE users SET password=:p, role=:r, child_link=:c, auth_version=COALESCE(auth_version, 0) + 1, updated_at=:ts WHERE username=:u AND tenant=:tenant RETURNING *")
             else:
-                sql = text("UPDATE users SET role=:r, child_link=:c WHERE username=:u")
-            conn.execute(sql, {"u": username, "p": password, "r": role, "c": child_link})
+                sql = text("UPDATE users SET role=:r, child_link=:c, auth_version=COALESCE(auth_version, 0) + 1, updated_at=:ts WHERE username=:u AND tenant=:tenant RETURNING *")
+            after = returned_row(conn.execute(sql, {"u": username, "p": hash_password(password) if password else None, "r": role, "c": child_link, "ts": now_ts(), "tenant": current_tenant()}))
         else:
-            conn.execute(text("INSERT INTO users (username, password, role, child_link) VALUES (:u, :p, :r, :c)"), {"u": username, "p": password, "r": role, "c": child_link})
+            after = _insert_user(conn, username, password, role, child_link, current_tenant())
         conn.commit()
+    # A username taken by another clinic is neither updated nor re-created
+    if after is None:
+        raise ValueError(f"Username '{username}' belongs to another clinic")
+    audit_write("update" if before else "insert", "users", username, before, after)
+    set_version(username, after["auth_version"])
 
 def delete_user(username):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        conn.execute(text("DELETE FROM users WHERE username = :u"), {"u": username})
+    if not get_engine(): return
+    from .auth import forget_user
+    with write_conn() as conn:
+        before = returned_row(conn.execute(text("DELETE FROM users WHERE username = :u AND tenant = :tenant RETURNING *"), {"u": username, "tenant": current_tenant()}))
         conn.commit()
+    audit_write("delete", "users", username, before)
+    forget_user(username)
 
 # --- GENERIC GETTERS ---
-def get_data(table):
-    if not ENGINE: return pd.DataFrame()
-    with ENGINE.connect() as conn:
-        inspector = inspect(ENGINE)
-        cols = [c['name'] for c in inspector.get_columns(table)]
-        if 'author' not in cols and table in ['progress', 'session_plans']:
-            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN author TEXT"))
-            conn.commit()
-        return pd.read_sql_query(f"SELECT * FROM {table}", conn)
+def get_data(table, include_archived=False):
+    if not get_engine(): return pd.DataFrame()
+    with read_conn() as conn:
+        df = pd.read_sql_query(text(f"SELECT * FROM {table} WHERE tenant = :tenant"), conn, params={"tenant": current_tenant()})
+    if include_archived and table in ARCHIVED_TABLES:
+        df = pd.concat([df, read_archive(table)], ignore_index=True)
+    return df
 
 def get_list_data(table):
-    if not ENGINE: return pd.DataFrame()
-    with ENGINE.connect() as conn:
-        return pd.read_sql_query(f"SELECT * FROM {table}", conn)
+    if not get_engine(): return pd.DataFrame()
+    with read_conn() as conn:
+        return pd.read_sql_query(text(f"SELECT * FROM {table} WHERE tenant = :tenant"), conn, params={"tenant": current_tenant()})
 
 # --- PROGRESS UPDATES ---
 def save_progress(date, child, discipline, goal, status, notes, media, author, p_note):
-    if not ENGINE: return
-    sql = text("""INSERT INTO progress (date, child_name, discipline, goal_area, status, notes, media_path, author, parent_note) 
-                  VALUES (:d, :c, :dis, :g, :s, :n, :m, :a, :pn)""")
-    with ENGINE.connect() as conn:
-        conn.execute(sql, {"d":date, "c":child, "dis":discipline, "g":goal, "s":status, "n":notes, "m":media, "a":author, "pn":p_note})
+    if not get_engine(): return
+    sql = text("""INSERT INTO progress (date, child_name, discipline, goal_area, status, notes, media_path, author, parent_note, updated_at, tenant) 
+                  VALUES (:d, :c, :dis, :g, :s, :n, :m, :a, :pn, :ts, :tenant) RETURNING *""")
+    with write_conn() as conn:
+        after = returned_row(conn.execute(sql, {"d":date, "c":child, "dis":discipline, "g":goal, "s":status, "n":notes, "m":media, "a":author, "pn":p_note, "ts":now_ts(), "tenant":current_tenant()}))
+        reindex_document(conn, "progress", after["id"])
         conn.commit()
+    audit_write("insert", "progress", after["id"], None, after)
 
 def update_parent_feedback(pid, feedback):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        conn.execute(text("UPDATE progress SET parent_feedback = :f WHERE id = :id"), {"f":feedback, "id":pid})
+    if not get_engine(): return
+    with write_conn() as conn:
+        before = row_snapshot(conn, "progress", "id = :id AND tenant = :tenant", {"tenant": current_tenant(), "id": pid})
+        after = returned_row(conn.execute(text("UPDATE progress SET parent_feedback = :f, updated_at = :ts WHERE id = :id AND tenant = :tenant RETURNING *"), {"tenant":current_tenant(), "f":feedback, "ts":now_ts(), "id":pid}))
+        reindex_document(conn, "progress", pid)
         conn.commit()
+    audit_write("update", "progress", pid, before, after)
 
 def delete_progress(progress_id):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        conn.execute(text("DELETE FROM progress WHERE id = :id"), {"id": progress_id})
+    if not get_engine(): return
+    with write_conn() as conn:
+        before = returned_row(conn.execute(text("DELETE FROM progress WHERE id = :id AND tenant = :tenant RETURNING *"), {"id": progress_id, "tenant": current_tenant()}))
+        if before:
+            reindex_document(conn, "progress", progress_id)
         conn.commit()
+    audit_write("delete", "progress", progress_id, before)
 
 # --- PLANNER UPDATES ---
 def save_plan(date, lead, support, wu, lb, rb, sp, cr, mn, notes, author):
-    if not ENGINE: return
+    if not get_engine(): return
     sql = text("""INSERT INTO session_plans (date, lead_staff, support_staff, warm_up, learning_block, 
-                  regulation_break, social_play, closing_routine, materials_needed, internal_notes, author, staff_comments, supervision_notes) 
-                  VALUES (:d, :ls, :ss, :wu, :lb, :rb, :sp, :cr, :mn, :in, :a, '', '')""")
+                  regulation_break, social_play, closing_routine, materials_needed, internal_notes, author, staff_comments, supervision_notes, updated_at, tenant) 
+                  VALUES (:d, :ls, :ss, :wu, :lb, :rb, :sp, :cr, :mn, :in, :a, '', '', :ts, :tenant) RETURNING *""")
     ss_str = ", ".join(support) if isinstance(support, list) else str(support)
-    with ENGINE.connect() as conn:
-        conn.execute(sql, {"d":date, "ls":lead, "ss":ss_str, "wu":wu, "lb":lb, "rb":rb, "sp":sp, "cr":cr, "mn":mn, "in":notes, "a":author})
+    with write_conn() as conn:
+        after = returned_row(conn.execute(sql, {"d":date, "ls":lead, "ss":ss_str, "wu":wu, "lb":lb, "rb":rb, "sp":sp, "cr":cr, "mn":mn, "in":notes, "a":author, "ts":now_ts(), "tenant":current_tenant()}))
+        reindex_document(conn, "session_plans", after["id"])
         conn.commit()
+    audit_write("insert", "session_plans", after["id"], None, after)
 
 def update_plan_extras(pid, comments, supervision):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
+    if not get_engine(): return
+    with write_conn() as conn:
+        before = row_snapshot(conn, "session_plans", "id = :id AND tenant = :tenant", {"tenant": current_tenant(), "id": pid})
+        if not before:
+            return
         if comments:
-            conn.execute(text("UPDATE session_plans SET staff_comments =COALESCE(staff_comments, '') || :c WHERE id = :id"), {"c": "\n" + comments, "id": pid})
+            conn.execute(text("UPDATE session_plans SET staff_comments =COALESCE(staff_comments, '') || :c, updated_at = :ts WHERE id = :id AND tenant = :tenant"), {"c": "\n" + comments, "ts": now_ts(), "id": pid, "tenant": current_tenant()})
         if supervision:
-            conn.execute(text("UPDATE session_plans SET supervision_notes = :s WHERE id = :id"), {"s": supervision, "id": pid})
+            conn.execute(text("UPDATE session_plans SET supervision_notes = :s, updated_at = :ts WHERE id = :id AND tenant = :tenant"), {"s": supervision, "ts": now_ts(), "id": pid, "tenant": current_tenant()})
+        after = row_snapshot(conn, "session_plans", "id = :id AND tenant = :tenant", {"tenant": current_tenant(), "id": pid})
+        reindex_document(conn, "session_plans", pid)
+        conn.commit()
+    audit_write("update", "session_plans", pid, before, after)
+
+# --- PLAN TEMPLATES & COPY-FORWARD ---
+PLAN_FIELDS = ["warm_up", "learning_block", "regulation_break", "social_play", "closing_routine", "materials_needed", "internal_notes"]
+
+def save_plan_template(name, wu, lb, rb, sp, cr, mn, notes, author):
+    if not get_engine(): return
+    cols = ["name"] + PLAN_FIELDS + ["author", "updated_at", "tenant"]
+    sql = upsert_sql("plan_templates", cols, ["tenant", "name"], cols[1:-1], returning=True)
+    tenant = current_tenant()
+    with write_conn() as conn:
+        before = row_snapshot(conn, "plan_templates", "tenant = :tenant AND name = :n", {"tenant": tenant, "n": name})
+        after = returned_row(conn.execute(sql, dict(zip(cols, [name, wu, lb, rb, sp, cr, mn, notes, author, now_ts(), tenant]))))
         conn.commit()
+    audit_write("update" if before else "insert", "plan_templates", after["id"], before, after)
+
+def get_plan_templates():
+    if not get_engine(): return pd.DataFrame()
+    with read_conn() as conn:
+        return pd.read_sql_query(text("SELECT * FROM plan_templates WHERE tenant = :tenant ORDER BY name"), conn, params={"tenant": current_tenant()})
+
+def delete_plan_template(template_id):
+    if not get_engine(): return
+    with write_conn() as conn:
+        before = returned_row(conn.execute(text("DELETE FROM plan_templates WHERE id = :id AND tenant = :tenant RETURNING *"), {"id": template_id, "tenant": current_tenant()}))
+        conn.commit()
+    audit_write("delete", "plan_templates", template_id, before)
+
+# One INSERT ... SELECT per call: `mapping` is a list of (source, target) date
+# pairs sent as a VALUES list and joined to the template or source-day plans.
+# Target dates that already have a plan are skipped; the batch is audited as
+# one event listing the new plans. Returns plans created.
+def _insert_plans(mapping, select_list, source_join, params):
+    if not get_engine() or not mapping: return 0
+    values = ", ".join(f"(:s{i}, :d{i})" for i in range(len(mapping)))
+    for i, (src, dst) in enumerate(mapping):
+        params[f"s{i}"], params[f"d{i}"] = str(src), str(dst)
+    params["tenant"] = current_tenant()
+    fields = ", ".join(PLAN_FIELDS)
+    sql = text(f"""WITH mapping (src, dst) AS (VALUES {values})
+        INSERT INTO session_plans (date, lead_staff, support_staff, {fields}, author, staff_comments, supervision_notes, updated_at, tenant)
+        SELECT m.dst, {select_list}, :tenant
+        FROM mapping m {source_join}
+        WHERE NOT EXISTS (SELECT 1 FROM session_plans existing WHERE existing.tenant = :tenant AND existing.date = m.dst)
+        RETURNING id, date""")
+    with write_conn() as conn:
+        created = {r.id: r.date for r in conn.execute(sql, params)}
+        reindex_documents(conn, "session_plans", list(created))
+        conn.commit()
+    if created:
+        audit_write("bulk_insert", "session_plans", ",".join(map(str, created)), None, {"plans": created})
+    return len(created)
+
+def apply_plan_template(template_id, dates, lead, author):
+    fields = ", ".join(f"t.{f}" for f in PLAN_FIELDS)
+    return _insert_plans([(d, d) for d in dates], f":lead, 'Team', {fields}, :author, '', '', :ts",
+                         "JOIN plan_templates t ON t.id = :tid AND t.tenant = :tenant",
+                         {"tid": int(template_id), "lead": lead, "author": author, "ts": now_ts()})
+
+# Source days repeat across the target range: a one-day source fills every
+# target day, a 7-day source lines up weekday by weekday wherever it starts
+def copy_plans_forward(source_start, source_end, target_start, target_end, author, weekdays_only=True):
+    span = (source_end - source_start).days + 1
+    mapping = []
+    for offset in range((target_end - target_start).days + 1):
+        target = target_start + timedelta(days=offset)
+        if weekdays_only and target.weekday() >= 5:
+            continue
+        mapping.append((source_start + timedelta(days=(target - source_start).days % span), target))
+    fields = ", ".join(f"p.{f}" for f in PLAN_FIELDS)
+    return _insert_plans(mapping, f"p.lead_staff, p.support_staff, {fields}, :author, '', '', :ts",
+                         "JOIN session_plans p ON p.tenant = :tenant AND p.date = m.src", {"author": author, "ts": now_ts()})
 
 def delete_plan(plan_id):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        conn.execute(text("DELETE FROM session_plans WHERE id = :id"), {"id": plan_id})
+    if not get_engine(): return
+    with write_conn() as conn:
+        before = returned_row(conn.execute(text("DELETE FROM session_plans WHERE id = :id AND tenant = :tenant RETURNING *"), {"id": plan_id, "tenant": current_tenant()}))
+        if before:
+            reindex_document(conn, "session_plans", plan_id)
         conn.commit()
+    audit_write("delete", "session_plans", plan_id, before)
 
 # --- ATTENDANCE ---
 def upsert_attendance(date, child_name, status, logged_by):
-    if not ENGINE: return
-    sql = text("""INSERT INTO attendance (date, child_name, status, logged_by) VALUES (:d, :cn, :s, :lb)
-        ON CONFLICT (date, child_name) DO UPDATE SET status = EXCLUDED.status, logged_by = EXCLUDED.logged_by""")
-    with ENGINE.connect() as conn:
-        conn.execute(sql, {"d": date, "cn": child_name, "s": status, "lb": logged_by})
+    if not get_engine(): return
+    sql = upsert_sql("attendance", ["date", "child_name", "status", "logged_by", "updated_at", "tenant"], ["tenant", "date", "child_name"], ["status", "logged_by", "updated_at"], returning=True)
+    tenant = current_tenant()
+    with write_conn() as conn:
+        before = row_snapshot(conn, "attendance", "tenant = :tenant AND date = :d AND child_name = :c", {"tenant": tenant, "d": str(date), "c": child_name})
+        after = returned_row(conn.execute(sql, {"date": str(date), "child_name": child_name, "status": status, "logged_by": logged_by, "updated_at": now_ts(), "tenant": tenant}))
         conn.commit()
+    audit_write("update" if before else "insert", "attendance", after["id"], before, after)
 
-def get_attendance_data(date=None, child_name=None):
-    if not ENGINE: return pd.DataFrame()
-    query = "SELECT * FROM attendance"
-    params = {}
+def get_attendance_data(date=None, child_name=None, include_archived=False):
+    if not get_engine(): return pd.DataFrame()
+    query = "SELECT * FROM attendance WHERE tenant = :tenant"
+    params = {"tenant": current_tenant()}
     if date:
-        query += " WHERE date = :d"
+        query += " AND date = :d"
         params["d"] = date
     elif child_name:
-        query += " WHERE child_name = :cn ORDER BY date DESC"
+        query += " AND child_name = :cn ORDER BY date DESC"
         params["cn"] = child_name
     else:
         query += " ORDER BY date DESC"
-    with ENGINE.connect() as conn:
-        return pd.read_sql_query(text(query), conn, params=params)
+    with read_conn() as conn:
+        df = pd.read_sql_query(text(query), conn, params=params)
+    if include_archived:
+        archived = read_archive("attendance", child_name=child_name, start=date, end=date)
+        if not archived.empty:
+            df = pd.concat([df, archived], ignore_index=True).sort_values("date", ascending=False)
+    return df
 
 def delete_attendance(att_id):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        conn.execute(text("DELETE FROM attendance WHERE id = :id"), {"id": att_id})
+    if not get_engine(): return
+    with write_conn() as conn:
+        before = returned_row(conn.execute(text("DELETE FROM attendance WHERE id = :id AND tenant = :tenant RETURNING *"), {"id": att_id, "tenant": current_tenant()}))
         conn.commit()
+    audit_write("delete", "attendance", att_id, before)
 
 # --- HELPERS (Child/Lists) ---
 def upsert_child(cn, pu, dob):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        conn.execute(text("INSERT INTO children (child_name, parent_username, date_of_birth) VALUES (:cn, :pu, :dob) ON CONFLICT (child_name) DO UPDATE SET parent_username=EXCLUDED.parent_username, date_of_birth=EXCLUDED.date_of_birth"), {"cn": cn, "pu": pu, "dob": dob})
+    if not get_engine(): return
+    with write_conn() as conn:
+        sql = upsert_sql("children", ["child_name", "parent_username", "date_of_birth", "updated_at", "tenant"], ["tenant", "child_name"], ["parent_username", "date_of_birth", "updated_at"], returning=True)
+        before = row_snapshot(conn, "children", "tenant = :tenant AND child_name = :cn", {"tenant": current_tenant(), "cn": cn})
+        after = returned_row(conn.execute(sql, {"child_name": cn, "parent_username": pu, "date_of_birth": dob, "updated_at": now_ts(), "tenant": current_tenant()}))
         conn.commit()
+    audit_write("update" if before else "insert", "children", cn, before, after)
 
 def delete_child(cn):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        conn.execute(text("DELETE FROM children WHERE child_name = :cn"), {"cn": cn})
+    if not get_engine(): return
+    with write_conn() as conn:
+        before = returned_row(conn.execute(text("DELETE FROM children WHERE tenant = :tenant AND child_name = :cn RETURNING *"), {"tenant": current_tenant(), "cn": cn}))
         conn.commit()
+    audit_write("delete", "children", cn, before)
 
 def upsert_list_item(table, item):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        conn.execute(text(f"INSERT INTO {table} (name) VALUES (:n) ON CONFLICT (name) DO NOTHING"), {"n": item})
+    if not get_engine(): return
+    with write_conn() as conn:
+        after = returned_row(conn.execute(upsert_sql(table, ["name", "tenant"], ["tenant", "name"], returning=True), {"name": item, "tenant": current_tenant()}))
         conn.commit()
+    # DO NOTHING returns no row when the item already existed
+    if after:
+        audit_write("insert", table, item, None, after)
 
 def delete_list_item(table, item):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        conn.execute(text(f"DELETE FROM {table} WHERE name = :n"), {"n": item})
+    if not get_engine(): return
+    with write_conn() as conn:
+        before = returned_row(conn.execute(text(f"DELETE FROM {table} WHERE tenant = :tenant AND name = :n RETURNING *"), {"tenant": current_tenant(), "n": item}))
         conn.commit()
+    audit_write("delete", table, item, before)
 
 # --- BILLING (INVOICES) ---
 def create_invoice(date, child, item, amount, status, note):
-    if not ENGINE: return
-    sql = text("INSERT INTO invoices (date, child_name, item_desc, amount, status, note) VALUES (:d, :c, :i, :a, :s, :n)")
-    with ENGINE.connect() as conn:
-        conn.execute(sql, {"d": date, "c": child, "i": item, "a": amount, "s": status, "n": note})
+    if not get_engine(): return
+    sql = text("INSERT INTO invoices (date, child_name, item_desc, amount, status, note, updated_at, tenant) VALUES (:d, :c, :i, :a, :s, :n, :ts, :tenant) RETURNING *")
+    with write_conn() as conn:
+        after = returned_row(conn.execute(sql, {"d": date, "c": child, "i": item, "a": amount, "s": status, "n": note, "ts": now_ts(), "tenant": current_tenant()}))
         conn.commit()
+    audit_write("insert", "invoices", after["id"], None, after)
 
 def get_invoices(child_name=None):
-    if not ENGINE: return pd.DataFrame()
-    query = "SELECT * FROM invoices"
-    params = {}
+    if not get_engine(): return pd.DataFrame()
+    query = "SELECT * FROM invoices WHERE tenant = :tenant"
+    params = {"tenant": current_tenant()}
     if child_name:
-        query += " WHERE child_name = :c"
+        query += " AND child_name = :c"
         params["c"] = child_name
     query += " ORDER BY date DESC"
-    with ENGINE.connect() as conn:
+    with read_conn() as conn:
         return pd.read_sql_query(text(query), conn, params=params)
 
 def update_invoice_status(inv_id, new_status):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        conn.execute(text("UPDATE invoices SET status = :s WHERE id = :id"), {"s": new_status, "id": inv_id})
+    if not get_engine(): return
+    with write_conn() as conn:
+        before = row_snapshot(conn, "invoices", "id = :id AND tenant = :tenant", {"tenant": current_tenant(), "id": inv_id})
+        after = returned_row(conn.execute(text("UPDATE invoices SET status = :s, updated_at = :ts WHERE id = :id AND tenant = :tenant RETURNING *"), {"tenant": current_tenant(), "s": new_status, "ts": now_ts(), "id": inv_id}))
         conn.commit()
+    audit_write("update", "invoices", inv_id, before, after)
 
 def delete_invoice(inv_id):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        conn.execute(text("DELETE FROM invoices WHERE id = :id"), {"id": inv_id})
+    if not get_engine(): return
+    with write_conn() as conn:
+        before = returned_row(conn.execute(text("DELETE FROM invoices WHERE id = :id AND tenant = :tenant RETURNING *"), {"id": inv_id, "tenant": current_tenant()}))
         conn.commit()
+    audit_write("delete", "invoices", inv_id, before)
 
 # --- SCHEDULE (APPOINTMENTS) ---
 def create_appointment(date, time, child, discipline, staff, cost, status):
-    if not ENGINE: return
-    sql = text("INSERT INTO appointments (date, time, child_name, discipline, staff, cost, status) VALUES (:d, :t, :c, :dis, :st, :co, :stat)")
-    with ENGINE.connect() as conn:
-        conn.execute(sql, {"d": date, "t": time, "c": child, "dis": discipline, "st": staff, "co": cost, "stat": status})
+    if not get_engine(): return
+    sql = text("INSERT INTO appointments (date, time, child_name, discipline, staff, cost, status, updated_at, tenant) VALUES (:d, :t, :c, :dis, :st, :co, :stat, :ts, :tenant) RETURNING *")
+    with write_conn() as conn:
+        after = returned_row(conn.execute(sql, {"d": date, "t": time, "c": child, "dis": discipline, "st": staff, "co": cost, "stat": status, "ts": now_ts(), "tenant": current_tenant()}))
         conn.commit()
+    audit_write("insert", "appointments", after["id"], None, after)
 
-def get_appointments(child_name=None):
-    if not ENGINE: return pd.DataFrame()
-    query = "SELECT * FROM appointments"
-    params = {}
+def get_appointments(child_name=None, staff=None):
+    if not get_engine(): return pd.DataFrame()
+    query = "SELECT * FROM appointments WHERE tenant = :tenant"
+    params = {"tenant": current_tenant()}
     if child_name:
-        query += " WHERE child_name = :c"
+        query += " AND child_name = :c"
         params["c"] = child_name
+    if staff:
+        query += " AND staff = :s"
+        params["s"] = staff
     query += " ORDER BY date DESC, time ASC"
-    with ENGINE.connect() as conn:
+    with read_conn() as conn:
         return pd.read_sql_query(text(query), conn, params=params)
 
 def update_appointment(appt_id, date, time, status):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        conn.execute(text("UPDATE appointments SET date=:d, time=:t, status=:s WHERE id=:id"), {"d": date, "t": time, "s": status, "id": appt_id})
+    if not get_engine(): return
+    with write_conn() as conn:
+        before = row_snapshot(conn, "appointments", "id = :id AND tenant = :tenant", {"tenant": current_tenant(), "id": appt_id})
+        after = returned_row(conn.execute(text("UPDATE appointments SET date=:d, time=:t, status=:s, updated_at=:ts WHERE id=:id AND tenant=:tenant RETURNING *"), {"tenant": current_tenant(), "d": date, "t": time, "s": status, "ts": now_ts(), "id": appt_id}))
         conn.commit()
+    audit_write("update", "appointments", appt_id, before, after)
 
 def delete_appointment(appt_id):
-    if not ENGINE: return
-    with ENGINE.connect() as conn:
-        conn.execute(text("DELETE FROM appointments WHERE id = :id"), {"id": appt_id})
+    if not get_engine(): return
+    with write_conn() as conn:
+        before = returned_row(conn.execute(text("DELETE FROM appointments WHERE id = :id AND tenant = :tenant RETURNING *"), {"id": appt_id, "tenant": current_tenant()}))
         conn.commit()
+    audit_write("delete", "appointments", appt_id, before)
 
 # --- NEW: LIBRARY & MESSAGES ---
-def add_library_link(child, title, url, cat, user):
-    if not ENGINE: return
-    sql = text("INSERT INTO library (child_name, title, link_url, category, added_by, date_added) VALUES (:c, :t, :u, :cat, :a, :d)")
-    with ENGINE.connect() as conn:
-        conn.execute(sql, {"c":child, "t":title, "u":url, "cat":cat, "a":user, "d":str(pd.Timestamp.now().date())})
+# Tags are stored lower-case and comma-separated ("fine-motor,home"), so one
+# tag matches with a LIKE on the comma-wrapped list
+def normalize_tags(tags):
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    cleaned = []
+    for tag in tags or []:
+        tag = re.sub(r"\s+", "-", tag.strip().lower())
+        if tag and tag not in cleaned:
+            cleaned.append(tag)
+    return ",".join(cleaned) or None
+
+def add_library_link(child, title, url, cat, user, tags=None):
+    if not get_engine(): return
+    sql = text("INSERT INTO library (child_name, title, link_url, category, added_by, date_added, tags, updated_at, tenant) VALUES (:c, :t, :u, :cat, :a, :d, :tg, :ts, :tenant) RETURNING *")
+    with write_conn() as conn:
+        after = returned_row(conn.execute(sql, {"c":child, "t":title, "u":url, "cat":cat, "a":user, "d":str(pd.Timestamp.now().date()), "tg":normalize_tags(tags), "ts":now_ts(), "tenant":current_tenant()}))
+        reindex_document(conn, "library", after["id"])
         conn.commit()
+    audit_write("insert", "library", after["id"], None, after)
 
-def get_library(child_name):
-    if not ENGINE: return pd.DataFrame()
-    with ENGINE.connect() as conn:
-        return pd.read_sql_query(text("SELECT * FROM library WHERE child_name = :c OR child_name = 'All'"), conn, params={"c":child_name})
+# A child's name gives that child's items plus the shared ones; anything else
+# ('All', '', None - e.g. a parent with no linked child) only the shared items.
+# all_children is the whole clinic library and is for staff only.
+def _library_scope(child_name, tag, all_children=False):
+    clauses, params = ["tenant = :tenant"], {"tenant": current_tenant()}
+    if all_children:
+        pass
+    elif child_name and child_name not in ("All", "None"):
+        clauses.append("child_name IN (:c, 'All')")
+        params["c"] = child_name
+    else:
+        clauses.append("child_name = 'All'")
+    if tag:
+        clauses.append("',' || tags || ',' LIKE :tag")
+        params["tag"] = f"%,{normalize_tags(tag)},%"
+    return " AND ".join(clauses), params
+
+# One grouped query; the page lists categories from it without loading items
+def library_category_counts(child_name=None, tag=None, all_children=False):
+    if not get_engine(): return pd.DataFrame(columns=["category", "items"])
+    where, params = _library_scope(child_name, tag, all_children)
+    with read_conn() as conn:
+        return pd.read_sql_query(text(f"""SELECT category, COUNT(*) AS items FROM library WHERE {where}
+            GROUP BY category ORDER BY category"""), conn, params=params)
+
+# Newest first, page_size rows of one category
+def get_library_page(category, child_name=None, tag=None, page=1, page_size=10, all_children=False):
+    if not get_engine(): return pd.DataFrame()
+    where, params = _library_scope(child_name, tag, all_children)
+    if category is None:
+        where += " AND category IS NULL"
+    else:
+        where += " AND category = :cat"
+        params["cat"] = category
+    params.update({"limit": page_size, "offset": (max(page, 1) - 1) * page_size})
+    with read_conn() as conn:
+        return pd.read_sql_query(text(f"""SELECT * FROM library WHERE {where}
+            ORDER BY date_added DESC, id DESC LIMIT :limit OFFSET :offset"""), conn, params=params)
 
-def create_message(m_type, target, content, author):
-    if not ENGINE: return
-    sql = text("INSERT INTO messages (date, type, target, content, author, status) VALUES (:d, :t, :tg, :c, :a, 'Active')")
-    with ENGINE.connect() as conn:
-        conn.execute(sql, {"d":str(pd.Timestamp.now().date()), "t":m_type, "tg":target, "c":content, "a":author})
+def library_tags(child_name=None, all_children=False):
+    if not get_engine(): return []
+    where, params = _library_scope(child_name, None, all_children)
+    with read_conn() as conn:
+        rows = conn.execute(text(f"SELECT DISTINCT tags FROM library WHERE {where} AND tags IS NOT NULL"), params)
+        return sorted({tag for (tags,) in rows for tag in tags.split(",") if tag})
+
+def delete_library_item(item_id):
+    if not get_engine(): return
+    with write_conn() as conn:
+        before = returned_row(conn.execute(text("DELETE FROM library WHERE id = :id AND tenant = :tenant RETURNING *"), {"id": item_id, "tenant": current_tenant()}))
+        if before:
+            reindex_document(conn, "library", item_id)
+        conn.commit()
+    audit_write("delete", "library", item_id, before)
+
+# expires_on is the last day a message is shown; None keeps it until removed
+def create_message(m_type, target, content, author, expires_on=None):
+    if not get_engine(): return
+    sql = text("INSERT INTO messages (date, type, target, content, author, status, expires_at, updated_at, tenant) VALUES (:d, :t, :tg, :c, :a, 'Active', :ex, :ts, :tenant) RETURNING *")
+    expires_at = f"{expires_on} 23:59:59" if expires_on else None
+    with write_conn() as conn:
+        after = returned_row(conn.execute(sql, {"d":str(pd.Timestamp.now().date()), "t":m_type, "tg":target, "c":content, "a":author, "ex":expires_at, "ts":now_ts(), "tenant":current_tenant()}))
+        conn.commit()
+    audit_write("insert", "messages", after["id"], None, after)
+
+# Only messages newer than after_id are returned, so a page that keeps the
+# last id it saw (see dashboard.py) re-reads nothing on later reruns
+def get_messages(child_name, after_id=0):
+    if not get_engine(): return pd.DataFrame()
+    with read_conn() as conn:
+        return pd.read_sql_query(text("""SELECT * FROM messages WHERE tenant = :tenant AND target IN (:c, 'All') AND status = 'Active' AND id > :after
+            AND (expires_at IS NULL OR expires_at > :now) ORDER BY id DESC"""),
+            conn, params={"tenant":current_tenant(), "c":child_name, "after":int(after_id), "now":now_ts()[:19]})
+
+# Messages past expires_at are left out before the expire_messages job flips them
+def unread_message_count(child_name, username):
+    if not get_engine(): return 0
+    with read_conn() as conn:
+        return conn.execute(text("""SELECT COUNT(*) FROM messages m WHERE m.tenant = :tenant AND m.target IN (:c, 'All') AND m.status = 'Active'
+            AND (m.expires_at IS NULL OR m.expires_at > :now)
+            AND NOT EXISTS (SELECT 1 FROM message_reads r WHERE r.message_id = m.id AND r.username = :u)"""),
+            {"tenant": current_tenant(), "c": child_name, "u": username, "now": now_ts()[:19]}).scalar()
+
+def get_read_message_ids(message_ids, username):
+    if not get_engine() or not message_ids: return set()
+    sql = text("SELECT message_id FROM message_reads WHERE username = :u AND message_id IN :ids").bindparams(bindparam("ids", expanding=True))
+    with read_conn() as conn:
+        return {r[0] for r in conn.execute(sql, {"u": username, "ids": [int(i) for i in message_ids]})}
+
+def mark_messages_read(message_ids, username):
+    if not get_engine() or not message_ids: return
+    # One multi-row INSERT ... SELECT for the whole batch, limited to this
+    # clinic's messages; DO NOTHING returns only new receipts, so re-reads
+    # aren't logged again
+    sql = text("""INSERT INTO message_reads (message_id, username, read_at)
+        SELECT id, :u, :ts FROM messages WHERE tenant = :tenant AND id IN :ids
+        ON CONFLICT (message_id, username) DO NOTHING RETURNING message_id""").bindparams(bindparam("ids", expanding=True))
+    ts = now_ts()
+    with write_conn() as conn:
+        read = sorted(r[0] for r in conn.execute(sql, {"u": username, "ts": ts, "tenant": current_tenant(),
+                                                       "ids": [int(i) for i in message_ids]}))
+        conn.commit()
+    if read:
+        audit_write("read", "message_reads", ",".join(map(str, read)), None, {"username": username, "ids": read, "read_at": ts}, actor=username)
+
+# Read receipts for one author's recent messages: one row per message with its readers
+def get_message_receipts(author, limit=50):
+    if not get_engine(): return pd.DataFrame()
+    with read_conn() as conn:
+        return pd.read_sql_query(text("""SELECT m.id, m.date, m.type, m.target, m.status, m.expires_at, m.content,
+                   r.username AS reader, r.read_at
+            FROM (SELECT * FROM messages WHERE tenant = :tenant AND author = :a ORDER BY id DESC LIMIT :n) m
+            LEFT JOIN message_reads r ON r.message_id = m.id
+            ORDER BY m.id DESC, r.read_at"""), conn, params={"tenant": current_tenant(), "a": author, "n": limit})
+
+# Batch expiry: one UPDATE flips every Active message of the clinic past its
+# expires_at. Runs as the expire_messages job (views/jobs.py)
+def expire_messages():
+    if not get_engine(): return 0
+    ts = now_ts()
+    with write_conn() as conn:
+        expired = [r[0] for r in conn.execute(text("""UPDATE messages SET status = 'Expired', updated_at = :ts
+            WHERE tenant = :tenant AND status = 'Active' AND expires_at IS NOT NULL AND expires_at <= :now RETURNING id"""),
+            {"ts": ts, "now": ts[:19], "tenant": current_tenant()})]
         conn.commit()
+    if expired:
+        audit_write("expire", "messages", ",".join(map(str, expired)), None, {"status": "Expired", "ids": expired})
+    return len(expired)
+
+
+# --- ARCHIVED HISTORY ---
+# Closed monthly partitions exported by views/partitions.py live in
+# <archive_dir>/<table>/<table>_<YYYY_MM>.parquet and are read back on request.
+# Files hold every clinic's rows; those written before tenancy have no tenant
+# column and belong to the default clinic.
+ARCHIVED_TABLES = ("progress", "attendance")
+
+def archive_dir():
+    return db_setting("archive_dir", "archive")
+
+def _archive_tenant(df):
+    if "tenant" not in df.columns:
+        return pd.Series(DEFAULT_TENANT, index=df.index)
+    return df["tenant"].fillna(DEFAULT_TENANT)
+
+def read_archive(table, child_name=None, start=None, end=None, all_tenants=False):
+    folder = os.path.join(archive_dir(), table)
+    if not os.path.isdir(folder):
+        return pd.DataFrame()
+    frames = []
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(".parquet"):
+            continue
+        month = name[len(table) + 1:-len(".parquet")].replace("_", "-")
+        # Skip whole files outside the requested range before reading them
+        if (start and month < str(start)[:7]) or (end and month > str(end)[:7]):
+            continue
+        filters = [("child_name", "==", child_name)] if child_name else None
+        frames.append(pd.read_parquet(os.path.join(folder, name), filters=filters))
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    if not all_tenants:
+        df = df[_archive_tenant(df) == current_tenant()]
+    if start:
+        df = df[df["date"] >= str(start)]
+    if end:
+        df = df[df["date"] <= str(end)]
+    return df
+
+# Same files as read_archive, yielded as lists of row dicts a batch at a time
+# so a long history never has to fit in memory
+def iter_archive(table, child_name, batch_size=5000):
+    import pyarrow.parquet as pq
+    folder = os.path.join(archive_dir(), table)
+    if not os.path.isdir(folder):
+        return
+    tenant = current_tenant()
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(".parquet"):
+            continue
+        for batch in pq.ParquetFile(os.path.join(folder, name)).iter_batches(batch_size=batch_size):
+            rows = [r for r in batch.to_pylist()
+                    if r.get("child_name") == child_name and (r.get("tenant") or DEFAULT_TENANT) == tenant]
+            if rows:
+                yield rows
+
+# --- SEARCH ---
+# Every searchable row is mirrored into search_index (tsvector + GIN on Postgres,
+# FTS5 locally). doc_id = source_id * 8 + kind, so one row can own several docs.
+SEARCH_SOURCES = {
+    "progress": [
+        (1, "staff", """SELECT p.id * 8 + 1, p.child_name || ' - ' || COALESCE(p.discipline, '') || ' / ' || COALESCE(p.goal_area, ''),
+                   COALESCE(p.notes, '') || ' ' || COALESCE(p.parent_note, '') || ' ' || COALESCE(p.parent_feedback, ''),
+                   'progress', p.id, p.child_name, 'staff', p.date, p.tenant FROM progress p"""),
+        (2, "family", """SELECT p.id * 8 + 2, p.child_name || ' - ' || COALESCE(p.discipline, '') || ' / ' || COALESCE(p.goal_area, ''),
+                   COALESCE(p.parent_note, '') || ' ' || COALESCE(p.parent_feedback, ''), 'progress', p.id, p.child_name, 'family', p.date, p.tenant
+                   FROM progress p"""),
+    ],
+    "session_plans": [
+        (3, "staff", """SELECT p.id * 8 + 3, 'Daily plan - ' || COALESCE(p.lead_staff, ''),
+                   COALESCE(p.warm_up, '') || ' ' || COALESCE(p.learning_block, '') || ' ' || COALESCE(p.regulation_break, '') || ' ' ||
+                   COALESCE(p.social_play, '') || ' ' || COALESCE(p.closing_routine, '') || ' ' || COALESCE(p.materials_needed, ''),
+                   'session_plans', p.id, 'All', 'staff', p.date, p.tenant FROM session_plans p"""),
+    ],
+    "library": [
+        (4, "all", """SELECT p.id * 8 + 4, COALESCE(p.title, ''), COALESCE(p.category, '') || ' ' || REPLACE(COALESCE(p.tags, ''), ',', ' '),
+                   'library', p.id, p.child_name, 'all', p.date_added, p.tenant FROM library p"""),
+    ],
+}
+
+def _search_key_col():
+    return "rowid" if is_sqlite() else "doc_id"
+
+# Refresh the search docs of one row (or a whole source when source_id is None)
+def reindex_document(conn, source, source_id=None):
+    key = _search_key_col()
+    if source_id is None:
+        conn.execute(text("DELETE FROM search_index WHERE source = :src"), {"src": source})
+    for kind, _, select_sql in SEARCH_SOURCES[source]:
+        insert_sql = f"INSERT INTO search_index ({key}, title, body, source, source_id, child_name, audience, date, tenant) {select_sql}"
+        if source_id is None:
+            conn.execute(text(insert_sql))
+        else:
+            conn.execute(text(f"DELETE FROM search_index WHERE {key} = :k"), {"k": int(source_id) * 8 + kind})
+            conn.execute(text(insert_sql + " WHERE p.id = :id"), {"id": int(source_id)})
+
+def reindex_documents(conn, source, source_ids):
+    if not source_ids: return
+    key = _search_key_col()
+    ids = [int(i) for i in source_ids]
+    for kind, _, select_sql in SEARCH_SOURCES[source]:
+        conn.execute(text(f"DELETE FROM search_index WHERE {key} IN :keys").bindparams(bindparam("keys", expanding=True)),
+                     {"keys": [i * 8 + kind for i in ids]})
+        conn.execute(text(f"INSERT INTO search_index ({key}, title, body, source, source_id, child_name, audience, date, tenant) {select_sql} WHERE p.id IN :ids")
+                     .bindparams(bindparam("ids", expanding=True)), {"ids": ids})
+
+def rebuild_search_index(conn):
+    for source in SEARCH_SOURCES:
+        reindex_document(conn, source)
+
+def _fts5_query(query):
+    # Quote every term so user input can never be parsed as FTS5 syntax
+    terms = re.findall(r"\w+", query)
+    return " ".join(f'"{t}"' for t in terms)
+
+# Staff match the full progress doc; parents only ever match family-facing docs for their child
+def search_records(query, role, child_link=None, page=1, page_size=20):
+    if not get_engine() or not query.strip(): return pd.DataFrame(), 0
+    params = {"limit": page_size, "offset": (max(page, 1) - 1) * page_size, "tenant": current_tenant()}
+    if role == "parent":
+        scope = " AND tenant = :tenant AND audience IN ('family', 'all') AND (child_name = :child OR child_name = 'All')"
+        params["child"] = child_link or ""
+    else:
+        scope = " AND tenant = :tenant AND audience IN ('staff', 'all')"
+
+    if is_sqlite():
+        params["q"] = _fts5_query(query)
+        if not params["q"]: return pd.DataFrame(), 0
+        match = "search_index MATCH :q" + scope
+        count_sql = f"SELECT COUNT(*) FROM search_index WHERE {match}"
+        sql = f"""SELECT source, source_id, child_name, audience, date, title,
+                         snippet(search_index, 1, '**', '**', '...', 16) AS snippet, bm25(search_index, 4.0, 1.0) AS rank
+                  FROM search_index WHERE {match} ORDER BY rank LIMIT :limit OFFSET :offset"""
+    else:
+        params["q"] = query
+        match = "tsv @@ websearch_to_tsquery('english', :q)" + scope
+        count_sql = f"SELECT COUNT(*) FROM search_index WHERE {match}"
+        # Rank and page first, then build headlines for the visible rows only
+        sql = f"""SELECT source, source_id, child_name, audience, date, title,
+                         ts_headline('english', body, websearch_to_tsquery('english', :q),
+                                     'StartSel=**, StopSel=**, MaxFragments=2, MaxWords=20') AS snippet, rank
+                  FROM (SELECT *, ts_rank_cd(tsv, websearch_to_tsquery('english', :q)) AS rank
+                        FROM search_index WHERE {match} ORDER BY rank DESC LIMIT :limit OFFSET :offset) hits
+                  ORDER BY rank DESC"""
 
-def get_messages(child_name):
-    if not ENGINE: return pd.DataFrame()
-    with ENGINE.connect() as conn:
-        return pd.read_sql_query(text("SELECT * FROM messages WHERE (target = :c OR target = 'All') AND status='Active' ORDER BY id DESC"), conn, params={"c":child_name})
+    with read_conn() as conn:
+        total = conn.execute(text(count_sql), params).scalar()
+        df = pd.read_sql_query(text(sql), conn, params=params)
+    return df, total
@@ -0,0 +1,111 @@
+# views/digest.py
+"""Daily parent digests written to the outbox table.
+
+    python -m views.digest                  # today's digests
+    python -m views.digest --date 2026-03-02 [--tenant ID]
+
+Each source (parent notes, messages, library links, appointment changes) is
+read with one query joined to the parent/child pairs, so a run costs the same
+handful of queries however many families there are. A run covers one clinic
+(the current tenant; the scheduled job runs it for each). A sender picks up
+outbox rows with status 'pending'; rebuilding a day replaces digests that
+have not been sent yet.
+"""
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy import text
+from .database import DEFAULT_TENANT, current_tenant, get_engine, init_db, now_ts, read_conn, use_tenant
+
+DIGEST_KIND = "daily_digest"
+
+# Parents are linked through users.child_link and/or children.parent_username
+FAMILIES_CTE = """WITH families AS (
+    SELECT username AS parent, child_link AS child_name FROM users
+     WHERE tenant = :tenant AND role = 'parent' AND COALESCE(child_link, '') <> ''
+    UNION
+    SELECT parent_username, child_name FROM children WHERE tenant = :tenant AND COALESCE(parent_username, '') <> ''
+)"""
+
+# section -> query returning (parent, child_name, line) rows for the day
+SECTION_QUERIES = {
+    "Notes from the team": """
+        SELECT f.parent, f.child_name,
+               COALESCE(p.discipline, 'Session') || ' (' || COALESCE(p.author, 'staff') || '): ' || p.parent_note AS line
+        FROM families f JOIN progress p ON p.tenant = :tenant AND p.child_name = f.child_name
+        WHERE p.date = :day AND COALESCE(p.parent_note, '') <> ''
+        ORDER BY f.parent, p.id""",
+    "Messages": """
+        SELECT DISTINCT f.parent, CASE WHEN m.target = 'All' THEN NULL ELSE f.child_name END AS child_name,
+               COALESCE(m.type, 'Message') || ': ' || COALESCE(m.content, '') AS line, m.id
+        FROM families f JOIN messages m ON m.tenant = :tenant AND m.target IN (f.child_name, 'All')
+        WHERE m.date = :day AND m.status = 'Active'
+        ORDER BY f.parent, m.id""",
+    "New in the library": """
+        SELECT DISTINCT f.parent, CASE WHEN l.child_name = 'All' THEN NULL ELSE f.child_name END AS child_name,
+               COALESCE(l.title, 'Resource') || ' - ' || COALESCE(l.link_url, '') AS line, l.id
+        FROM families f JOIN library l ON l.tenant = :tenant AND l.child_name IN (f.child_name, 'All')
+        WHERE l.date_added = :day
+        ORDER BY f.parent, l.id""",
+    # updated_at is a UTC stamp, so "changed today" is the UTC day
+    "Appointment updates": """
+        SELECT f.parent, f.child_name,
+               a.date || ' ' || COALESCE(a.time, '') || ' ' || COALESCE(a.discipline, 'Appointment') || ' with '
+                   || COALESCE(a.staff, 'TBD') || ' - ' || COALESCE(a.status, 'Scheduled') AS line
+        FROM families f JOIN appointments a ON a.tenant = :tenant AND a.child_name = f.child_name
+        WHERE a.updated_at >= :day AND a.updated_at < :next_day
+        ORDER BY f.parent, a.date, a.time""",
+}
+
+def gather(day):
+    params = {"day": str(day), "next_day": str(day + timedelta(days=1)), "tenant": current_tenant()}
+    # parent -> section -> [(child_name, line)]
+    items = defaultdict(lambda: defaultdict(list))
+    with read_conn() as conn:
+        for section, query in SECTION_QUERIES.items():
+            for row in conn.execute(text(f"{FAMILIES_CTE} {query}"), params):
+                items[row.parent][section].append((row.child_name, row.line))
+    return items
+
+def render(parent, sections, day):
+    lines = [f"Hello {parent},", "", f"Here is what happened on {day:%A, %B} {day.day}:"]
+    for section in SECTION_QUERIES:
+        entries = sections.get(section)
+        if not entries:
+            continue
+        lines += ["", section, "-" * len(section)]
+        lines += [f"• {child + ': ' if child else ''}{line}" for child, line in entries]
+    lines += ["", "Open TILP Connect for the full details."]
+    return "\n".join(lines)
+
+def build_digests(day=None):
+    day = day or date.today()
+    items = gather(day)
+    created, tenant = now_ts(), current_tenant()
+    rows = [{"recipient": parent, "kind": DIGEST_KIND, "digest_date": str(day), "tenant": tenant,
+             "subject": f"TILP Connect daily update - {day:%b} {day.day}", "body": render(parent, sections, day), "created_at": created}
+            for parent, sections in items.items()]
+    if rows:
+        # Replaces a digest for the same day only while it is still unsent
+        sql = text("""INSERT INTO outbox (recipient, kind, digest_date, subject, body, status, created_at, tenant)
+            VALUES (:recipient, :kind, :digest_date, :subject, :body, 'pending', :created_at, :tenant)
+            ON CONFLICT (recipient, kind, digest_date) DO UPDATE
+            SET subject = EXCLUDED.subject, body = EXCLUDED.body, created_at = EXCLUDED.created_at
+            WHERE outbox.status = 'pending'""")
+        with get_engine().begin() as conn:
+            conn.execute(sql, rows)
+    return len(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build daily parent digests into the outbox.")
+    parser.add_argument("--date", type=date.fromisoformat, help="YYYY-MM-DD (default: today)")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="clinic to build digests for")
+    args = parser.parse_args(argv)
+    init_db()
+    day = args.date or date.today()
+    with use_tenant(args.tenant):
+        print(f"{build_digests(day)} digests written for {day}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,130 @@
+# views/exports.py
+"""Per-child record bundles: one zip with a CSV or JSON file per table.
+
+    python -m views.exports --child "Child Name" --out exports/
+    python -m views.exports --all --workers 4 --format json --out exports/ [--tenant ID]
+
+Rows are streamed from server-side cursors and written into the zip a chunk
+at a time, so memory use does not grow with the length of a child's history.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from sqlalchemy import text
+from .database import ARCHIVED_TABLES, DEFAULT_TENANT, current_tenant, get_engine, in_tenant, iter_archive, read_conn, use_tenant
+
+CHUNK_ROWS = 2000
+
+# table -> query for one child's rows in the current clinic, oldest first
+EXPORT_QUERIES = {
+    "profile": "SELECT * FROM children WHERE tenant = :t AND child_name = :c",
+    "progress": "SELECT * FROM progress WHERE tenant = :t AND child_name = :c ORDER BY date, id",
+    "attendance": "SELECT * FROM attendance WHERE tenant = :t AND child_name = :c ORDER BY date, id",
+    "appointments": "SELECT * FROM appointments WHERE tenant = :t AND child_name = :c ORDER BY date, time, id",
+    "invoices": "SELECT * FROM invoices WHERE tenant = :t AND child_name = :c ORDER BY date, id",
+    "library": "SELECT * FROM library WHERE tenant = :t AND child_name = :c ORDER BY date_added, id",
+}
+
+def _chunks(conn, table, child_name):
+    result = conn.execution_options(stream_results=True, yield_per=CHUNK_ROWS).execute(
+        text(EXPORT_QUERIES[table]), {"t": current_tenant(), "c": child_name})
+    columns = list(result.keys())
+    yield columns
+    if table in ARCHIVED_TABLES:
+        # Closed school years were moved out of the database (views/partitions.py)
+        for rows in iter_archive(table, child_name, CHUNK_ROWS):
+            yield [tuple(r.get(c) for c in columns) for r in rows]
+    for rows in result.partitions():
+        yield rows
+
+def _write_csv(out, chunks):
+    columns = next(chunks)
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    count = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+def _write_json(out, chunks):
+    columns = next(chunks)
+    count = 0
+    out.write("[")
+    for rows in chunks:
+        for row in rows:
+            out.write(("\n" if count == 0 else ",\n") + json.dumps(dict(zip(columns, row)), default=str))
+            count += 1
+    out.write("\n]\n")
+    return count
+
+# dest is a path or binary file object; returns row counts per table
+def export_child(child_name, dest, fmt="csv"):
+    writer = _write_csv if fmt == "csv" else _write_json
+    counts = {}
+    with zipfile.ZipFile(dest, "w", compression=zipfile.ZIP_DEFLATED) as zf, read_conn() as conn:
+        for table in EXPORT_QUERIES:
+            with zf.open(f"{table}.{fmt}", "w") as raw, io.TextIOWrapper(raw, encoding="utf-8", newline="") as out:
+                counts[table] = writer(out, _chunks(conn, table, child_name))
+        manifest = {"child_name": child_name, "generated_at": datetime.now().isoformat(timespec="seconds"),
+                    "format": fmt, "rows": counts}
+        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+    return counts
+
+# Built in a temp file (the zip writer seeks), which is deleted on return;
+# st.download_button holds the bytes for the session anyway
+def export_child_bytes(child_name, fmt="csv"):
+    with tempfile.TemporaryFile() as tmp:
+        export_child(child_name, tmp, fmt)
+        tmp.seek(0)
+        return tmp.read()
+
+def bundle_filename(child_name, fmt="csv"):
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", child_name).strip("_") or "child"
+    return f"{slug}_record_{fmt}.zip"
+
+# Each worker holds one pooled connection; keep workers within the pool size
+def export_caseload(out_dir, children=None, fmt="csv", workers=4, progress=None):
+    os.makedirs(out_dir, exist_ok=True)
+    if children is None:
+        with read_conn() as conn:
+            children = [r[0] for r in conn.execute(text("SELECT child_name FROM children WHERE tenant = :t ORDER BY child_name"),
+                                                   {"t": current_tenant()})]
+    results = {}
+    export = in_tenant(export_child)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(export, c, os.path.join(out_dir, bundle_filename(c, fmt)), fmt): c for c in children}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            if progress:
+                progress(len(results), len(futures), f"Exported {futures[future]}")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export complete per-child record bundles.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--child", action="append", help="child name (repeatable)")
+    target.add_argument("--all", action="store_true", help="export every child in the caseload")
+    parser.add_argument("--format", choices=["csv", "json"], default="csv")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--out", default="exports")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="clinic whose children are exported")
+    args = parser.parse_args(argv)
+
+    get_engine()
+    with use_tenant(args.tenant):
+        results = export_caseload(args.out, None if args.all else args.child, args.format, args.workers)
+    for child, counts in sorted(results.items()):
+        print(f"{child}: " + ", ".join(f"{t}={n}" for t, n in counts.items()))
+    print(f"{len(results)} bundles written to {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,161 @@
+# views/ical.py
+"""iCalendar (.ics) feeds of appointments, one per child and one per provider.
+
+    python -m views.ical --out calendars/
+
+Pages get feeds through get_feed(), which is cached against a cheap
+fingerprint of the feed's appointments (row count, id sum, latest
+updated_at), so a feed is only rebuilt after one of its appointments is
+booked, changed or deleted. The CLI writes every clinic's feeds into
+<out>/<clinic>/ from a single query, skips files whose content hash is
+unchanged and removes feeds that no longer have appointments.
+"""
+import argparse
+import hashlib
+import os
+import re
+from datetime import datetime, timedelta
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+from .database import current_tenant, init_db, read_conn
+from .workload import SESSION_MINUTES
+
+# scope -> appointments column the feed is filtered on
+SCOPES = {"child": "child_name", "provider": "staff"}
+PRODID = "-//TILP Connect//Appointments//EN"
+UID_DOMAIN = "tilp-connect"
+
+def _escape(value):
+    return re.sub(r"([\\;,])", r"\\\1", str(value or "")).replace("\n", "\\n")
+
+# Lines longer than 75 octets continue on the next line after a space (RFC 5545)
+def _fold(line):
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line
+    parts, start = [], 0
+    while start < len(raw):
+        end = min(start + (75 if start == 0 else 74), len(raw))
+        while end < len(raw) and (raw[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(raw[start:end].decode("utf-8"))
+        start = end
+    return "\r\n ".join(parts)
+
+def _stamp(updated_at):
+    return (updated_at or "1970-01-01 00:00:00")[:19].replace("-", "").replace(":", "").replace(" ", "T") + "Z"
+
+def _event(appt, scope):
+    # Times are stored as "HH:MM[:SS]" in the clinic's local time, so events are floating
+    try:
+        start = datetime.strptime(f"{appt['date']} {(appt['time'] or '00:00')[:5]}", "%Y-%m-%d %H:%M")
+    except ValueError:
+        return []
+    end = start + timedelta(minutes=SESSION_MINUTES)
+    if scope == "child":
+        summary = f"{appt['discipline']} with {appt['staff'] or 'TBD'}"
+    else:
+        summary = f"{appt['discipline']} - {appt['child_name']}"
+    lines = ["BEGIN:VEVENT",
+             f"UID:appt-{appt['id']}@{UID_DOMAIN}",
+             f"DTSTAMP:{_stamp(appt['updated_at'])}",
+             f"DTSTART:{start:%Y%m%dT%H%M%S}",
+             f"DTEND:{end:%Y%m%dT%H%M%S}",
+             f"SUMMARY:{_escape(summary)}",
+             f"DESCRIPTION:Status: {_escape(appt['status'])}",
+             f"STATUS:{'CANCELLED' if appt['status'] == 'Cancelled' else 'CONFIRMED'}",
+             "END:VEVENT"]
+    return lines
+
+def render_calendar(appts, scope, name):
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN", "METHOD:PUBLISH",
+             f"X-WR-CALNAME:{_escape(f'TILP - {name}')}"]
+    for appt in appts:
+        if appt["date"]:
+            lines += _event(appt, scope)
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(_fold(line) for line in lines) + "\r\n"
+
+def etag(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+# The slug keeps names readable; the hash keeps names that slug alike
+# ("Mary-Ann", "Mary Ann") from sharing a file
+def feed_filename(scope, name):
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_") or scope
+    return f"{scope}_{slug}_{hashlib.sha256(name.encode('utf-8')).hexdigest()[:8]}.ics"
+
+# --- CACHED FEEDS ---
+def feed_fingerprint(scope, name, tenant):
+    col = SCOPES[scope]
+    with read_conn() as conn:
+        row = conn.execute(text(f"SELECT COUNT(*), COALESCE(SUM(id), 0), MAX(updated_at) FROM appointments WHERE tenant = :t AND {col} = :n"),
+                           {"t": tenant, "n": name}).fetchone()
+    return f"{row[0]}:{row[1]}:{row[2]}"
+
+@st.cache_data(max_entries=500, show_spinner=False)
+def cached_feed(scope, name, tenant, fingerprint):
+    col = SCOPES[scope]
+    with read_conn() as conn:
+        appts = conn.execute(text(f"SELECT * FROM appointments WHERE tenant = :t AND {col} = :n ORDER BY date, time, id"),
+                             {"t": tenant, "n": name}).mappings().all()
+    content = render_calendar(appts, scope, name)
+    return content, etag(content)
+
+# Returns (ics text, etag) for the current clinic
+def get_feed(scope, name):
+    tenant = current_tenant()
+    return cached_feed(scope, name, tenant, feed_fingerprint(scope, name, tenant))
+
+# --- ALL FEEDS ---
+# (clinic, scope, name) -> that feed's appointments
+def _feed_groups(df):
+    for tenant, clinic in df.groupby("tenant", sort=True):
+        for scope, col in SCOPES.items():
+            for name, group in clinic[clinic[col].fillna("").str.strip() != ""].groupby(col, sort=True):
+                yield (tenant, scope, name), group
+
+def write_all_feeds(out_dir):
+    with read_conn() as conn:
+        df = pd.read_sql_query(text("SELECT * FROM appointments ORDER BY date, time, id"), conn)
+    df = df.astype(object).where(df.notna(), None)
+    written = unchanged = 0
+    current = set()
+    for (tenant, scope, name), group in _feed_groups(df):
+        folder = os.path.join(out_dir, tenant)
+        os.makedirs(folder, exist_ok=True)
+        content = render_calendar(group.to_dict("records"), scope, name)
+        path = os.path.join(folder, feed_filename(scope, name))
+        current.add(path)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8", newline="") as f:
+                if etag(f.read()) == etag(content):
+                    unchanged += 1
+                    continue
+        with open(path + ".tmp", "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+        written += 1
+    # Feeds whose child or provider has no appointments left (or that were
+    # written under an older file name) are removed
+    removed = 0
+    for folder in {os.path.dirname(p) for p in current}:
+        for entry in os.listdir(folder):
+            path = os.path.join(folder, entry)
+            if entry.endswith(".ics") and entry.split("_", 1)[0] in SCOPES and path not in current:
+                os.remove(path)
+                removed += 1
+    return written, unchanged, removed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write iCalendar feeds for every child and provider.")
+    parser.add_argument("--out", default="calendars")
+    args = parser.parse_args(argv)
+    init_db()
+    written, unchanged, removed = write_all_feeds(args.out)
+    print(f"{written} feeds written, {unchanged} unchanged, {removed} removed in {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
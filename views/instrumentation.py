@@ -0,0 +1,221 @@
+# views/instrumentation.py
+import json
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from itertools import count
+import pandas as pd
+from sqlalchemy import event
+
+# Each executed statement becomes one tuple in a bounded ring buffer:
+# (finished_at, fingerprint, duration_ms, rows, caller, page, render_id)
+QUERY_LOG = deque(maxlen=5000)
+SETTINGS = {"slow_query_ms": 200.0, "slow_query_log": None}
+
+_current_render = ContextVar("current_render", default=None)
+_render_ids = count(1)
+_slow_log_lock = threading.Lock()
+
+def configure(log_size=None, slow_query_ms=None, slow_query_log=None):
+    global QUERY_LOG
+    if log_size and int(log_size) != QUERY_LOG.maxlen:
+        QUERY_LOG = deque(QUERY_LOG, maxlen=int(log_size))
+    if slow_query_ms is not None:
+        SETTINGS["slow_query_ms"] = float(slow_query_ms)
+    if slow_query_log is not None:
+        SETTINGS["slow_query_log"] = slow_query_log or None
+
+# --- STATEMENT FINGERPRINTS ---
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+# Statements are mostly constant text, so the normalised form is cached
+@lru_cache(maxsize=2048)
+def fingerprint(statement):
+    fp = _LITERALS.sub("?", statement)
+    fp = _IN_LISTS.sub("(?...)", fp)
+    return _WHITESPACE.sub(" ", fp).strip()
+
+# Nearest views.* function on the stack (the helper that issued the query) and
+# the outermost views.* page module that led to it
+def _callers():
+    frame = sys._getframe(2)
+    caller = page = None
+    depth = 0
+    while frame is not None and depth < 40:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("views.") and module != __name__:
+            name = f"{module}.{frame.f_code.co_name}"
+            if caller is None:
+                caller = name
+            if module != "views.database":
+                page = name
+        frame = frame.f_back
+        depth += 1
+    return caller or "<unknown>", page
+
+# A statement's text nearly always comes from the same helper, so inside a page
+# render (which supplies the page) the stack is only walked the first time a
+# fingerprint is seen, or when the statement is slow enough to be logged
+_caller_cache = {}
+
+# --- ENGINE HOOKS ---
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    duration_ms = (time.perf_counter() - started) * 1000
+    fp = fingerprint(statement)
+    current = _current_render.get()
+    slow = duration_ms >= SETTINGS["slow_query_ms"]
+    if current is None or slow or fp not in _caller_cache:
+        caller, page = _callers()
+        if len(_caller_cache) >= 4096:
+            _caller_cache.clear()
+        _caller_cache[fp] = caller
+    else:
+        caller = _caller_cache[fp]
+    render_id = None
+    if current is not None:
+        page, render_id = current["page"], current["id"]
+        current["queries"] += 1
+        current["db_ms"] += duration_ms
+    rows = cursor.rowcount if cursor.rowcount is not None else -1
+    QUERY_LOG.append((time.time(), fp, duration_ms, rows, caller, page, render_id))
+    if slow and SETTINGS["slow_query_log"]:
+        _write_slow_query(fp, duration_ms, rows, caller, page)
+
+def _write_slow_query(fp, duration_ms, rows, caller, page):
+    entry = json.dumps({"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "duration_ms": round(duration_ms, 2),
+                        "rows": rows, "caller": caller, "page": page, "statement": fp})
+    with _slow_log_lock:
+        with open(SETTINGS["slow_query_log"], "a", encoding="utf-8") as f:
+            f.write(entry + "\n")
+
+# A failed statement never reaches after_cursor_execute; its start time is
+# dropped here so the next statement on the connection isn't timed from it
+def _handle_error(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts and context.execution_context is not None:
+        starts.pop()
+
+def install(engine):
+    if engine is None or event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+# Tags every query issued inside the block with the page being rendered and
+# yields running totals (queries, db_ms) for that render
+@contextmanager
+def render(page_name):
+    current = {"page": page_name, "id": next(_render_ids), "queries": 0, "db_ms": 0.0}
+    token = _current_render.set(current)
+    try:
+        yield current
+    finally:
+        _current_render.reset(token)
+
+# --- CONNECTION POOL METRICS ---
+# Per engine label ("primary" / "replica"): checkout waits in ms, the number of
+# connections in use sampled at every checkout, and event counters
+POOL_METRICS = {}
+_pool_lock = threading.Lock()
+
+def _pool_metrics(label):
+    metrics = POOL_METRICS.get(label)
+    if metrics is None:
+        metrics = POOL_METRICS.setdefault(label, {
+            "waits": deque(maxlen=10000), "in_use": deque(maxlen=10000),
+            "checkouts": 0, "overflow": 0, "timeouts": 0, "peak_in_use": 0})
+    return metrics
+
+def install_pool_metrics(engine, label):
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return
+    metrics = _pool_metrics(label)
+
+    def on_checkout(dbapi_conn, record, proxy):
+        in_use = pool.checkedout()
+        with _pool_lock:
+            metrics["checkouts"] += 1
+            metrics["in_use"].append(in_use)
+            metrics["peak_in_use"] = max(metrics["peak_in_use"], in_use)
+            if hasattr(pool, "size") and in_use > pool.size():
+                metrics["overflow"] += 1
+
+    event.listen(pool, "checkout", on_checkout)
+
+def record_pool_wait(label, wait_ms):
+    _pool_metrics(label)["waits"].append(wait_ms)
+
+def record_pool_timeout(label):
+    with _pool_lock:
+        _pool_metrics(label)["timeouts"] += 1
+
+def pool_report():
+    rows = []
+    for label, m in POOL_METRICS.items():
+        waits = pd.Series(list(m["waits"]), dtype=float)
+        in_use = pd.Series(list(m["in_use"]), dtype=float)
+        rows.append({
+            "engine": label, "checkouts": m["checkouts"], "overflow_events": m["overflow"], "timeouts": m["timeouts"],
+            "peak_in_use": m["peak_in_use"], "p95_in_use": in_use.quantile(0.95) if len(in_use) else 0.0,
+            "p50_wait_ms": waits.quantile(0.50) if len(waits) else 0.0,
+            "p99_wait_ms": waits.quantile(0.99) if len(waits) else 0.0,
+            "max_wait_ms": waits.max() if len(waits) else 0.0})
+    return pd.DataFrame(rows)
+
+def reset_pool_metrics():
+    with _pool_lock:
+        for m in POOL_METRICS.values():
+            m["waits"].clear()
+            m["in_use"].clear()
+            m.update(checkouts=0, overflow=0, timeouts=0, peak_in_use=0)
+
+# --- REPORTING ---
+def query_log_df():
+    return pd.DataFrame(list(QUERY_LOG), columns=["ts", "statement", "duration_ms", "rows", "caller", "page", "render_id"])
+
+def statement_stats(limit=20):
+    df = query_log_df()
+    if df.empty:
+        return df
+    grouped = df.groupby("statement")["duration_ms"]
+    stats = pd.DataFrame({
+        "calls": grouped.size(),
+        "total_ms": grouped.sum(),
+        "p50_ms": grouped.quantile(0.50),
+        "p95_ms": grouped.quantile(0.95),
+        "p99_ms": grouped.quantile(0.99),
+        "caller": df.groupby("statement")["caller"].agg(lambda c: c.mode().iat[0]),
+    })
+    return stats.sort_values("total_ms", ascending=False).head(limit).reset_index()
+
+def latency_percentiles():
+    df = query_log_df()
+    if df.empty:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    q = df["duration_ms"].quantile([0.50, 0.95, 0.99])
+    return {"p50": q[0.50], "p95": q[0.95], "p99": q[0.99]}
+
+def queries_per_render():
+    df = query_log_df().dropna(subset=["render_id"])
+    if df.empty:
+        return df
+    per_render = df.groupby(["page", "render_id"]).agg(queries=("statement", "size"), db_ms=("duration_ms", "sum"))
+    return per_render.groupby("page").agg(
+        renders=("queries", "size"), avg_queries=("queries", "mean"),
+        max_queries=("queries", "max"), avg_db_ms=("db_ms", "mean")).reset_index()
+
+def reset():
+    QUERY_LOG.clear()
@@ -0,0 +1,391 @@
+# views/jobs.py
+"""Background jobs: a persisted queue, worker threads and periodic schedules.
+
+    python -m views.jobs worker [--threads 2]     # workers + scheduler in the foreground
+    python -m views.jobs [--tenant ID] submit KIND [key=value ...]
+    python -m views.jobs [--tenant ID] list
+
+Pages call submit() and get a job id back at once; a worker thread claims the
+job, runs it and reports progress into the jobs row, which pages poll with
+show_job(). Each job is claimed by exactly one worker: Postgres uses
+SELECT ... FOR UPDATE SKIP LOCKED, SQLite takes a file lock around the claim.
+A job whose worker died is marked failed, never re-run. Jobs run in the
+clinic (tenant) that submitted them; scheduled sweeps cover every clinic.
+
+Schedules are "@every <n>s|m|h" or "daily HH:MM" (server local time).
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from .database import (DEFAULT_TENANT, current_tenant, db_setting, get_engine, init_db, is_sqlite, now_ts, read_conn,
+                       tenant_ids, upsert_sql, use_tenant)
+
+try:
+    import fcntl
+except ImportError:  # Windows: claims are only serialised within the process
+    fcntl = None
+
+logger = logging.getLogger("tilp.jobs")
+
+WORKER_THREADS = int(db_setting("job_workers", 2))
+POLL_SECONDS = float(db_setting("job_poll_seconds", 2.0))
+SCHEDULE_TICK_SECONDS = 15
+# A running job whose heartbeat is older than this belongs to a dead worker
+STALE_SECONDS = int(db_setting("job_stale_seconds", 600))
+LOCK_FILE = db_setting("job_lock_file", "jobs.lock")
+FINISHED = ("done", "failed", "cancelled")
+
+# name -> (kind, params, spec, enabled by default)
+DEFAULT_SCHEDULES = {
+    "expire_messages": ("expire_messages", {}, "@every 5m", True),
+    "nightly_backup": ("backup", {"kind": "incremental"}, "daily 01:30", False),
+    "snapshot_export": ("snapshot_export", {}, "daily 02:00", False),
+    "parent_digest": ("parent_digest", {}, "daily 20:00", True),
+}
+
+# --- JOB KINDS ---
+JOB_KINDS = {}
+
+def job_kind(name):
+    def register(fn):
+        JOB_KINDS[name] = fn
+        return fn
+    return register
+
+class JobContext:
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._last_report = 0.0
+
+    # Writes are throttled to one a second, except for the first and last step
+    def progress(self, done, total=None, message=None):
+        if done not in (0, total) and time.monotonic() - self._last_report < 1.0:
+            return
+        self._last_report = time.monotonic()
+        fraction = min(done / total, 1.0) if total else done
+        with get_engine().begin() as conn:
+            conn.execute(text("UPDATE jobs SET progress = :p, message = COALESCE(:m, message), heartbeat_at = :ts WHERE id = :id"),
+                         {"p": fraction, "m": message, "ts": now_ts(), "id": self.job_id})
+
+# Time-based sweeps: submitted from the default clinic (as the scheduler does)
+# they cover every clinic, from any other clinic just that one
+def _each_tenant(fn):
+    results = {}
+    for tenant in tenant_ids() if current_tenant() == DEFAULT_TENANT else [current_tenant()]:
+        with use_tenant(tenant):
+            results[tenant] = fn()
+    return results
+
+@job_kind("expire_messages")
+def _expire_messages(ctx):
+    from .database import expire_messages
+    return {"expired": _each_tenant(expire_messages)}
+
+@job_kind("snapshot_export")
+def _snapshot_export(ctx, full=False):
+    from .snapshots import export_snapshots
+    summary = export_snapshots(full=bool(full), progress=ctx.progress)
+    return summary.to_dict("records")
+
+@job_kind("backup")
+def _backup(ctx, kind="incremental"):
+    from .backup import run_backup
+    ctx.progress(0, message=f"Running {kind} backup")
+    manifest = run_backup(kind)
+    return {"name": manifest["name"], "rows": sum(t["rows"] for t in manifest["tables"].values())}
+
+@job_kind("export_caseload")
+def _export_caseload(ctx, out_dir="exports", fmt="csv", workers=4):
+    from .exports import export_caseload
+    results = export_caseload(out_dir, fmt=fmt, workers=int(workers), progress=ctx.progress)
+    return {"bundles": len(results), "out_dir": out_dir}
+
+@job_kind("parent_digest")
+def _parent_digest(ctx, day=None):
+    from datetime import date
+    from .digest import build_digests
+    return {"digests": _each_tenant(lambda: build_digests(date.fromisoformat(day) if day else None))}
+
+@job_kind("archive_closed_months")
+def _archive_closed_months(ctx):
+    from .partitions import archive_closed_months
+    return {"archived": [f"{e['table']} {e['month']}" for e in archive_closed_months()]}
+
+# These act on every clinic's data at once, so only the default clinic
+# (and the scheduler, which submits as it) may queue them
+GLOBAL_KINDS = {"backup", "archive_closed_months", "snapshot_export"}
+
+def submittable_kinds():
+    kinds = set(JOB_KINDS) if current_tenant() == DEFAULT_TENANT else set(JOB_KINDS) - GLOBAL_KINDS
+    return sorted(kinds)
+
+# --- QUEUE ---
+def submit(kind, params=None, created_by=None, schedule=None):
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    if kind not in submittable_kinds():
+        raise ValueError(f"Job kind {kind} can only be run from the default clinic")
+    ts = now_ts()
+    with get_engine().begin() as conn:
+        job_id = conn.execute(text("""INSERT INTO jobs (kind, params, status, progress, created_by, schedule, created_at, run_after, tenant)
+            VALUES (:k, :p, 'queued', 0, :u, :s, :ts, :ts, :t) RETURNING id"""),
+            {"k": kind, "p": json.dumps(params or {}), "u": created_by, "s": schedule, "ts": ts, "t": current_tenant()}).scalar()
+    _wake.set()
+    return job_id
+
+def cancel(job_id):
+    with get_engine().begin() as conn:
+        return conn.execute(text("UPDATE jobs SET status = 'cancelled', finished_at = :ts WHERE id = :id AND tenant = :t AND status = 'queued'"),
+                            {"ts": now_ts(), "id": job_id, "t": current_tenant()}).rowcount == 1
+
+def get_job(job_id):
+    with read_conn() as conn:
+        row = conn.execute(text("SELECT * FROM jobs WHERE id = :id AND tenant = :t"), {"id": job_id, "t": current_tenant()}).mappings().first()
+    return dict(row) if row else None
+
+def list_jobs(limit=50):
+    import pandas as pd
+    with read_conn() as conn:
+        return pd.read_sql_query(text("""SELECT id, kind, status, progress, message, created_by, schedule,
+            created_at, started_at, finished_at FROM jobs WHERE tenant = :t ORDER BY id DESC LIMIT :n"""), conn,
+            params={"t": current_tenant(), "n": limit})
+
+@contextmanager
+def _claim_lock():
+    if fcntl is None:
+        with _local_claim_lock:
+            yield
+        return
+    with open(LOCK_FILE, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def claim_next(worker):
+    ts = now_ts()
+    skip_locked = "" if is_sqlite() else "FOR UPDATE SKIP LOCKED"
+    sql = text(f"""UPDATE jobs SET status = 'running', started_at = :ts, heartbeat_at = :ts, worker = :w
+        WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND run_after <= :ts ORDER BY id LIMIT 1 {skip_locked})
+        RETURNING *""")
+    if is_sqlite():
+        with _claim_lock(), get_engine().begin() as conn:
+            row = conn.execute(sql, {"ts": ts, "w": worker}).mappings().first()
+    else:
+        with get_engine().begin() as conn:
+            row = conn.execute(sql, {"ts": ts, "w": worker}).mappings().first()
+    return dict(row) if row else None
+
+def _finish(job_id, status, result=None, message=None):
+    with get_engine().begin() as conn:
+        conn.execute(text("""UPDATE jobs SET status = :s, result = :r, message = COALESCE(:m, message),
+            progress = CASE WHEN :s = 'done' THEN 1 ELSE progress END, finished_at = :ts WHERE id = :id"""),
+            {"s": status, "r": json.dumps(result, default=str) if result is not None else None, "m": message,
+             "ts": now_ts(), "id": job_id})
+
+def run_job(job):
+    ctx = JobContext(job["id"])
+    _running.add(job["id"])
+    try:
+        with use_tenant(job["tenant"]):
+            result = JOB_KINDS[job["kind"]](ctx, **json.loads(job["params"] or "{}"))
+        _finish(job["id"], "done", result)
+    except Exception as e:
+        logger.exception("job %s (%s) failed", job["id"], job["kind"])
+        _finish(job["id"], "failed", message=f"{type(e).__name__}: {e}")
+    finally:
+        _running.discard(job["id"])
+
+def fail_stale_jobs():
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=STALE_SECONDS)).strftime("%Y-%m-%d %H:%M:%S.%f")
+    with get_engine().begin() as conn:
+        return conn.execute(text("""UPDATE jobs SET status = 'failed', message = 'Worker stopped before the job finished',
+            finished_at = :ts WHERE status = 'running' AND heartbeat_at < :cutoff"""), {"ts": now_ts(), "cutoff": cutoff}).rowcount
+
+# --- SCHEDULES ---
+def next_run(spec, after=None):
+    after = after or datetime.now(timezone.utc)
+    kind, _, value = spec.strip().partition(" ")
+    if kind == "@every":
+        seconds = int(value[:-1]) * {"s": 1, "m": 60, "h": 3600}[value[-1]]
+        return after + timedelta(seconds=seconds)
+    if kind == "daily":
+        hour, minute = (int(x) for x in value.split(":"))
+        local = after.astimezone()
+        candidate = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate <= local:
+            candidate += timedelta(days=1)
+        return candidate.astimezone(timezone.utc)
+    raise ValueError(f"Unsupported schedule: {spec}")
+
+def _fmt(moment):
+    return moment.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+def seed_schedules():
+    sql = upsert_sql("job_schedules", ["name", "kind", "params", "spec", "enabled", "next_run_at"], ["name"])
+    with get_engine().begin() as conn:
+        conn.execute(sql, [{"name": name, "kind": kind, "params": json.dumps(params), "spec": spec,
+                            "enabled": int(enabled), "next_run_at": _fmt(next_run(spec))}
+                           for name, (kind, params, spec, enabled) in DEFAULT_SCHEDULES.items()])
+
+def list_schedules():
+    import pandas as pd
+    with read_conn() as conn:
+        return pd.read_sql_query(text("SELECT * FROM job_schedules ORDER BY name"), conn)
+
+def set_schedule_enabled(name, enabled):
+    with get_engine().begin() as conn:
+        conn.execute(text("UPDATE job_schedules SET enabled = :e WHERE name = :n"), {"e": int(enabled), "n": name})
+
+# Each due schedule is advanced with a compare-and-set on next_run_at, so when
+# several processes run schedulers only one of them submits the job
+def run_due_schedules():
+    now = datetime.now(timezone.utc)
+    submitted = []
+    with read_conn() as conn:
+        due = conn.execute(text("""SELECT s.*, j.status AS last_status FROM job_schedules s
+            LEFT JOIN jobs j ON j.id = s.last_job_id
+            WHERE s.enabled = 1 AND s.next_run_at <= :now"""), {"now": _fmt(now)}).mappings().all()
+    for s in due:
+        with get_engine().begin() as conn:
+            claimed = conn.execute(text("UPDATE job_schedules SET next_run_at = :next WHERE name = :n AND next_run_at = :old"),
+                                   {"next": _fmt(next_run(s["spec"], now)), "n": s["name"], "old": s["next_run_at"]}).rowcount
+        # A run that is still queued or running is not stacked behind
+        if not claimed or s["last_status"] in ("queued", "running"):
+            continue
+        with use_tenant(DEFAULT_TENANT):
+            job_id = submit(s["kind"], json.loads(s["params"] or "{}"), created_by="scheduler", schedule=s["name"])
+        with get_engine().begin() as conn:
+            conn.execute(text("UPDATE job_schedules SET last_job_id = :j WHERE name = :n"), {"j": job_id, "n": s["name"]})
+        submitted.append(job_id)
+    return submitted
+
+def _heartbeat():
+    if not _running:
+        return
+    with get_engine().begin() as conn:
+        conn.execute(text("UPDATE jobs SET heartbeat_at = :ts WHERE id = :id"),
+                     [{"ts": now_ts(), "id": job_id} for job_id in list(_running)])
+
+# --- WORKERS ---
+_wake = threading.Event()
+_stop = threading.Event()
+_threads = []
+_running = set()
+_start_lock = threading.Lock()
+_local_claim_lock = threading.Lock()
+
+def _worker_loop(name):
+    while not _stop.is_set():
+        try:
+            job = claim_next(name)
+        except Exception:
+            logger.exception("job claim failed")
+            job = None
+        if job is None:
+            _wake.wait(POLL_SECONDS)
+            _wake.clear()
+            continue
+        run_job(job)
+
+def _scheduler_loop():
+    while not _stop.is_set():
+        try:
+            _heartbeat()
+            fail_stale_jobs()
+            run_due_schedules()
+        except Exception:
+            logger.exception("job scheduler tick failed")
+        _stop.wait(SCHEDULE_TICK_SECONDS)
+
+# Called once per process (app.py); job_workers = 0 leaves jobs to a separate
+# `python -m views.jobs worker` process
+def start_workers(threads=None):
+    threads = WORKER_THREADS if threads is None else threads
+    with _start_lock:
+        if _threads or threads <= 0:
+            return
+        seed_schedules()
+        host = f"{os.uname().nodename if hasattr(os, 'uname') else 'host'}:{os.getpid()}"
+        for i in range(threads):
+            _threads.append(threading.Thread(target=_worker_loop, args=(f"{host}/{i}",), name=f"job-worker-{i}", daemon=True))
+        _threads.append(threading.Thread(target=_scheduler_loop, name="job-scheduler", daemon=True))
+        for t in _threads:
+            t.start()
+
+def stop_workers(timeout=5.0):
+    _stop.set()
+    _wake.set()
+    for t in _threads:
+        t.join(timeout)
+    _threads.clear()
+    _stop.clear()
+
+# --- PAGE POLLING ---
+def show_job(job_id):
+    import streamlit as st
+    job = get_job(job_id)
+    if job is None:
+        return None
+    active = job["status"] not in FINISHED
+
+    @st.fragment(run_every=POLL_SECONDS if active else None)
+    def panel():
+        current = get_job(job_id)
+        label = f"{current['kind']} #{current['id']}: {current['status']}"
+        if current["status"] in ("queued", "running"):
+            st.progress(float(current["progress"] or 0), text=f"{label}" + (f" – {current['message']}" if current["message"] else ""))
+        elif current["status"] == "done":
+            st.success(label)
+        else:
+            st.error(f"{label}" + (f" – {current['message']}" if current["message"] else ""))
+        if active and current["status"] in FINISHED:
+            # Full rerun so the page can show the result and polling stops
+            st.rerun()
+    panel()
+    return job
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run and inspect background jobs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker = sub.add_parser("worker", help="run worker threads and the scheduler until interrupted")
+    worker.add_argument("--threads", type=int, default=max(WORKER_THREADS, 1))
+    sub_submit = sub.add_parser("submit")
+    sub_submit.add_argument("kind", choices=sorted(JOB_KINDS))
+    sub_submit.add_argument("params", nargs="*", help="key=value")
+    sub.add_parser("list")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="clinic to submit or list jobs for")
+    args = parser.parse_args(argv)
+
+    init_db()
+    if args.command == "worker":
+        start_workers(args.threads)
+        print(f"{args.threads} job workers running; Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            stop_workers()
+    elif args.command == "submit":
+        params = dict(p.split("=", 1) for p in args.params)
+        with use_tenant(args.tenant):
+            try:
+                print(f"Submitted job {submit(args.kind, params, created_by='cli')}")
+            except ValueError as e:
+                parser.error(str(e))
+    else:
+        with use_tenant(args.tenant):
+            jobs = list_jobs()
+        for row in jobs.itertuples():
+            print(f"{row.id:>6}  {row.kind:<22}{row.status:<11}{(row.progress or 0) * 100:>5.0f}%  {row.created_at[:19]}  {row.message or ''}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
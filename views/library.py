@@ -1,11 +1,12 @@
 # views/library.py
 import streamlit as st
-from .database import add_library_link, get_library, get_list_data, ENGINE, text
+from .database import (add_library_link, delete_library_item, get_library_page, get_list_data,
+                       library_category_counts, library_tags)
 
-def delete_lib_item(item_id):
-    with ENGINE.connect() as conn:
-        conn.execute(text("DELETE FROM library WHERE id=:id"), {"id":item_id})
-        conn.commit()
+PAGE_SIZE = 10
+CATEGORIES = ["Homework", "Reports", "Educational", "Videos"]
+ALL_CHILDREN = "All children"
+SHARED = "Shared with everyone"
 
 def show_page():
     st.title("📂 Resource Library")
@@ -19,15 +20,16 @@ def show_page():
             with st.form("add_resource_form", clear_on_submit=True):
                 child_df = get_list_data("children")
                 targets = ["All"] + (child_df['child_name'].tolist() if not child_df.empty else [])
-                
+
                 target_child = st.selectbox("Assign to Child", targets)
                 title = st.text_input("Resource Title (e.g., OT Home Exercises)")
                 link = st.text_input("URL Link (Google Drive, Dropbox, etc.)")
-                cat = st.selectbox("Category", ["Homework", "Reports", "Educational", "Videos"])
-                
+                cat = st.selectbox("Category", CATEGORIES)
+                tags = st.text_input("Tags (comma-separated, e.g. fine motor, home)")
+
                 if st.form_submit_button("Add to Library"):
                     if title and link:
-                        add_library_link(target_child, title, link, cat, username)
+                        add_library_link(target_child, title, link, cat, username, tags)
                         st.success("Resource added successfully!")
                         st.rerun()
                     else:
@@ -36,27 +38,54 @@ def show_page():
     st.divider()
 
     # VIEWING LOGIC
-    view_target = child_link if role == "parent" else "All"
-    
+    # Parents only ever see their own child's items and the shared ones; a
+    # parent with no linked child sees the shared items only
+    view_target, all_children = child_link or "All", False
+
+    c1, c2 = st.columns(2)
     if role != "parent":
         child_df = get_list_data("children")
-        names = ["All"] + (child_df['child_name'].tolist() if not child_df.empty else [])
-        view_target = st.selectbox("View Library For:", names)
-
-    df = get_library(view_target)
-    
-    if not df.empty:
-        for category in df['category'].unique():
-            st.subheader(f"📁 {category}")
-            cat_df = df[df['category'] == category]
-            for _, row in cat_df.iterrows():
-                with st.container(border=True):
-                    c1, c2 = st.columns([4, 1])
-                    c1.markdown(f"**[{row['title']}]({row['link_url']})**")
-                    c1.caption(f"Added by {row['added_by']} on {row['date_added']}")
-                    if role == "admin":
-                        if c2.button("🗑️", key=f"del_lib_{row['id']}"):
-                            delete_lib_item(row['id'])
-                            st.rerun()
-    else:
+        names = [ALL_CHILDREN, SHARED] + (child_df['child_name'].tolist() if not child_df.empty else [])
+        choice = c1.selectbox("View Library For:", names)
+        view_target = "All" if choice == SHARED else choice
+        all_children = choice == ALL_CHILDREN
+    tag = c2.selectbox("Tag", ["Any"] + library_tags(view_target, all_children))
+    tag = None if tag == "Any" else tag
+
+    # Page numbers restart whenever the selection changes
+    selection = (view_target, all_children, tag)
+    if st.session_state.get("lib_selection") != selection:
+        st.session_state["lib_selection"] = selection
+        st.session_state["lib_pages"] = {}
+    pages = st.session_state.setdefault("lib_pages", {})
+
+    counts = library_category_counts(view_target, tag, all_children)
+    if counts.empty:
         st.info("No resources available for this selection.")
+        return
+
+    for category, total in zip(counts["category"], counts["items"]):
+        label = category or "Uncategorized"
+        last_page = (int(total) + PAGE_SIZE - 1) // PAGE_SIZE
+        page = min(pages.get(label, 1), last_page)
+        st.subheader(f"📁 {label} ({total})")
+        for _, row in get_library_page(category, view_target, tag, page, PAGE_SIZE, all_children).iterrows():
+            with st.container(border=True):
+                c1, c2 = st.columns([4, 1])
+                c1.markdown(f"**[{row['title']}]({row['link_url']})**")
+                tag_text = " · " + " ".join(f"`{t}`" for t in row['tags'].split(",")) if isinstance(row['tags'], str) else ""
+                child_text = f" · for {row['child_name']}" if role != "parent" and row['child_name'] != "All" else ""
+                c1.caption(f"Added by {row['added_by']} on {row['date_added']}{child_text}{tag_text}")
+                if role == "admin":
+                    if c2.button("🗑️", key=f"del_lib_{row['id']}"):
+                        delete_library_item(row['id'])
+                        st.rerun()
+        if last_page > 1:
+            prev_col, mid_col, next_col = st.columns([1, 4, 1])
+            mid_col.caption(f"Page {page} of {last_page}")
+            if page > 1 and prev_col.button("⬅️", key=f"lib_prev_{label}"):
+                pages[label] = page - 1
+                st.rerun()
+            if page < last_page and next_col.button("➡️", key=f"lib_next_{label}"):
+                pages[label] = page + 1
+                st.rerun()
@@ -0,0 +1,246 @@
+# views/media.py
+import hashlib
+import html
+import mimetypes
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Uploads are stored once per content hash and referenced from
+# progress.media_path as "media:<sha256>" (refs written before the type moved to
+# a sidecar file end in the extension); plain links still work as before.
+# Only stdlib is imported at module level: thumbnail workers import this module.
+MEDIA_PREFIX = "media:"
+# Names the media route will serve: an object or one of its derivatives
+OBJECT_NAME = re.compile(r"[0-9a-f]{64}(\.[a-z0-9]{1,8})?(\.(thumb|preview)\.jpg)?")
+APP_STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+CHUNK_BYTES = 1024 * 1024
+THUMB_SIZE = (320, 320)
+PREVIEW_SIZE = (1280, 1280)
+# Without static serving, originals above this size are linked rather than inlined
+INLINE_LIMIT_BYTES = 25 * 1024 * 1024
+
+def media_root():
+    from .database import db_setting
+    return Path(db_setting("media_dir", APP_STATIC_DIR / "media"))
+
+def is_media_ref(value):
+    return isinstance(value, str) and value.startswith(MEDIA_PREFIX)
+
+def object_path(ref):
+    name = ref[len(MEDIA_PREFIX):]
+    return media_root() / name[:2] / name
+
+def derivative_path(ref, kind):
+    path = object_path(ref)
+    return path.with_name(f"{path.stem}.{kind}.jpg")
+
+def _type_path(path):
+    return path.with_name(f"{path.name}.type")
+
+def mime_type(ref):
+    path = object_path(ref)
+    if _type_path(path).exists():
+        return _type_path(path).read_text(encoding="utf-8").strip()
+    return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+# --- STORE ---
+def store_upload(uploaded):
+    ext = Path(getattr(uploaded, "name", "")).suffix.lower()
+    root = media_root()
+    root.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    tmp = root / f".upload-{os.getpid()}-{threading.get_ident()}"
+    uploaded.seek(0)
+    with open(tmp, "wb") as out:
+        while chunk := uploaded.read(CHUNK_BYTES):
+            digest.update(chunk)
+            out.write(chunk)
+    # The ref is the content hash alone, so the same bytes uploaded under
+    # another name or extension share one object; the type of the first
+    # upload is kept beside it
+    ref = f"{MEDIA_PREFIX}{digest.hexdigest()}"
+    path = object_path(ref)
+    if path.exists():
+        # Same bytes were uploaded before; keep the existing object
+        tmp.unlink()
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _type_path(path).write_text(mimetypes.guess_type(f"upload{ext}")[0] or "application/octet-stream", encoding="utf-8")
+        os.replace(tmp, path)
+    schedule_derivatives(ref)
+    return ref
+
+# --- THUMBNAILS & PREVIEWS ---
+_pool = None
+_pending = {}
+# Refs already tried this process (unsupported types and failures aren't retried)
+_attempted = set()
+_pool_lock = threading.Lock()
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the server process runs many threads
+            _pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def _make_derivatives(src, mime, thumb, preview):
+    from PIL import Image, ImageOps
+    if mime.startswith("video/"):
+        if not shutil.which("ffmpeg"):
+            return False
+        # Poster frame one second in, scaled to the preview size
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-ss", "1", "-i", src, "-frames:v", "1",
+                        "-vf", f"scale='min({PREVIEW_SIZE[0]},iw)':-2", preview], check=True, timeout=120)
+        src = preview
+    elif not mime.startswith("image/"):
+        return False
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        if src != preview:
+            full = img.copy()
+            full.thumbnail(PREVIEW_SIZE)
+            full.save(preview, "JPEG", quality=70, optimize=True)
+        img.thumbnail(THUMB_SIZE)
+        img.save(thumb, "JPEG", quality=75, optimize=True)
+    return True
+
+def schedule_derivatives(ref):
+    thumb, preview = derivative_path(ref, "thumb"), derivative_path(ref, "preview")
+    if thumb.exists() or ref in _pending or ref in _attempted:
+        return
+    future = _executor().submit(_make_derivatives, str(object_path(ref)), mime_type(ref), str(thumb), str(preview))
+    _pending[ref] = future
+
+    def done(_):
+        _attempted.add(ref)
+        _pending.pop(ref, None)
+    future.add_done_callback(done)
+
+def thumbnail(ref):
+    path = derivative_path(ref, "thumb")
+    if path.exists():
+        return path
+    if object_path(ref).exists():
+        schedule_derivatives(ref)
+    return None
+
+# --- SERVING ---
+# When the app runs through asgi.py, originals and previews are served by the
+# media route below: Starlette's FileResponse streams from disk with HTTP Range
+# support (videos seek without passing through Python memory), and every URL is
+# signed for the signed-in user who rendered it (views/auth.py sign_link), so
+# it only works for them, while their role and child link are unchanged, and
+# until LINK_TTL runs out. Under plain `streamlit run` there is no such route:
+# attachments then go through Streamlit's media file manager, which holds the
+# file in memory for the session, so only images up to INLINE_LIMIT_BYTES are
+# shown and videos are not played.
+# Setting server.enableStaticServing = true serves ./static from disk instead,
+# but app/static/ has no sign-in check: the content hash in the URL is then the
+# only protection, and anyone holding a link can fetch the file.
+LINK_TTL = 3600
+_route_mounted = False
+
+def routes():
+    """Starlette routes for st.App (see asgi.py)."""
+    global _route_mounted
+    from starlette.exceptions import HTTPException
+    from starlette.responses import FileResponse
+    from starlette.routing import Route
+    from . import auth
+
+    def serve(request):
+        name, params = request.path_params["name"], request.query_params
+        if not OBJECT_NAME.fullmatch(name):
+            raise HTTPException(status_code=404)
+        if not auth.check_link(name, params.get("u"), params.get("v"), params.get("exp"), params.get("sig")):
+            raise HTTPException(status_code=403)
+        path = media_root() / name[:2] / name
+        if not path.is_file():
+            raise HTTPException(status_code=404)
+        media = "image/jpeg" if name.endswith((".thumb.jpg", ".preview.jpg")) else mime_type(MEDIA_PREFIX + name)
+        response = FileResponse(path, media_type=media)
+        response.headers["Cache-Control"] = "private, max-age=3600"
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        return response
+
+    _route_mounted = True
+    return [Route(f"{_base_path()}/api/media/{{name}}", serve, methods=["GET", "HEAD"])]
+
+def _base_path():
+    import streamlit as st
+    base = (st.get_option("server.baseUrlPath") or "").strip("/")
+    return f"/{base}" if base else ""
+
+def media_url(path):
+    import streamlit as st
+    from urllib.parse import urlencode
+    from . import auth
+    if not _route_mounted:
+        return None
+    user = auth.current_user(st.session_state.get("auth_token"))
+    if user is None:
+        return None
+    name = Path(path).name
+    # Rounded to the hour so reruns keep the same URL and the browser cache
+    # holds; a link stays valid for one to two LINK_TTLs
+    expires_at = (int(time.time()) // LINK_TTL + 2) * LINK_TTL
+    query = urlencode({"u": user["username"], "v": user["auth_version"], "exp": expires_at,
+                       "sig": auth.sign_link(user, name, expires_at)})
+    return f"{_base_path()}/api/media/{name}?{query}"
+
+def static_url(path):
+    import streamlit as st
+    if not st.get_option("server.enableStaticServing"):
+        return None
+    try:
+        relative = Path(path).resolve().relative_to(APP_STATIC_DIR)
+    except ValueError:
+        return None
+    return f"{_base_path()}/app/static/{relative.as_posix()}"
+
+def serve_url(path):
+    return media_url(path) or static_url(path)
+
+def show_attachment(media_path, key):
+    import streamlit as st
+    if not is_media_ref(media_path):
+        st.markdown(f"[🔗 View Attached Media]({media_path})")
+        return
+    # Nothing is read or sent to the browser until the viewer asks for it
+    if not st.toggle("🖼️ Show attachment", key=f"media_{key}"):
+        return
+    original = object_path(media_path)
+    if not original.exists():
+        st.warning("The attached file is missing from the media store.")
+        return
+    thumb = thumbnail(media_path)
+    if thumb:
+        st.image(str(thumb))
+    elif media_path in _pending:
+        st.caption("⏳ Preview is still being generated.")
+    url = serve_url(original)
+    if mime_type(media_path).startswith("video/"):
+        if url:
+            # A plain <video> element: the browser fetches the URL itself, in
+            # ranges, instead of st.video handing the file to the media manager
+            st.html(f'<video controls preload="metadata" src="{html.escape(url)}" style="width: 100%"></video>')
+        else:
+            st.caption("Videos play only when the app is served through asgi.py (see views/media.py).")
+    else:
+        preview = derivative_path(media_path, "preview")
+        full_url = serve_url(preview if preview.exists() else original)
+        if full_url:
+            st.markdown(f"[🔍 Open larger preview]({full_url})")
+        elif not thumb and original.stat().st_size <= INLINE_LIMIT_BYTES:
+            st.image(str(original))
+        elif preview.exists() and st.toggle("🔍 Larger preview", key=f"media_preview_{key}"):
+            st.image(str(preview))
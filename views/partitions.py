@@ -0,0 +1,223 @@
+# views/partitions.py
+"""Monthly partitions for progress/attendance and cold-data archival.
+
+    python -m views.partitions migrate             # convert existing tables (Postgres)
+    python -m views.partitions ensure --ahead 3    # create upcoming monthly partitions
+    python -m views.partitions archive [--before 2025-09]
+"""
+import argparse
+import json
+import os
+from datetime import date
+import pandas as pd
+from sqlalchemy import text
+from .database import (
+    ARCHIVED_TABLES,
+    ATTENDANCE_COLUMNS,
+    PROGRESS_COLUMNS,
+    SEARCH_SOURCES,
+    archive_dir,
+    get_engine,
+    is_sqlite,
+)
+
+PARTITION_DDL = {
+    "progress": f"CREATE TABLE {{name}} (id SERIAL, {PROGRESS_COLUMNS}, PRIMARY KEY (id, date)) PARTITION BY RANGE (date)",
+    "attendance": f"CREATE TABLE {{name}} (id SERIAL, {ATTENDANCE_COLUMNS}, PRIMARY KEY (id, date), UNIQUE (tenant, date, child_name)) PARTITION BY RANGE (date)",
+}
+
+# --- MONTH HELPERS (dates are stored as 'YYYY-MM-DD' text) ---
+def _add_months(month, n):
+    y, m = divmod(month.year * 12 + month.month - 1 + n, 12)
+    return date(y, m + 1, 1)
+
+def _partition_name(table, month):
+    return f"{table}_{month:%Y_%m}"
+
+# Closed data = everything before the current school year (which starts in September)
+def school_year_start(today=None):
+    today = today or date.today()
+    return date(today.year if today.month >= 9 else today.year - 1, 9, 1)
+
+def is_partitioned(conn, table):
+    return conn.execute(text("""SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid
+                                WHERE c.relname = :t"""), {"t": table}).first() is not None
+
+def list_partitions(conn, table):
+    rows = conn.execute(text("""SELECT c.relname FROM pg_inherits i
+                                JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent
+                                WHERE p.relname = :t ORDER BY c.relname"""), {"t": table}).fetchall()
+    return [r[0] for r in rows]
+
+# --- PARTITION MAINTENANCE (Postgres) ---
+def create_month_partition(conn, table, month):
+    name = _partition_name(table, month)
+    conn.execute(text(f"""CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table}
+                          FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')"""))
+
+# Last month through `ahead` months from now get their own partition;
+# anything else (old, bad or missing dates) lands in <table>_default
+def ensure_partitions(conn, ahead=3):
+    for table in ARCHIVED_TABLES:
+        if not is_partitioned(conn, table):
+            continue
+        this_month = date.today().replace(day=1)
+        months = {_add_months(this_month, n) for n in range(-1, ahead + 1)}
+        # Postgres refuses a new partition whose range already has rows in the
+        # default partition, so those months stay in the default
+        parked = {r[0] for r in conn.execute(text(f"SELECT DISTINCT substr(date, 1, 7) FROM {table}_default"))} \
+            if f"{table}_default" in list_partitions(conn, table) else set()
+        for month in sorted(m for m in months if f"{m:%Y-%m}" not in parked):
+            create_month_partition(conn, table, month)
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+
+# Rebuilds an existing unpartitioned table as a partitioned one (one partition
+# per month that has rows), copies the rows and carries the id sequence over
+def migrate_table(conn, table):
+    if is_partitioned(conn, table):
+        return 0
+    legacy = f"{table}_unpartitioned"
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+    conn.execute(text(PARTITION_DDL[table].format(name=table)))
+    months = conn.execute(text(f"""SELECT DISTINCT substr(date, 1, 7) FROM {legacy}
+                                   WHERE date ~ '^[0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}$'""")).fetchall()
+    for (month,) in months:
+        create_month_partition(conn, table, date.fromisoformat(month + "-01"))
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+    # Legacy tables gained columns through ALTER TABLE, so their order can differ
+    new_cols = {r[0] for r in conn.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name = :t"), {"t": table})}
+    cols = ", ".join(r[0] for r in conn.execute(text("""SELECT column_name FROM information_schema.columns
+                                                       WHERE table_name = :t ORDER BY ordinal_position"""), {"t": legacy}) if r[0] in new_cols)
+    copied = conn.execute(text(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {legacy}")).rowcount
+    conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"))
+    conn.execute(text(f"DROP TABLE {legacy}"))
+    return copied
+
+# --- ARCHIVAL ---
+def _manifest_path():
+    return os.path.join(archive_dir(), "manifest.json")
+
+def load_manifest():
+    path = _manifest_path()
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_manifest(entries):
+    tmp = _manifest_path() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=2)
+    os.replace(tmp, _manifest_path())
+
+# month -> named partition holding it (Postgres), or None when its rows are
+# deleted instead: on SQLite, unpartitioned tables and months parked in <table>_default
+def _archived_months(conn, table, before):
+    months = {}
+    if is_sqlite() or not is_partitioned(conn, table):
+        rows = conn.execute(text(f"SELECT DISTINCT substr(date, 1, 7) FROM {table} WHERE date < :b"), {"b": str(before)}).fetchall()
+        return {date.fromisoformat(r[0] + "-01"): None for r in rows if r[0]}
+    partitions = list_partitions(conn, table)
+    for name in partitions:
+        suffix = name[len(table) + 1:]
+        if suffix != "default" and date(int(suffix[:4]), int(suffix[5:7]), 1) < before:
+            months[date(int(suffix[:4]), int(suffix[5:7]), 1)] = name
+    if f"{table}_default" in partitions:
+        rows = conn.execute(text(f"""SELECT DISTINCT substr(date, 1, 7) FROM {table}_default
+                                     WHERE date ~ '^[0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}$' AND date < :b"""), {"b": str(before)}).fetchall()
+        months.update((date.fromisoformat(r[0] + "-01"), None) for r in rows)
+    return months
+
+# Exports every closed month to zstd-compressed Parquet, then detaches and
+# drops its partition (Postgres) or deletes its rows (SQLite, and months in the
+# default partition), along with their search docs. Each month's file is
+# written to .tmp inside the transaction and moved into place only after it
+# commits, and the manifest is saved after each month, so a failed month
+# leaves neither a file nor a manifest entry for rows still in the database.
+def _manifest_entry(table, month, path, rows):
+    return {"table": table, "month": month, "file": path, "rows": rows,
+            "archived_at": pd.Timestamp.now().isoformat(timespec="seconds")}
+
+def _record(manifest, entry):
+    manifest = [m for m in manifest if not (m["table"] == entry["table"] and m["month"] == entry["month"])] + [entry]
+    _save_manifest(manifest)
+    return manifest
+
+def archive_closed_months(before=None):
+    engine = get_engine()
+    before = before or school_year_start()
+    os.makedirs(archive_dir(), exist_ok=True)
+    manifest = load_manifest()
+    archived = []
+    for table in ARCHIVED_TABLES:
+        folder = os.path.join(archive_dir(), table)
+        os.makedirs(folder, exist_ok=True)
+        with engine.connect() as conn:
+            months = _archived_months(conn, table, before)
+        paths = {month: os.path.join(folder, f"{_partition_name(table, month)}.parquet") for month in months}
+        # A .tmp left for a month with no rows in the database is from a run
+        # that committed but stopped before moving the file into place
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name[:-len(".tmp")])
+            if name.endswith(".parquet.tmp") and path not in paths.values():
+                os.replace(path + ".tmp", path)
+                month = name[len(table) + 1:-len(".parquet.tmp")].replace("_", "-")
+                manifest = _record(manifest, _manifest_entry(table, month, path, len(pd.read_parquet(path, columns=["id"]))))
+        for month, partition in sorted(months.items()):
+            lo, hi = f"{month:%Y-%m-%d}", f"{_add_months(month, 1):%Y-%m-%d}"
+            path = paths[month]
+            with engine.begin() as conn:
+                df = pd.read_sql_query(text(f"SELECT * FROM {table} WHERE date >= :lo AND date < :hi"), conn, params={"lo": lo, "hi": hi})
+                # Month was partly archived before (late rows), or a .tmp from
+                # a run that may have committed is left over; keep every set,
+                # the database's copy of a row winning
+                earlier = [pd.read_parquet(p) for p in (path, path + ".tmp") if os.path.exists(p)]
+                if earlier:
+                    df = pd.concat([*earlier, df], ignore_index=True).drop_duplicates("id", keep="last")
+                df.to_parquet(path + ".tmp", compression="zstd", index=False)
+                # Search docs carry their row's date, so the month's docs go with it
+                if table in SEARCH_SOURCES:
+                    conn.execute(text("DELETE FROM search_index WHERE source = :src AND date >= :lo AND date < :hi"),
+                                 {"src": table, "lo": lo, "hi": hi})
+                if partition is None:
+                    conn.execute(text(f"DELETE FROM {table} WHERE date >= :lo AND date < :hi"), {"lo": lo, "hi": hi})
+                else:
+                    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition}"))
+                    conn.execute(text(f"DROP TABLE {partition}"))
+            os.replace(path + ".tmp", path)
+            entry = _manifest_entry(table, f"{month:%Y-%m}", path, len(df))
+            manifest = _record(manifest, entry)
+            archived.append(entry)
+    return archived
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partition maintenance and archival for progress/attendance.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="convert existing tables to monthly partitions (Postgres)")
+    ensure = sub.add_parser("ensure", help="create upcoming monthly partitions (Postgres)")
+    ensure.add_argument("--ahead", type=int, default=3)
+    archive = sub.add_parser("archive", help="export closed months to Parquet and drop them")
+    archive.add_argument("--before", help="YYYY-MM; defaults to the start of the current school year")
+    args = parser.parse_args(argv)
+
+    engine = get_engine()
+    if args.command in ("migrate", "ensure") and is_sqlite(engine):
+        print("Partitioning is only used on Postgres; nothing to do.")
+        return 0
+    if args.command == "migrate":
+        with engine.begin() as conn:
+            for table in ARCHIVED_TABLES:
+                print(f"{table}: {migrate_table(conn, table)} rows moved into monthly partitions")
+            ensure_partitions(conn)
+    elif args.command == "ensure":
+        with engine.begin() as conn:
+            ensure_partitions(conn, ahead=args.ahead)
+        print("Partitions are in place.")
+    else:
+        before = date.fromisoformat(args.before + "-01") if args.before else None
+        for entry in archive_closed_months(before):
+            print(f"{entry['table']} {entry['month']}: {entry['rows']} rows -> {entry['file']}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,38 +2,96 @@
 import streamlit as st
 import pandas as pd
 from datetime import date, timedelta
-from .database import get_data, save_plan, update_plan_extras
+from .database import (
+    apply_plan_template,
+    copy_plans_forward,
+    delete_plan_template,
+    get_data,
+    get_plan_templates,
+    save_plan,
+    save_plan_template,
+    update_plan_extras,
+)
 
 def show_page():
     st.title("📅 Daily Planner & Coordination")
     username = st.session_state.get("username", "User")
     role = st.session_state.get("role", "").lower()
 
+    templates = get_plan_templates()
+
     # --- SECTION 1: CREATE NEW PLAN ---
     with st.expander("➕ Create New Daily Plan", expanded=False):
+        # Picking a template pre-fills the routines below
+        t_names = ["(blank)"] + (templates['name'].tolist() if not templates.empty else [])
+        t_pick = st.selectbox("Start from template", t_names, key="plan_template_pick")
+        tpl = templates[templates['name'] == t_pick].iloc[0] if t_pick != "(blank)" else {}
         with st.form("create_plan_form", clear_on_submit=True):
             st.markdown("### Plan Details")
             p_date = st.date_input("Date for Plan", date.today())
             lead = st.text_input("Lead Staff / Teacher", value=username)
             
             col1, col2 = st.columns(2)
-            wu = col1.text_area("Warm Up Routine")
-            lb = col2.text_area("Learning Block")
-            rb = col1.text_area("Regulation Break")
-            sp = col2.text_area("Social Play")
+            wu = col1.text_area("Warm Up Routine", value=tpl.get('warm_up') or "")
+            lb = col2.text_area("Learning Block", value=tpl.get('learning_block') or "")
+            rb = col1.text_area("Regulation Break", value=tpl.get('regulation_break') or "")
+            sp = col2.text_area("Social Play", value=tpl.get('social_play') or "")
             
-            cr = st.text_area("Closing Routine")
-            mn = st.text_area("Materials Needed")
-            notes = st.text_area("Internal Team Notes")
+            cr = st.text_area("Closing Routine", value=tpl.get('closing_routine') or "")
+            mn = st.text_area("Materials Needed", value=tpl.get('materials_needed') or "")
+            notes = st.text_area("Internal Team Notes", value=tpl.get('internal_notes') or "")
+            template_name = st.text_input("Save these routines as a template (optional)", placeholder="e.g. Standard Monday")
             
             if st.form_submit_button("Publish Plan to Team"):
                 if wu and lb:
                     save_plan(p_date, lead, "Team", wu, lb, rb, sp, cr, mn, notes, username)
+                    if template_name:
+                        save_plan_template(template_name, wu, lb, rb, sp, cr, mn, notes, username)
                     st.success("Plan successfully published!")
                     st.rerun()
                 else:
                     st.error("Please fill in the required fields.")
 
+    # --- SECTION 1b: BULK PLANNING ---
+    with st.expander("⏩ Plan Ahead (templates & copy forward)", expanded=False):
+        st.caption("Days that already have a plan are skipped. Weekends are skipped unless included.")
+        mode = st.radio("Source", ["Template", "Existing day or week"], horizontal=True)
+        t1, t2 = st.columns(2)
+        target_start = t1.date_input("Fill from", date.today() + timedelta(days=1), key="bulk_from")
+        target_end = t2.date_input("Fill to", date.today() + timedelta(days=7), key="bulk_to")
+        include_weekends = st.checkbox("Include weekends", key="bulk_weekends")
+
+        if mode == "Template":
+            if templates.empty:
+                st.info("No templates yet. Save one from the Create form.")
+            else:
+                t_name = st.selectbox("Template", templates['name'].tolist(), key="bulk_template")
+                t_row = templates[templates['name'] == t_name].iloc[0]
+                b1, b2 = st.columns(2)
+                if b1.button("Apply Template", type="primary"):
+                    days = [target_start + timedelta(days=i) for i in range((target_end - target_start).days + 1)]
+                    days = [d for d in days if include_weekends or d.weekday() < 5]
+                    created = apply_plan_template(t_row['id'], days, username, username)
+                    st.success(f"Created {created} plans from '{t_name}'.")
+                    st.rerun()
+                if b2.button("🗑️ Delete Template"):
+                    delete_plan_template(t_row['id'])
+                    st.rerun()
+        else:
+            s1, s2 = st.columns(2)
+            monday = date.today() - timedelta(days=date.today().weekday())
+            source_start = s1.date_input("Copy from", monday, key="copy_src_from")
+            source_end = s2.date_input("Copy to", monday + timedelta(days=6), key="copy_src_to")
+            st.caption("A single source day fills every target day; a Monday-Sunday week repeats weekday by weekday.")
+            if st.button("Copy Forward", type="primary"):
+                if source_end < source_start or target_end < target_start:
+                    st.error("Check the date ranges.")
+                else:
+                    created = copy_plans_forward(source_start, source_end, target_start, target_end, username,
+                                                 weekdays_only=not include_weekends)
+                    st.success(f"Created {created} plans.")
+                    st.rerun()
+
     st.divider()
 
     # --- SECTION 2: FILTERING & BOARD ---
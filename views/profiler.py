@@ -0,0 +1,110 @@
+# views/profiler.py
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import time
+from collections import deque
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from . import instrumentation
+
+# (ts, page, wall_ms, db_ms, python_ms, queries, widgets, profiled)
+PAGE_RENDERS = deque(maxlen=1000)
+# (ts, page, wall_ms, pstats.Stats) for sampled cProfile captures
+PROFILES = deque(maxlen=20)
+
+# Profiling is opt-in per session, toggled by admins from the sidebar
+def is_enabled():
+    return st.session_state.get("profiling_enabled", False)
+
+def sidebar_controls():
+    with st.sidebar.expander("⏱️ Profiling"):
+        st.checkbox("Profile page renders", key="profiling_enabled")
+        st.slider("cProfile sample rate", 0.0, 1.0, 0.1, 0.05, key="profiling_sample_rate")
+
+def _widget_count():
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    # The attribute moved between Streamlit releases
+    ids = getattr(getattr(ctx, "shared", None), "widget_ids_this_run", None)
+    if ids is None:
+        ids = getattr(ctx, "widget_ids_this_run", None)
+    if ids is None:
+        return None
+    return len(ids.snapshot()) if hasattr(ids, "snapshot") else len(ids)
+
+def run_page(page_name, page_func):
+    with instrumentation.render(page_name) as render_stats:
+        if not is_enabled():
+            return page_func()
+
+        sample = random.random() < st.session_state.get("profiling_sample_rate", 0.1)
+        profile = cProfile.Profile() if sample else None
+        widgets_before = _widget_count() or 0
+        started = time.perf_counter()
+        try:
+            if profile:
+                profile.enable()
+            return page_func()
+        finally:
+            if profile:
+                profile.disable()
+            wall_ms = (time.perf_counter() - started) * 1000
+            widgets_after = _widget_count()
+            widgets = widgets_after - widgets_before if widgets_after is not None else None
+            db_ms = render_stats["db_ms"]
+            PAGE_RENDERS.append((time.time(), page_name, wall_ms, db_ms, max(wall_ms - db_ms, 0.0),
+                                 render_stats["queries"], widgets, bool(profile)))
+            if profile:
+                PROFILES.append((time.time(), page_name, wall_ms, pstats.Stats(profile)))
+
+# --- REPORTING & EXPORT ---
+def page_renders_df():
+    return pd.DataFrame(list(PAGE_RENDERS), columns=["ts", "page", "wall_ms", "db_ms", "python_ms", "queries", "widgets", "profiled"])
+
+def page_summary():
+    df = page_renders_df()
+    if df.empty:
+        return df
+    return df.groupby("page").agg(
+        renders=("wall_ms", "size"), p50_wall_ms=("wall_ms", "median"),
+        p95_wall_ms=("wall_ms", lambda w: w.quantile(0.95)), avg_db_ms=("db_ms", "mean"),
+        avg_python_ms=("python_ms", "mean"), avg_widgets=("widgets", "mean")).reset_index()
+
+# Same format as pstats.Stats.dump_stats, loadable by snakeviz / pstats
+def export_prof(stats):
+    return marshal.dumps(stats.stats)
+
+def _func_label(func):
+    filename, line, name = func
+    return f"{name} ({filename.rsplit('/', 1)[-1]}:{line})"
+
+# cProfile only records direct caller->callee edges, so each function's stack
+# is rebuilt by following its most expensive caller back to a root
+def export_collapsed(stats):
+    heaviest_caller = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        if callers:
+            heaviest_caller[func] = max(callers.items(), key=lambda item: item[1][3])[0]
+
+    out = io.StringIO()
+    for func, (_, _, tottime, _, _) in stats.stats.items():
+        micros = int(tottime * 1_000_000)
+        if micros <= 0:
+            continue
+        stack, seen, node = [], set(), func
+        while node is not None and node not in seen:
+            seen.add(node)
+            stack.append(_func_label(node))
+            node = heaviest_caller.get(node)
+        out.write(";".join(reversed(stack)) + f" {micros}\n")
+    return out.getvalue()
+
+def top_functions(stats, limit=25):
+    out = io.StringIO()
+    pstats.Stats(stream=out).add(stats).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,69 @@
+# views/reports.py
+import json
+import streamlit as st
+import plotly.express as px
+from .database import DEFAULT_TENANT, current_tenant
+from .jobs import show_job, submit
+from .snapshots import load_state, run_report, connect
+
+# Results only change when a new snapshot is exported, so the export time is
+# part of the cache key (with the clinic the report is for)
+@st.cache_data(show_spinner=False)
+def cached_report(name, snapshot_version, tenant):
+    return run_report(name, connect(tenant))
+
+def show_page():
+    st.title("📈 Program Reports")
+    st.caption("Built from Parquet snapshots with DuckDB, so the live database is not scanned.")
+
+    state = load_state()
+    c1, c2 = st.columns([3, 1])
+    if state:
+        last = max(s["exported_at"] for s in state.values())
+        c1.info(f"Snapshot last exported {last}.")
+    else:
+        c1.warning("No snapshot yet. Export one to see reports." if current_tenant() == DEFAULT_TENANT
+                   else "No snapshot yet. Reports appear after the next scheduled export.")
+    # The export runs as a background job; the page polls it and reruns when it
+    # finishes. It covers every clinic, so only the default clinic can start it
+    if current_tenant() == DEFAULT_TENANT and c2.button("🔄 Export Snapshot"):
+        st.session_state["snapshot_job"] = submit("snapshot_export", created_by=st.session_state.get("username"))
+    if "snapshot_job" in st.session_state:
+        job = show_job(st.session_state["snapshot_job"])
+        if job and job["status"] == "done" and job["result"]:
+            with st.expander("Last export"):
+                st.dataframe(json.loads(job["result"]), use_container_width=True, hide_index=True)
+    if not state:
+        return
+    version = max(s["exported_at"] for s in state.values())
+
+    tab1, tab2, tab3 = st.tabs(["📅 Attendance", "🩺 Sessions", "💳 Revenue"])
+
+    with tab1:
+        att = cached_report("attendance_by_month", version, current_tenant())
+        if att.empty:
+            st.info("No attendance in the snapshot.")
+        else:
+            st.plotly_chart(px.line(att, x="month", y="attendance_rate", markers=True,
+                                    labels={"attendance_rate": "Attendance rate (%)"}), use_container_width=True)
+            st.dataframe(att, use_container_width=True, hide_index=True)
+
+    with tab2:
+        sessions = cached_report("sessions_by_discipline", version, current_tenant())
+        if sessions.empty:
+            st.info("No appointments in the snapshot.")
+        else:
+            st.plotly_chart(px.bar(sessions, x="discipline", y=["completed", "no_show"], barmode="group"), use_container_width=True)
+            st.dataframe(sessions, use_container_width=True, hide_index=True)
+        st.markdown("**Progress notes by discipline**")
+        notes = cached_report("progress_by_discipline", version, current_tenant())
+        if not notes.empty:
+            st.dataframe(notes, use_container_width=True, hide_index=True)
+
+    with tab3:
+        revenue = cached_report("revenue_by_service", version, current_tenant())
+        if revenue.empty:
+            st.info("No invoices in the snapshot.")
+        else:
+            st.plotly_chart(px.bar(revenue, x="service", y=["collected", "outstanding"]), use_container_width=True)
+            st.dataframe(revenue, use_container_width=True, hide_index=True)
@@ -3,12 +3,20 @@ import streamlit as st
 import pandas as pd
 from datetime import date, datetime
 from .database import get_appointments, create_appointment, get_list_data, update_appointment, delete_appointment
+from .ical import feed_filename, get_feed
+
+def calendar_download(scope, name):
+    content, tag = get_feed(scope, name)
+    st.download_button(f"📆 Add {name}'s schedule to my calendar (.ics)", content, feed_filename(scope, name),
+                       "text/calendar", key=f"ics_{scope}_{name}")
+    st.caption(f"Calendar version {tag[:8]}")
 
 def show_page():
     st.title("🗓️ Schedule & Appointments")
     
     role = st.session_state.get('role', '').lower()
     child_link = st.session_state.get('child_link')
+    username = st.session_state.get('username')
 
     # --- ADMIN VIEW: Create & Manage ---
     if role == 'admin':
@@ -26,7 +34,7 @@ def show_page():
                 s_child = st.selectbox("Child", children)
                 
                 d_type = st.selectbox("Type", ["OT Session", "SLP Session", "BC Consultation", "Assessment", "Other"])
-                staff = st.text_input("Provider Name")
+                staff = st.text_input("Provider Name", help="The provider's username, so their progress notes count as this session's documentation")
                 cost = st.number_input("Cost ($)", value=0.0)
                 
                 if st.form_submit_button("Book"):
@@ -62,10 +70,23 @@ def show_page():
         if child_link and child_link not in ["None", "All"]:
             df = get_appointments(child_name=child_link)
             st.subheader(f"Upcoming Schedule for {child_link}")
+            calendar_download("child", child_link)
         else:
             st.error("No child linked.")
     elif role == 'admin':
         df = get_appointments()
+        if not df.empty:
+            with st.expander("📆 Calendar feeds"):
+                scope = st.radio("Feed for", ["child", "provider"], horizontal=True, format_func=str.title)
+                names = sorted(n for n in df["child_name" if scope == "child" else "staff"].dropna().unique() if str(n).strip())
+                if names:
+                    calendar_download(scope, st.selectbox("Name", names, key="ics_name"))
+    else:
+        # Staff see the appointments booked under their username, and its feed
+        df = get_appointments(staff=username)
+        st.subheader("My Appointments")
+        if not df.empty:
+            calendar_download("provider", username)
 
     if not df.empty:
         df['date'] = pd.to_datetime(df['date']).dt.date
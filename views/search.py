@@ -0,0 +1,56 @@
+# views/search.py
+import streamlit as st
+from .database import search_records
+
+SOURCE_LABELS = {
+    "progress": "📝 Progress Note",
+    "session_plans": "📅 Daily Plan",
+    "library": "📂 Library",
+}
+
+PAGE_SIZE = 20
+
+def show_page():
+    st.title("🔎 Search")
+    role = st.session_state.get('role', '').lower()
+    child_link = st.session_state.get('child_link')
+
+    if role == 'parent':
+        st.caption("Search notes shared with your family and your library resources.")
+    else:
+        st.caption("Search clinical notes, parent notes & feedback, daily plans and library titles.")
+
+    query = st.text_input("Search for...", placeholder="e.g. toilet training")
+    if not query:
+        return
+
+    # Reset to the first page whenever the query changes
+    if st.session_state.get("search_last_query") != query:
+        st.session_state["search_last_query"] = query
+        st.session_state["search_page"] = 1
+    page = st.session_state.get("search_page", 1)
+
+    results, total = search_records(query, role, child_link, page=page, page_size=PAGE_SIZE)
+    if total == 0:
+        st.info("No matches found.")
+        return
+
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    st.write(f"**{total}** matches — page {page} of {pages}")
+
+    for _, row in results.iterrows():
+        with st.container(border=True):
+            c1, c2 = st.columns([4, 1])
+            c1.markdown(f"**{row['title']}**")
+            c2.caption(SOURCE_LABELS.get(row['source'], row['source']))
+            if row['snippet'] and str(row['snippet']).strip():
+                st.markdown(row['snippet'])
+            st.caption(f"Date: {row['date']} | Child: {row['child_name']}")
+
+    prev_col, _, next_col = st.columns([1, 4, 1])
+    if page > 1 and prev_col.button("⬅️ Previous"):
+        st.session_state["search_page"] = page - 1
+        st.rerun()
+    if page < pages and next_col.button("Next ➡️"):
+        st.session_state["search_page"] = page + 1
+        st.rerun()
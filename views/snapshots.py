@@ -0,0 +1,181 @@
+# views/snapshots.py
+"""Incremental Parquet snapshots of the reporting tables, queried with DuckDB.
+
+    python -m views.snapshots              # export what changed since the last run
+    python -m views.snapshots --full       # start the snapshot over
+
+Snapshots hold one Parquet file per table and month. A run rewrites only the
+months that received rows with an id above the table's watermark, plus the
+months inside the refresh window so status changes (invoices paid,
+appointments completed) and deletes there reach the reports. Older months
+are treated as settled. Files hold every clinic's rows; connect() exposes
+only one clinic's.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+from datetime import date, timedelta
+import pandas as pd
+from sqlalchemy import text
+from .database import ARCHIVED_TABLES, DEFAULT_TENANT, archive_dir, current_tenant, db_setting, get_engine, read_archive
+
+SNAPSHOT_TABLES = ("progress", "attendance", "appointments", "invoices")
+REFRESH_DAYS = int(db_setting("snapshot_refresh_days", 90))
+
+def snapshot_dir():
+    return db_setting("snapshot_dir", "snapshots")
+
+def _state_path():
+    return os.path.join(snapshot_dir(), "state.json")
+
+def load_state():
+    path = _state_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_state(state):
+    tmp = _state_path() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, _state_path())
+
+# --- EXPORT ---
+def _months_between(start, end):
+    months, (y, m) = [], (start.year, start.month)
+    while (y, m) <= (end.year, end.month):
+        months.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+# A date range rather than substr(date, 1, 7) so the date index (and, on
+# Postgres, partition pruning) limits the read to the one month
+def _export_month(conn, table, month, path):
+    y, m = int(month[:4]), int(month[5:7])
+    hi = f"{y + 1:04d}-01-01" if m == 12 else f"{y:04d}-{m + 1:02d}-01"
+    df = pd.read_sql_query(text(f"SELECT * FROM {table} WHERE date >= :lo AND date < :hi ORDER BY id"), conn,
+                           params={"lo": f"{month}-01", "hi": hi})
+    if table in ARCHIVED_TABLES:
+        # Months moved to the Parquet archive (views/partitions.py) are no
+        # longer in the database but still belong in the reports
+        archived = read_archive(table, start=f"{month}-01", end=f"{month}-31", all_tenants=True)
+        if not archived.empty:
+            df = pd.concat([archived, df], ignore_index=True).drop_duplicates("id", keep="last")
+    if df.empty:
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+    df.to_parquet(path + ".tmp", compression="zstd", index=False)
+    os.replace(path + ".tmp", path)
+    return len(df)
+
+# progress(done, total, message) is called per table when run as a job
+def export_snapshots(full=False, today=None, progress=None):
+    if full and os.path.isdir(snapshot_dir()):
+        shutil.rmtree(snapshot_dir())
+    os.makedirs(snapshot_dir(), exist_ok=True)
+    state = load_state()
+    today = today or date.today()
+    window = _months_between(today - timedelta(days=REFRESH_DAYS), today)
+    summary = []
+    # One connection for the whole run so every table is read from the same server
+    with get_engine().connect() as conn:
+        for i, table in enumerate(SNAPSHOT_TABLES):
+            if progress:
+                progress(i, len(SNAPSHOT_TABLES), f"Exporting {table}")
+            table_dir = os.path.join(snapshot_dir(), table)
+            os.makedirs(table_dir, exist_ok=True)
+            watermark = state.get(table, {}).get("max_id", 0)
+            # The high-water mark is read first: rows inserted after it are
+            # picked up by the next run instead of being skipped
+            max_id = conn.execute(text(f"SELECT MAX(id) FROM {table}")).scalar() or watermark
+            changed = {r[0] for r in conn.execute(text(f"SELECT DISTINCT substr(date, 1, 7) FROM {table} WHERE id > :w AND id <= :hi"),
+                                                  {"w": watermark, "hi": max_id})
+                       if r[0] and re.fullmatch(r"\d{4}-\d{2}", r[0])}
+            if table in state:
+                changed |= set(window)
+            elif table in ARCHIVED_TABLES:
+                # First export also picks up months that only exist in the archive
+                for path in glob.glob(os.path.join(archive_dir(), table, f"{table}_*.parquet")):
+                    changed.add(os.path.basename(path)[len(table) + 1:-len(".parquet")].replace("_", "-"))
+            rows = sum(_export_month(conn, table, month, os.path.join(table_dir, f"{month.replace('-', '_')}.parquet"))
+                       for month in sorted(changed))
+            state[table] = {"max_id": max(max_id, watermark), "exported_at": pd.Timestamp.now().isoformat(timespec="seconds")}
+            summary.append({"table": table, "months_rewritten": len(changed), "rows_written": rows, "max_id": state[table]["max_id"]})
+    _save_state(state)
+    return pd.DataFrame(summary)
+
+# --- DUCKDB QUERIES ---
+# Each report table is a view over one clinic's rows; files written before
+# tenancy have no tenant column and belong to the default clinic
+def connect(tenant=None):
+    import duckdb
+    con = duckdb.connect()
+    literal = "'" + (tenant or current_tenant()).replace("'", "''") + "'"
+    for table in SNAPSHOT_TABLES:
+        pattern = os.path.join(snapshot_dir(), table, "*.parquet")
+        if glob.glob(pattern):
+            con.execute(f"CREATE VIEW {table}_all AS SELECT * FROM read_parquet('{pattern}', union_by_name = true)")
+            columns = {r[0] for r in con.execute(f"DESCRIBE {table}_all").fetchall()}
+            owner = f"COALESCE(tenant, '{DEFAULT_TENANT}')" if "tenant" in columns else f"'{DEFAULT_TENANT}'"
+            con.execute(f"CREATE VIEW {table} AS SELECT * FROM {table}_all WHERE {owner} = {literal}")
+    return con
+
+def available_tables(con):
+    return {r[0] for r in con.execute("SELECT table_name FROM information_schema.tables").fetchall()}
+
+REPORTS = {
+    "attendance_by_month": """
+        SELECT substr(date, 1, 7) AS month,
+               count(*) AS logs,
+               count(*) FILTER (WHERE status = 'Present') AS present,
+               count(*) FILTER (WHERE status = 'Late') AS late,
+               count(*) FILTER (WHERE status = 'Absent') AS absent,
+               round(100.0 * count(*) FILTER (WHERE status IN ('Present', 'Late')) / count(*), 1) AS attendance_rate
+        FROM attendance GROUP BY month ORDER BY month""",
+    "sessions_by_discipline": """
+        SELECT discipline,
+               count(*) AS booked,
+               count(*) FILTER (WHERE status = 'Completed') AS completed,
+               count(*) FILTER (WHERE status = 'No Show') AS no_show,
+               count(DISTINCT child_name) AS children
+        FROM appointments GROUP BY discipline ORDER BY booked DESC""",
+    "progress_by_discipline": """
+        SELECT discipline, count(*) AS notes,
+               count(*) FILTER (WHERE status = 'Mastered') AS mastered,
+               count(DISTINCT child_name) AS children
+        FROM progress GROUP BY discipline ORDER BY notes DESC""",
+    "revenue_by_service": """
+        SELECT item_desc AS service, count(*) AS invoices,
+               sum(amount) AS billed,
+               sum(amount) FILTER (WHERE status = 'Paid') AS collected,
+               sum(amount) FILTER (WHERE status <> 'Paid') AS outstanding
+        FROM invoices GROUP BY service ORDER BY billed DESC""",
+}
+
+REPORT_TABLES = {
+    "attendance_by_month": "attendance",
+    "sessions_by_discipline": "appointments",
+    "progress_by_discipline": "progress",
+    "revenue_by_service": "invoices",
+}
+
+def run_report(name, con=None):
+    con = con or connect()
+    if REPORT_TABLES[name] not in available_tables(con):
+        return pd.DataFrame()
+    return con.execute(REPORTS[name]).df()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export reporting tables to Parquet snapshots.")
+    parser.add_argument("--full", action="store_true", help="discard existing snapshots and export everything")
+    args = parser.parse_args(argv)
+    print(export_snapshots(full=args.full).to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,6 +3,7 @@ import streamlit as st
 import pandas as pd
 from datetime import date
 from .database import get_list_data, save_progress, get_data, delete_progress
+from .media import show_attachment, store_upload
 
 def show_page():
     st.title("📝 Progress Tracker")
@@ -62,6 +63,7 @@ def show_page():
         )
         
         media_url = st.text_input("Media Link (Optional)", placeholder="Link to Google Drive photo/video")
+        media_file = st.file_uploader("...or upload a photo/video", type=["jpg", "jpeg", "png", "gif", "webp", "mp4", "mov", "webm"])
 
         submit_btn = st.form_submit_button("Save Progress Entry")
         
@@ -69,6 +71,9 @@ def show_page():
             if not selected_child or not selected_disc:
                 st.error("Please select both a Child and a Discipline.")
             else:
+                # Uploads go to the local media store; thumbnails render in the background
+                if media_file is not None:
+                    media_url = store_upload(media_file)
                 save_progress(
                     d_date, 
                     selected_child, 
@@ -87,8 +92,9 @@ def show_page():
     # --- SECTION 2: RECENT HISTORY & FEEDBACK REVIEW ---
     st.subheader("📜 Recent Documentation History")
     
-    # Load all progress data
-    df = get_data("progress")
+    # Load all progress data (archived school years on request)
+    include_archived = st.checkbox("Include archived history", key="tracker_include_archived")
+    df = get_data("progress", include_archived=include_archived)
     
     if not df.empty:
         # Sorting by most recent
@@ -124,7 +130,7 @@ def show_page():
                         st.info("No feedback received from parent yet.")
                     
                     if row['media_path']:
-                        st.markdown(f"[🔗 View Media]({row['media_path']})")
+                        show_attachment(row['media_path'], row['id'])
                     
                     # Delete option for Admins or Authors
                     if role == "admin" or username == row['author']:
@@ -0,0 +1,122 @@
+# views/workload.py
+from datetime import date, timedelta
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+from .database import current_tenant, is_sqlite, read_conn
+
+# Appointments carry no duration, so hours assume a standard session length
+SESSION_MINUTES = 60
+# A progress note more than this many days after a session is not counted as its documentation
+LAG_WINDOW_DAYS = 14
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+def _workload_sql():
+    if is_sqlite():
+        lag = "julianday(documented_on) - julianday(date)"
+        window_end = f"date(a.date, '+{LAG_WINDOW_DAYS} days')"
+    else:
+        lag = "(documented_on::date - date::date)"
+        window_end = f"to_char(a.date::date + {LAG_WINDOW_DAYS}, 'YYYY-MM-DD')"
+    # Appointment types are named "<discipline> Session"/"<discipline> Consultation",
+    # so a note documents a session when the provider wrote it for that child and
+    # its discipline prefixes the type. Other types (Assessment, Other) have no
+    # discipline to match and are left out of the documentation figures.
+    return text(f"""
+        WITH appts AS (
+            SELECT a.id, COALESCE(NULLIF(TRIM(a.staff), ''), '(unassigned)') AS staff,
+                   a.child_name, a.status, a.date,
+                   CASE WHEN a.discipline LIKE '% Session' OR a.discipline LIKE '% Consultation' THEN 1 ELSE 0 END AS documentable,
+                   (SELECT MIN(p.date) FROM progress p
+                     WHERE p.tenant = a.tenant AND p.child_name = a.child_name AND p.date >= a.date AND p.date <= {window_end}
+                       AND LOWER(TRIM(p.author)) = LOWER(TRIM(a.staff)) AND a.discipline LIKE p.discipline || '%') AS documented_on
+            FROM appointments a
+            WHERE a.tenant = :t AND a.date BETWEEN :s AND :e
+        ), per_staff AS (
+            SELECT staff,
+                   COUNT(*) AS booked,
+                   SUM(CASE WHEN status = 'Completed' THEN 1 ELSE 0 END) AS completed,
+                   SUM(CASE WHEN status = 'No Show' THEN 1 ELSE 0 END) AS no_show,
+                   SUM(CASE WHEN status = 'Cancelled' THEN 1 ELSE 0 END) AS cancelled,
+                   COUNT(DISTINCT child_name) AS children,
+                   AVG(CASE WHEN status = 'Completed' AND documentable = 1 AND documented_on IS NOT NULL THEN {lag} END) AS avg_doc_lag_days,
+                   MAX(CASE WHEN status = 'Completed' AND documentable = 1 AND documented_on IS NOT NULL THEN {lag} END) AS max_doc_lag_days,
+                   SUM(CASE WHEN status = 'Completed' AND documentable = 1 AND documented_on IS NULL THEN 1 ELSE 0 END) AS undocumented,
+                   SUM(CASE WHEN status = 'Completed' AND documentable = 1 THEN 1 ELSE 0 END) AS documentable
+            FROM appts GROUP BY staff
+        )
+        SELECT *,
+               ROUND(100.0 * booked / SUM(booked) OVER (), 1) AS share_of_week,
+               RANK() OVER (ORDER BY booked DESC) AS load_rank
+        FROM per_staff ORDER BY booked DESC""")
+
+# One query per clinic and Monday-starting week; a range report is assembled from cached weeks
+@st.cache_data(ttl=900, show_spinner=False)
+def week_workload(monday, tenant):
+    with read_conn() as conn:
+        df = pd.read_sql_query(_workload_sql(), conn, params={"t": tenant, "s": str(monday), "e": str(monday + timedelta(days=6))})
+    if df.empty:
+        return df
+    df.insert(0, "week", pd.Timestamp(monday))
+    df["hours_booked"] = df["booked"] * SESSION_MINUTES / 60
+    df["hours_completed"] = df["completed"] * SESSION_MINUTES / 60
+    attended = df["completed"] + df["no_show"]
+    df["no_show_rate"] = (100.0 * df["no_show"] / attended.where(attended > 0)).round(1)
+    return df
+
+def workload_report(first_monday, weeks):
+    frames = [week_workload(first_monday + timedelta(weeks=i), current_tenant()) for i in range(weeks)]
+    frames = [f for f in frames if not f.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def staff_totals(report):
+    totals = report.groupby("staff")[["booked", "completed", "no_show", "cancelled", "documentable", "undocumented",
+                                       "hours_booked", "hours_completed"]].sum()
+    # Weighted by each week's documented sessions, the rows its average lag covers,
+    # so quiet weeks don't skew it
+    documented_per_week = report["documentable"] - report["undocumented"]
+    weighted = (report["avg_doc_lag_days"].fillna(0) * documented_per_week).groupby(report["staff"]).sum()
+    documented = documented_per_week.groupby(report["staff"]).sum()
+    totals["avg_doc_lag_days"] = (weighted / documented.where(documented > 0)).round(1)
+    totals["max_doc_lag_days"] = report.groupby("staff")["max_doc_lag_days"].max()
+    attended = totals["completed"] + totals["no_show"]
+    totals["no_show_rate"] = (100.0 * totals["no_show"] / attended.where(attended > 0)).round(1)
+    totals["sessions_per_week"] = (totals["booked"] / report["week"].nunique()).round(1)
+    return totals.sort_values("booked", ascending=False).reset_index()
+
+def show_page():
+    st.title("👥 Staff Workload")
+    st.caption(f"Hours assume {SESSION_MINUTES}-minute sessions. Documentation lag is the days from a completed "
+               f"session to the provider's first progress note for that child and discipline within {LAG_WINDOW_DAYS} days; "
+               "assessments and other appointments are not counted.")
+
+    c1, c2 = st.columns(2)
+    last_week = week_start(c1.date_input("Weeks ending", date.today()))
+    weeks = c2.slider("Weeks", 1, 26, 8)
+    first_week = last_week - timedelta(weeks=weeks - 1)
+
+    report = workload_report(first_week, weeks)
+    if report.empty:
+        st.info("No appointments booked in this period.")
+        return
+
+    totals = staff_totals(report)
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Providers", len(totals))
+    m2.metric("Hours Booked / Completed", f"{totals['hours_booked'].sum():.0f} / {totals['hours_completed'].sum():.0f}")
+    attended = totals["completed"].sum() + totals["no_show"].sum()
+    m3.metric("No-Show Rate", f"{100 * totals['no_show'].sum() / attended:.1f}%" if attended else "–")
+    m4.metric("Undocumented Sessions", int(totals["undocumented"].sum()))
+
+    st.subheader("Sessions per Provider per Week")
+    st.bar_chart(report.pivot_table(index="week", columns="staff", values="booked", aggfunc="sum").fillna(0))
+
+    st.subheader("Caseload Balance")
+    st.dataframe(totals, use_container_width=True, hide_index=True)
+
+    with st.expander("📋 Weekly detail"):
+        provider = st.selectbox("Provider", ["All"] + totals["staff"].tolist())
+        detail = report if provider == "All" else report[report["staff"] == provider]
+        st.dataframe(detail, use_container_width=True, hide_index=True)